@@ -0,0 +1,267 @@
+"""
+Headless asyncio HTTP API for the chatbot.
+
+    POST /v1/answer          {"query": "..."} -> {"answer", "sources", "chunk_ids"}
+    POST /v1/answer/stream   {"query": "..."} -> NDJSON events {"type": "text"|"done", ...}
+    GET  /healthz            readiness and queue depth
+    GET  /metrics            Prometheus metrics
+
+All requests share one Chatbot (models, collection and caches). CPU-bound
+embedding/retrieval/reranking runs in a bounded thread pool behind admission
+control: when more than API_MAX_QUEUE requests are waiting, new ones are
+rejected with 503 and Retry-After. Blocking Gemini calls run in a separate
+pool so slow LLM responses never starve the inference workers.
+
+Run from src/:  python api.py --port 8080 [--stub-llm 0.8]
+"""
+import argparse
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+from backend import registry, snapshots, telemetry
+from backend.chatbot import _outcome
+from backend.config import API_INFERENCE_WORKERS, API_LLM_WORKERS, API_MAX_QUEUE, MAX_QUERY_LENGTH
+
+
+class Overloaded(Exception):
+    pass
+
+
+class AdmissionController:
+    """
+    Bounds concurrent inference to `workers` and queued requests to `max_queue`.
+    """
+
+    def __init__(self, workers, max_queue):
+        self.semaphore = asyncio.Semaphore(workers)
+        self.max_queue = max_queue
+        self.waiting = 0
+        self.running = 0
+        self.rejected = 0
+
+    async def __aenter__(self):
+        if self.semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded()
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.running -= 1
+        self.semaphore.release()
+
+
+class ChatbotService:
+    def __init__(self, chatbot, inference_workers, llm_workers, max_queue):
+        self.chatbot = chatbot
+        self.inference_pool = ThreadPoolExecutor(inference_workers, thread_name_prefix="inference")
+        self.llm_pool = ThreadPoolExecutor(llm_workers, thread_name_prefix="llm")
+        self.admission = AdmissionController(inference_workers, max_queue)
+
+    async def _prepare(self, trace, query, context):
+        """
+        Run embedding, retrieval and reranking on the inference pool.
+        """
+
+        def run():
+            with telemetry.use_trace(trace):
+                return self.chatbot.prepare_context(query, context)
+
+        async with self.admission:
+            return await asyncio.get_running_loop().run_in_executor(self.inference_pool, run)
+
+    async def answer(self, query):
+        trace = telemetry.Trace("api_answer")
+        context = {}
+        try:
+            emb, chunk_ids, cached, top_docs = await self._prepare(trace, query, context)
+            if cached is not None:
+                trace.attrs["outcome"] = "cached"
+                response, sources = cached
+            elif not top_docs:
+                trace.attrs["outcome"] = "no_context"
+                response, sources = "No relevant info found.", []
+            else:
+                def run_llm():
+                    with telemetry.use_trace(trace):
+                        return self.chatbot.generate_llm_response(query, top_docs, cache_key=(emb, chunk_ids))
+
+                response, sources = await asyncio.get_running_loop().run_in_executor(self.llm_pool, run_llm)
+                trace.attrs["outcome"] = _outcome(sources, trace)
+                self.chatbot.remember_answer(emb, chunk_ids, response, sources, trace.attrs["outcome"])
+            return {"answer": response, "sources": sources, "chunk_ids": context.get("chunk_ids", [])}
+        except Exception as e:
+            trace.attrs.setdefault("error", type(e).__name__)
+            raise
+        finally:
+            trace.finish()
+
+    async def answer_stream(self, query):
+        """
+        Async generator of stream events. The blocking LLM stream is drained
+        on the LLM pool and handed over through an asyncio queue.
+        """
+
+        trace = telemetry.Trace("api_answer_stream")
+        context = {}
+        try:
+            emb, chunk_ids, cached, top_docs = await self._prepare(trace, query, context)
+            if cached is not None:
+                trace.attrs["outcome"] = "cached"
+                yield {"type": "text", "text": cached[0]}
+                yield {"type": "done", "answer": cached[0], "sources": cached[1],
+                       "chunk_ids": context.get("chunk_ids", [])}
+                return
+            if not top_docs:
+                trace.attrs["outcome"] = "no_context"
+                yield {"type": "done", "answer": "No relevant info found.", "sources": [], "chunk_ids": []}
+                return
+
+            loop = asyncio.get_running_loop()
+            events = asyncio.Queue()
+            cancelled = threading.Event()
+
+            def pump():
+                try:
+                    for event in self.chatbot.generate_llm_response_stream(query, top_docs, trace=trace,
+                                                                           cache_key=(emb, chunk_ids)):
+                        if cancelled.is_set():
+                            break
+                        loop.call_soon_threadsafe(events.put_nowait, event)
+                except Exception as e:
+                    loop.call_soon_threadsafe(events.put_nowait, ("error", type(e).__name__))
+                finally:
+                    loop.call_soon_threadsafe(events.put_nowait, None)
+
+            loop.run_in_executor(self.llm_pool, pump)
+            try:
+                while True:
+                    event = await events.get()
+                    if event is None:
+                        break
+                    if event[0] == "text":
+                        yield {"type": "text", "text": event[1]}
+                    elif event[0] == "done":
+                        trace.attrs["outcome"] = _outcome(event[2], trace)
+                        self.chatbot.remember_answer(emb, chunk_ids, event[1], event[2], trace.attrs["outcome"])
+                        yield {"type": "done", "answer": event[1], "sources": event[2],
+                               "chunk_ids": context.get("chunk_ids", [])}
+                    else:
+                        raise RuntimeError(event[1])
+            finally:
+                cancelled.set()
+        except Exception as e:
+            trace.attrs.setdefault("error", type(e).__name__)
+            raise
+        finally:
+            trace.finish()
+
+
+def _validate(body):
+    query = body.get("query") if isinstance(body, dict) else None
+    if not isinstance(query, str) or not query.strip():
+        raise web.HTTPBadRequest(text=json.dumps({"error": "query is required"}), content_type="application/json")
+    if len(query) > MAX_QUERY_LENGTH:
+        raise web.HTTPBadRequest(text=json.dumps({"error": f"query too long (max {MAX_QUERY_LENGTH})"}),
+                                 content_type="application/json")
+    return query
+
+
+def _overloaded():
+    return web.json_response({"error": "overloaded"}, status=503, headers={"Retry-After": "1"})
+
+
+async def _read_query(request):
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        raise web.HTTPBadRequest(text=json.dumps({"error": "invalid JSON"}), content_type="application/json")
+    return _validate(body)
+
+
+async def handle_answer(request):
+    service = request.app["service"]
+    query = await _read_query(request)
+    try:
+        return web.json_response(await service.answer(query))
+    except Overloaded:
+        return _overloaded()
+
+
+async def handle_answer_stream(request):
+    service = request.app["service"]
+    query = await _read_query(request)
+    stream = service.answer_stream(query)
+    try:
+        first = await stream.__anext__()
+    except Overloaded:
+        return _overloaded()
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await response.prepare(request)
+    try:
+        await response.write((json.dumps(first) + "\n").encode("utf-8"))
+        async for event in stream:
+            await response.write((json.dumps(event) + "\n").encode("utf-8"))
+    finally:
+        # Stops the LLM pump early when the client disconnects
+        await stream.aclose()
+    await response.write_eof()
+    return response
+
+
+async def handle_health(request):
+    admission = request.app["service"].admission
+    return web.json_response({
+        "status": "ok",
+        "running": admission.running,
+        "waiting": admission.waiting,
+        "rejected": admission.rejected,
+    })
+
+
+async def handle_metrics(request):
+    return web.Response(text=telemetry.render_prometheus(), content_type="text/plain")
+
+
+def create_app(chatbot=None, inference_workers=API_INFERENCE_WORKERS, llm_workers=API_LLM_WORKERS,
+               max_queue=API_MAX_QUEUE):
+    app = web.Application()
+    app["service"] = ChatbotService(chatbot or registry.get_chatbot(), inference_workers, llm_workers, max_queue)
+    app.router.add_post("/v1/answer", handle_answer)
+    app.router.add_post("/v1/answer/stream", handle_answer_stream)
+    app.router.add_get("/healthz", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless chatbot HTTP API.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--inference-workers", type=int, default=API_INFERENCE_WORKERS)
+    parser.add_argument("--llm-workers", type=int, default=API_LLM_WORKERS)
+    parser.add_argument("--max-queue", type=int, default=API_MAX_QUEUE)
+    parser.add_argument("--stub-llm", type=float, default=None, metavar="LATENCY",
+                        help="Use the offline stub LLM with this latency in seconds")
+    args = parser.parse_args()
+
+    snapshots.ensure_snapshot()
+    chatbot = None
+    if args.stub_llm is not None:
+        from backend.chatbot import Chatbot
+        from backend.stub_llm import StubGenaiClient
+        chatbot = Chatbot(genai_client=StubGenaiClient(latency=args.stub_llm, jitter=args.stub_llm / 2))
+    app = create_app(chatbot, args.inference_workers, args.llm_workers, args.max_queue)
+    registry.start_snapshot_watcher()
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,96 +1,160 @@
 import random
 import streamlit as st
-from backend.chatbot import Chatbot
-from backend.config import FOLLOWUP_QUESTIONS, GITLAB_SVG
-from utils.helpers import ensure_chroma_db, record_feedback, is_valid_query
+from backend import telemetry
+from backend.answer_worker import SessionAnswerWorker
+from backend.registry import (
+    get_answer_pool,
+    get_chatbot,
+    get_feedback_store,
+    start_background_loading,
+    start_metrics_exporters,
+    start_snapshot_watcher,
+)
+from backend.config import (
+    ADMIN_PANEL,
+    FOLLOWUP_QUESTIONS,
+    STREAM_RESPONSES,
+    UI_HISTORY_TURNS,
+    UI_POLL_INTERVAL_S,
+    WARMUP_ON_STARTUP,
+)
+from utils.helpers import format_response, is_valid_query, logo_style, record_feedback, trim_history
 
 # --- Initialization ---
 def init_session_state():
     """
-    Initialize session state variables.
+    Initialize session state variables. The chatbot itself is shared by all
+    sessions; only the conversation state and this session's answer worker
+    live in st.session_state.
     """
 
-    if "chatbot" not in st.session_state:
-        st.session_state.chatbot = Chatbot()
     if "messages" not in st.session_state:
         st.session_state.messages = []
-    if "pending_question" not in st.session_state:
-        st.session_state.pending_question = None
+    if "next_message_id" not in st.session_state:
+        st.session_state.next_message_id = 0
     if "suggestions" not in st.session_state:
         st.session_state.suggestions = random.sample(FOLLOWUP_QUESTIONS, 3)
-    if "waiting" not in st.session_state:
-        st.session_state.waiting = False
+    if "answer_worker" not in st.session_state:
+        st.session_state.answer_worker = SessionAnswerWorker(get_answer_pool(), get_chatbot, STREAM_RESPONSES)
     if "last_bot_response" not in st.session_state:
         st.session_state.last_bot_response = ""
     if "last_user_question" not in st.session_state:
         st.session_state.last_user_question = ""
-    if "user_message_added" not in st.session_state:
-        st.session_state.user_message_added = False
 
-def append_assistant_response(prompt):
+def add_message(message):
     """
-    Append the assistant's response to the chat history.
+    Append a message with a stable ID (used for widget keys) and drop the
+    oldest turns beyond UI_HISTORY_TURNS, so a rerun costs the same however
+    long the conversation gets.
     """
 
-    response, sources = st.session_state.chatbot.generate_response(prompt)
-    st.session_state.last_bot_response = response
-    st.session_state.last_user_question = prompt
-    if sources:
-        gitlab_svg = GITLAB_SVG
-        links = ", &nbsp;".join(
-            f'<a href="{url}" target="_blank" style="color:#1a73e8; font-weight:bold; text-decoration:underline;">{i+1}</a>'
-            for i, url in enumerate(sources)
-        )
-        response += f"<br><b>{gitlab_svg} Sources:&nbsp;</b> {links}"
-    st.session_state.messages.append({
+    message["id"] = st.session_state.next_message_id
+    st.session_state.next_message_id += 1
+    st.session_state.messages.append(message)
+    trim_history(st.session_state.messages, UI_HISTORY_TURNS)
+
+def ask(prompt):
+    """
+    Add the question to the history and start answering it in the
+    background. Returns without waiting for the answer; runs as a widget
+    callback, so no extra rerun is needed.
+    """
+
+    worker = st.session_state.answer_worker
+    if worker.busy:
+        return
+    add_message({"role": "user", "content": prompt})
+    worker.submit(prompt)
+
+def save_assistant_response(job):
+    """
+    Store a finished answer in the chat history, together with the
+    question and chunks it answers so feedback is tied to this message.
+    The HTML is built once here and reused by every later rerun.
+    """
+
+    if job.error is not None:
+        add_message({
+            "role": "assistant",
+            "content": "⚠️ Sorry, something went wrong while answering. Please try again.",
+            "error": True,
+        })
+        return
+    st.session_state.last_bot_response = job.response
+    st.session_state.last_user_question = job.prompt
+    add_message({
         "role": "assistant",
-        "content": response,
-        "feedback": None
+        "content": format_response(job.response, job.sources),
+        "feedback": None,
+        "question": job.prompt,
+        "answer": job.response,
+        "sources": job.sources,
+        "chunk_ids": job.context.get("chunk_ids", []),
     })
 
-def render_feedback_buttons(idx, message):
+def render_feedback_buttons(message):
     """
     Render thumbs up and thumbs down feedback buttons.
     """
 
     cols = st.columns([1, 1, 3, 3])
-    with cols[0]:
-        if st.button("👍", key=f"thumbs_up_{idx}"):
-            st.session_state.messages[idx]["feedback"] = "up"
-            record_feedback(
-                st.session_state.last_user_question,
-                st.session_state.last_bot_response,
-                "up"
-            )
-            st.rerun()
-    with cols[1]:
-        if st.button("👎", key=f"thumbs_down_{idx}"):
-            st.session_state.messages[idx]["feedback"] = "down"
-            record_feedback(
-                st.session_state.last_user_question,
-                st.session_state.last_bot_response,
-                "down"
-            )   
-            st.rerun()
-
+    for col, rating, icon in ((cols[0], "up", "👍"), (cols[1], "down", "👎")):
+        with col:
+            if st.button(icon, key=f"thumbs_{rating}_{message['id']}"):
+                message["feedback"] = rating
+                record_feedback(
+                    message.get("question", st.session_state.last_user_question),
+                    message.get("answer", st.session_state.last_bot_response),
+                    rating,
+                    chunk_ids=message.get("chunk_ids", []),
+                    sources=message.get("sources", [])
+                )
+                st.rerun(scope="fragment")
+
+def render_message(message):
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"], unsafe_allow_html=True)
+        if message["role"] != "assistant" or message.get("error"):
+            return
+        if message.get("feedback") is None:
+            render_feedback_buttons(message)
+        elif message["feedback"] == "up":
+            st.markdown("**Feedback:** 👍")
+        elif message["feedback"] == "down":
+            st.markdown("**Feedback:** 👎")
+
+@st.fragment
 def render_chat_history():
     """
-    Render the chat history with feedback buttons.
+    Render the chat history with feedback buttons. As a fragment, a
+    feedback click reruns only the history, not the whole app.
     """
 
-    for idx, message in enumerate(st.session_state.messages):
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"], unsafe_allow_html=True)
-            if (
-                message["role"] == "assistant"
-                and message.get("content") != "⏳ _Thinking..._"
-                and message.get("feedback") is None
-            ):
-                render_feedback_buttons(idx, message)
-            elif message.get("feedback") == "up":
-                st.markdown("**Feedback:** 👍")
-            elif message.get("feedback") == "down":
-                st.markdown("**Feedback:** 👎")
+    for message in st.session_state.messages:
+        render_message(message)
+
+@st.fragment(run_every=UI_POLL_INTERVAL_S)
+def render_pending_answer():
+    """
+    Show the answer being computed in the background, refreshing only this
+    message. Once it is done, move it to the history and rerun the app
+    once to re-enable the input and suggestions.
+    """
+
+    worker = st.session_state.answer_worker
+    job = worker.take()
+    if job is not None:
+        save_assistant_response(job)
+        st.session_state.suggestions = random.sample(FOLLOWUP_QUESTIONS, 3)
+        st.rerun()
+    job = worker.job
+    if job is None:
+        return
+    with st.chat_message("assistant"):
+        if job.text:
+            st.markdown(job.text + "▌")
+        else:
+            st.markdown(f"⏳ _Thinking... ({job.elapsed():.0f}s)_")
 
 def render_suggestions():
     """
@@ -100,62 +164,89 @@ def render_suggestions():
     st.markdown("**Quick questions you can try:**")
     cols = st.columns(3)
     for i, q in enumerate(st.session_state.suggestions):
-        if cols[i].button(q, key=f"suggest-{i}"):
-            st.session_state.pending_question = q
-            st.rerun()
+        cols[i].button(q, key=f"suggest-{i}", on_click=ask, args=(q,))
+
+def submit_user_input():
+    """
+    Callback of the chat input box. Callbacks run before the script, so
+    the rerun that follows already renders the question and a disabled input.
+    """
+
+    prompt = st.session_state.chat_input
+    if is_valid_query(prompt):
+        ask(prompt)
 
 def handle_user_input():
     """
-    Handle user input from the chat input box.
+    Render the chat input box; disabled while a question is being answered.
     """
 
-    prompt = st.chat_input("Ask a question about GitLab's Handbook...",
-                           disabled=st.session_state.waiting)
-    if prompt:
-        st.session_state.pending_question = prompt
-        st.rerun()
+    st.chat_input("Ask a question about GitLab's Handbook...", key="chat_input",
+                  on_submit=submit_user_input, disabled=st.session_state.answer_worker.busy)
 
-def process_pending_question():
-    """Process the pending question."""
-
-    q = st.session_state.pending_question
-    if not is_valid_query(q):
-        st.session_state.pending_question = None
-        st.session_state.user_message_added = False
-        st.session_state.waiting = False
-        st.stop()
-
-    if not st.session_state.get("user_message_added", False):
-        st.session_state.messages.append({"role": "user", "content": q})
-        st.session_state.messages.append({"role": "assistant", "content": "⏳ _Thinking..._"})
-        st.session_state.user_message_added = True
-        st.session_state.waiting = True
-        st.rerun()
+def render_admin_panel():
+    """
+    Render live per-stage latency and cache statistics in the sidebar.
+    """
 
-    if st.session_state.messages and st.session_state.messages[-1]["content"] == "⏳ _Thinking..._":
-        st.session_state.messages.pop()
+    with st.sidebar:
+        st.header("Pipeline metrics")
+        rows = telemetry.stage_latency_summary()
+        if rows:
+            st.table(rows)
+        else:
+            st.caption("No requests traced yet.")
+        st.subheader("Startup")
+        status = start_background_loading(warm_up=WARMUP_ON_STARTUP)
+        st.json(status.snapshot(), expanded=False)
+        if status.ready:
+            st.subheader("Caches")
+            st.json(get_chatbot().cache_stats(), expanded=False)
+        st.subheader("Feedback")
+        feedback = get_feedback_store()
+        st.json(feedback.summary(), expanded=False)
+        top_queries = feedback.by_query(limit=10)
+        if top_queries:
+            st.table(top_queries)
+        with st.expander("Recent traces"):
+            st.json(telemetry.recent_traces(limit=10), expanded=False)
+
+@st.fragment(run_every=1.0)
+def render_loading_status(status):
+    """
+    Show model loading progress until the chatbot is ready, then rerun the
+    whole app once so the indicator disappears.
+    """
 
-    append_assistant_response(q)
-    st.session_state.pending_question = None
-    st.session_state.user_message_added = False
-    st.session_state.suggestions = random.sample(FOLLOWUP_QUESTIONS, 3)
-    st.session_state.waiting = False
-    st.rerun()
+    if status.error:
+        st.error(f"Failed to load models: {status.error}")
+    elif status.ready:
+        st.rerun()
+    else:
+        st.info(f"⏳ Loading models ({status.stage}, {status.elapsed():.0f}s)... "
+                "You can already ask a question; it will be answered once loading finishes.")
 
 # --- Main App Flow ---
-ensure_chroma_db()
-
 st.set_page_config(page_title="GitLab AI Chatbot", page_icon="🤖", layout="centered")
 st.title("🤖 GitLab AI Chatbot")
 st.markdown("Ask questions about GitLab's Handbook. Powered by Google Gemini.")
-
+st.markdown(logo_style(), unsafe_allow_html=True)
+
+start_metrics_exporters()
+# The database snapshot and models load in the background; the UI renders
+# right away and shows readiness
+startup = start_background_loading(warm_up=WARMUP_ON_STARTUP)
+start_snapshot_watcher()
+if not startup.ready:
+    render_loading_status(startup)
+if ADMIN_PANEL:
+    render_admin_panel()
 init_session_state()
 render_chat_history()
 
-if not st.session_state.waiting:
+if st.session_state.answer_worker.job is not None:
+    render_pending_answer()
+else:
     render_suggestions()
 
 handle_user_input()
-
-if st.session_state.pending_question:
-    process_pending_question()
\ No newline at end of file
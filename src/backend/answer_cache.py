@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+def ids_key(chunk_ids):
+    """
+    Order-independent key for a set of retrieved chunk IDs.
+    """
+
+    joined = "\n".join(sorted(str(cid) for cid in chunk_ids))
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("key", "ids_key", "embedding", "answer", "sources", "created", "size")
+
+    def __init__(self, key, ids_key, embedding, answer, sources, created):
+        self.key = key
+        self.ids_key = ids_key
+        self.embedding = embedding
+        self.answer = answer
+        self.sources = sources
+        self.created = created
+        self.size = embedding.nbytes + len(answer) + sum(len(s) for s in sources) + 200
+
+
+class SemanticAnswerCache:
+    """
+    Semantic cache of final answers keyed on the query embedding.
+
+    An answer is reused when the cosine similarity between the new and a
+    cached query embedding is at least threshold and both queries retrieved
+    the same chunk IDs. Entries are evicted LRU-first once max_entries or
+    max_bytes is exceeded and expire after ttl seconds. With a path, entries
+    are also stored in SQLite so several worker processes share them.
+    The cache clears itself when the collection fingerprint changes.
+    """
+
+    def __init__(self, threshold=0.95, ttl=6 * 3600, max_entries=1000, max_bytes=64 * 1024 * 1024,
+                 path=None, fingerprint_fn=None, fingerprint_interval=30.0):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.fingerprint_fn = fingerprint_fn
+        self.fingerprint_interval = fingerprint_interval
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.by_ids = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.fingerprint = None
+        self.fingerprint_checked = 0.0
+        self.conn = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                " key TEXT PRIMARY KEY, ids_key TEXT NOT NULL, embedding BLOB NOT NULL,"
+                " answer TEXT NOT NULL, sources TEXT NOT NULL, created REAL NOT NULL,"
+                " fingerprint TEXT)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS answers_ids ON answers(ids_key)")
+            self.conn.commit()
+
+    @staticmethod
+    def _normalize(embedding):
+        vec = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _check_fingerprint(self):
+        """
+        Clear the cache when the collection changed since the last check.
+        """
+
+        if self.fingerprint_fn is None:
+            return
+        now = time.monotonic()
+        if now - self.fingerprint_checked < self.fingerprint_interval:
+            return
+        self.fingerprint_checked = now
+        try:
+            current = str(self.fingerprint_fn())
+        except Exception:
+            return
+        if self.fingerprint is not None and current != self.fingerprint:
+            self._clear_locked(drop_disk=True)
+        self.fingerprint = current
+
+    def _clear_locked(self, drop_disk=False):
+        self.entries.clear()
+        self.by_ids.clear()
+        self.bytes = 0
+        if drop_disk and self.conn is not None:
+            self.conn.execute("DELETE FROM answers")
+            self.conn.commit()
+
+    def _remove_locked(self, entry):
+        self.entries.pop(entry.key, None)
+        keys = self.by_ids.get(entry.ids_key)
+        if keys is not None:
+            keys.discard(entry.key)
+            if not keys:
+                del self.by_ids[entry.ids_key]
+        self.bytes -= entry.size
+
+    def _insert_locked(self, entry):
+        if entry.key in self.entries:
+            self._remove_locked(self.entries[entry.key])
+        self.entries[entry.key] = entry
+        self.by_ids.setdefault(entry.ids_key, set()).add(entry.key)
+        self.bytes += entry.size
+        while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+            _, oldest = next(iter(self.entries.items()))
+            self._remove_locked(oldest)
+
+    def _best_match(self, query_vec, candidates, now, threshold=None):
+        best, best_sim = None, self.threshold if threshold is None else threshold
+        for entry in candidates:
+            if now - entry.created > self.ttl:
+                continue
+            sim = float(np.dot(query_vec, entry.embedding))
+            if sim >= best_sim:
+                best, best_sim = entry, sim
+        return best
+
+    def _load_from_disk(self, key_for_ids):
+        rows = self.conn.execute(
+            "SELECT key, embedding, answer, sources, created FROM answers"
+            " WHERE ids_key = ? AND (fingerprint IS ? OR fingerprint = ?)",
+            (key_for_ids, self.fingerprint, self.fingerprint)
+        ).fetchall()
+        return [
+            _Entry(key, key_for_ids, np.frombuffer(emb, dtype=np.float32), answer, json.loads(sources), created)
+            for key, emb, answer, sources, created in rows
+        ]
+
+    def lookup(self, embedding, chunk_ids, threshold=None):
+        """
+        Return (answer, sources) for a semantically equivalent cached query
+        that retrieved the same chunks, or None. threshold overrides the
+        configured similarity threshold for this lookup.
+        """
+
+        query_vec = self._normalize(embedding)
+        key_for_ids = ids_key(chunk_ids)
+        now = time.time()
+        with self.lock:
+            self._check_fingerprint()
+            candidates = [self.entries[k] for k in self.by_ids.get(key_for_ids, ())]
+            best = self._best_match(query_vec, candidates, now, threshold)
+            if best is None and self.conn is not None:
+                best = self._best_match(query_vec, self._load_from_disk(key_for_ids), now, threshold)
+                if best is not None:
+                    self._insert_locked(best)
+            # Expired entries matching these IDs are dropped eagerly
+            for entry in candidates:
+                if now - entry.created > self.ttl:
+                    self._remove_locked(entry)
+            if best is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(best.key)
+            self.hits += 1
+            return best.answer, list(best.sources)
+
+    def put(self, embedding, chunk_ids, answer, sources):
+        """
+        Store the answer for a query embedding and its retrieved chunk IDs.
+        """
+
+        query_vec = self._normalize(embedding)
+        key_for_ids = ids_key(chunk_ids)
+        key = hashlib.sha1(query_vec.tobytes() + key_for_ids.encode("utf-8")).hexdigest()
+        entry = _Entry(key, key_for_ids, query_vec, answer, list(sources), time.time())
+        with self.lock:
+            self._insert_locked(entry)
+            if self.conn is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, key_for_ids, query_vec.tobytes(), answer, json.dumps(entry.sources),
+                     entry.created, self.fingerprint)
+                )
+                self.conn.execute("DELETE FROM answers WHERE created < ?", (entry.created - self.ttl,))
+                self.conn.commit()
+
+    def invalidate(self):
+        """
+        Drop every cached answer, in memory and on disk.
+        """
+
+        with self.lock:
+            self._clear_locked(drop_disk=True)
+            self.fingerprint = None
+            self.fingerprint_checked = 0.0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
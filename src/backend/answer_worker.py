@@ -0,0 +1,103 @@
+"""
+Background answering for the Streamlit UI.
+
+Each browser session gets a SessionAnswerWorker. Asking a question submits
+an AnswerJob to a thread pool shared by all sessions and returns
+immediately, so the script thread never blocks on retrieval or Gemini.
+The UI polls the job from a fragment that re-renders only the pending
+message: the streamed text so far while it runs, and the final answer once
+it is done. Background threads never call Streamlit; they only fill in the
+job.
+"""
+import threading
+import time
+
+
+class AnswerJob:
+    """
+    One question being answered. text grows as tokens stream in; response,
+    sources and context (chunk IDs) are set once finished is.
+    """
+
+    def __init__(self, prompt):
+        self.prompt = prompt
+        self.text = ""
+        self.response = None
+        self.sources = []
+        self.context = {}
+        self.error = None
+        self.started = time.monotonic()
+        self.first_token_s = None
+        self.elapsed_s = None
+        self.finished = threading.Event()
+
+    @property
+    def done(self):
+        return self.finished.is_set()
+
+    def elapsed(self):
+        return time.monotonic() - self.started if self.elapsed_s is None else self.elapsed_s
+
+
+class SessionAnswerWorker:
+    """
+    Answers one session's questions, one at a time, on a shared pool.
+    get_chatbot is called on the pool thread, so a question asked while
+    models are still loading waits there rather than in the script.
+    """
+
+    def __init__(self, pool, get_chatbot, stream=True):
+        self.pool = pool
+        self.get_chatbot = get_chatbot
+        self.stream = stream
+        self.job = None
+
+    @property
+    def busy(self):
+        return self.job is not None and not self.job.done
+
+    def submit(self, prompt):
+        """
+        Start answering prompt. Returns the AnswerJob, or None when the
+        previous question is still being answered.
+        """
+
+        if self.busy:
+            return None
+        job = AnswerJob(prompt)
+        self.job = job
+        self.pool.submit(self._run, job)
+        return job
+
+    def take(self):
+        """
+        The current job once it has finished, clearing it; None while it is
+        still running or when there is none.
+        """
+
+        job = self.job
+        if job is None or not job.done:
+            return None
+        self.job = None
+        return job
+
+    def _run(self, job):
+        try:
+            chatbot = self.get_chatbot()
+            if self.stream:
+                for event in chatbot.generate_response_stream(job.prompt, context=job.context):
+                    if event[0] == "text":
+                        if job.first_token_s is None:
+                            job.first_token_s = time.monotonic() - job.started
+                        job.text += event[1]
+                    else:
+                        _, job.response, job.sources = event
+            else:
+                job.response, job.sources = chatbot.generate_response(job.prompt, context=job.context)
+                job.text = job.response
+        except Exception as e:
+            print(f"[answer_worker] Answering failed: {e}")
+            job.error = e
+        finally:
+            job.elapsed_s = time.monotonic() - job.started
+            job.finished.set()
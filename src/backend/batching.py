@@ -0,0 +1,93 @@
+"""
+Cross-request micro-batching for model inference.
+
+Concurrent requests each submit a small group of items (one query to
+embed, or the query/passage pairs to rerank). A single worker thread per
+model gathers pending groups for up to max_wait_ms or until max_batch
+items are queued, runs one batched forward pass, and hands every request
+back its own slice of the results.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Runs batch_fn(items) -> results over items pooled from concurrent callers.
+    """
+
+    def __init__(self, name, batch_fn, max_batch=32, max_wait_ms=2.0):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.requests = 0
+        self.worker = threading.Thread(target=self._worker_loop, name=f"batcher-{name}", daemon=True)
+        self.worker.start()
+
+    def submit(self, items):
+        """
+        Queue a group of items and block until its results are ready.
+        A group is never split across batches.
+        """
+
+        items = list(items)
+        if not items:
+            return []
+        future = Future()
+        self.queue.put((items, future))
+        return future.result()
+
+    def _collect(self):
+        """
+        Block for the first group, then gather more until the batch is full
+        or max_wait has passed since the first one arrived.
+        """
+
+        groups = [self.queue.get()]
+        size = len(groups[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            try:
+                timeout = deadline - time.monotonic()
+                group = self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            groups.append(group)
+            size += len(group[0])
+        return groups
+
+    def _worker_loop(self):
+        while True:
+            groups = self._collect()
+            flat = [item for items, _ in groups for item in items]
+            try:
+                results = self.batch_fn(flat)
+            except Exception as e:
+                for _, future in groups:
+                    future.set_exception(e)
+                continue
+            offset = 0
+            for items, future in groups:
+                future.set_result(results[offset:offset + len(items)])
+                offset += len(items)
+            with self.lock:
+                self.batches += 1
+                self.items += len(flat)
+                self.requests += len(groups)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "items": self.items,
+                "mean_batch_items": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "mean_batch_requests": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            }
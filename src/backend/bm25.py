@@ -0,0 +1,180 @@
+"""
+BM25 inverted index over the handbook chunks.
+
+The index is stored as a directory of flat NumPy arrays (loaded with
+mmap_mode="r", so pages are shared between processes and only touched
+postings are read) plus small JSON files:
+
+    vocab.json         term -> term id
+    doc_ids.json       row -> chunk ID
+    meta.json          document count, average length, k1, b
+    term_offsets.npy   int64[V + 1], postings of term t are [offsets[t], offsets[t + 1])
+    postings_docs.npy  int32 document rows, grouped by term
+    postings_tf.npy    uint16 term frequencies, aligned with postings_docs
+    doc_len.npy        float32 document lengths in tokens
+
+Build from src/:  python -m backend.bm25
+"""
+import json
+import os
+import re
+import threading
+from collections import Counter
+import numpy as np
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """
+    Lowercased word tokens. Keeps digits and underscores, so error codes,
+    acronyms and team names survive as single terms.
+    """
+
+    return TOKEN_RE.findall(text.lower())
+
+
+def build_index(doc_ids, documents, path, k1=1.5, b=0.75):
+    """
+    Build a BM25 index for documents and write it to path.
+    """
+
+    vocab = {}
+    postings = []
+    doc_len = np.zeros(len(documents), dtype=np.float32)
+    for row, text in enumerate(documents):
+        counts = Counter(tokenize(text or ""))
+        doc_len[row] = sum(counts.values())
+        for term, tf in counts.items():
+            term_id = vocab.setdefault(term, len(vocab))
+            if term_id == len(postings):
+                postings.append([])
+            postings[term_id].append((row, min(tf, 65535)))
+
+    offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(p) for p in postings])
+    docs = np.empty(offsets[-1], dtype=np.int32)
+    tfs = np.empty(offsets[-1], dtype=np.uint16)
+    for term_id, plist in enumerate(postings):
+        start, end = offsets[term_id], offsets[term_id + 1]
+        docs[start:end] = [row for row, _ in plist]
+        tfs[start:end] = [tf for _, tf in plist]
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "term_offsets.npy"), offsets)
+    np.save(os.path.join(path, "postings_docs.npy"), docs)
+    np.save(os.path.join(path, "postings_tf.npy"), tfs)
+    np.save(os.path.join(path, "doc_len.npy"), doc_len)
+    with open(os.path.join(path, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(vocab, f)
+    with open(os.path.join(path, "doc_ids.json"), "w", encoding="utf-8") as f:
+        json.dump(list(doc_ids), f)
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "n_docs": len(documents),
+            "avg_len": float(doc_len.mean()) if len(documents) else 0.0,
+            "k1": k1,
+            "b": b,
+        }, f)
+
+
+def build_from_collection(collection, path, page_size=1000):
+    """
+    Build the BM25 index from every document in a Chroma collection.
+    """
+
+    doc_ids, documents = [], []
+    offset = 0
+    while True:
+        page = collection.get(include=["documents"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        doc_ids.extend(page["ids"])
+        documents.extend(page["documents"])
+        offset += len(page["ids"])
+    build_index(doc_ids, documents, path)
+    print(f"[bm25] Indexed {len(doc_ids)} documents into {path}")
+    return len(doc_ids)
+
+
+class BM25Index:
+    """
+    Lazily loaded, memory-mapped BM25 index. Nothing is read from disk
+    until the first search.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.loaded = False
+
+    def _load(self):
+        with self.lock:
+            if self.loaded:
+                return
+            p = self.path
+            with open(os.path.join(p, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(os.path.join(p, "vocab.json"), encoding="utf-8") as f:
+                self.vocab = json.load(f)
+            with open(os.path.join(p, "doc_ids.json"), encoding="utf-8") as f:
+                self.doc_ids = json.load(f)
+            self.offsets = np.load(os.path.join(p, "term_offsets.npy"), mmap_mode="r")
+            self.postings_docs = np.load(os.path.join(p, "postings_docs.npy"), mmap_mode="r")
+            self.postings_tf = np.load(os.path.join(p, "postings_tf.npy"), mmap_mode="r")
+            doc_len = np.load(os.path.join(p, "doc_len.npy"), mmap_mode="r")
+            self.n_docs = meta["n_docs"]
+            self.k1 = meta["k1"]
+            b = meta["b"]
+            avg_len = meta["avg_len"] or 1.0
+            # Per-document length normalization is query independent
+            self.length_norm = (self.k1 * (1 - b + b * np.asarray(doc_len) / avg_len)).astype(np.float32)
+            self.loaded = True
+
+    def search(self, query, k=15):
+        """
+        Return up to k (chunk_id, score) pairs, best first.
+        """
+
+        if not self.loaded:
+            self._load()
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not term_ids or not self.n_docs:
+            return []
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term_id in term_ids:
+            start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+            rows = np.asarray(self.postings_docs[start:end])
+            tf = np.asarray(self.postings_tf[start:end], dtype=np.float32)
+            df = end - start
+            idf = np.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            scores[rows] += idf * tf * (self.k1 + 1) / (tf + self.length_norm[rows])
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.doc_ids[i], float(scores[i])) for i in top]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuse several ranked ID lists. Returns IDs ordered by sum of 1 / (k + rank).
+    """
+
+    fused = {}
+    for ranking in rankings:
+        for rank, cid in enumerate(ranking):
+            fused[cid] = fused.get(cid, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused, key=lambda cid: fused[cid], reverse=True), fused
+
+
+def main():
+    from backend.config import BM25_DIR_NAME
+    from backend.registry import get_collection
+    from backend.snapshots import active_db_path
+    build_from_collection(get_collection(), os.path.join(active_db_path(), BM25_DIR_NAME))
+
+
+if __name__ == "__main__":
+    main()
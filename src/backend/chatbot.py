@@ -1,57 +1,239 @@
-import os
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer, CrossEncoder
-from google import genai
-from dotenv import load_dotenv
-from utils.helpers import normalize, title_keywords, extract_error_type
+import hashlib
+import time
+import numpy as np
+from utils.helpers import normalize_query, extract_error_type
+from backend import registry, telemetry
+from backend.memo import MemoCache
+from backend.reranker import BudgetedReranker, truncate_to_window
+from backend.bm25 import reciprocal_rank_fusion
+from backend.context import assemble_context, split_header, truncate_to_tokens
+from backend.llm_client import LLMUnavailable
+from backend.router import partitioned_query
 from backend.config import (
-    CHROMA_DB_PATH,
-    COLLECTION_NAME,
-    GEMINI_MODEL,
-    GEMINI_API_KEY_ENV,
     N_RESULTS,
     TOP_K,
+    CONTEXT_TOKEN_BUDGET,
+    RRF_K,
+    FUSED_RESULTS,
     LLM_PROMPT_TEMPLATE,
+    FOLLOWUP_QUESTIONS,
+    EMBEDDING_MEMO_SIZE,
+    RETRIEVAL_MEMO_SIZE,
+    SCORE_MEMO_SIZE,
+    RERANK_P95_TARGET_MS,
+    RERANK_MIN_CANDIDATES,
+    RERANK_DECISIVE_MARGIN,
+    RERANK_TOKEN_WINDOW,
+    LLM_FALLBACK_CACHE_THRESHOLD,
+    LLM_FALLBACK_EXCERPT_TOKENS,
+    LLM_FALLBACK_NOTICE,
 )
 
-load_dotenv()
+NO_ANSWER_RESPONSE = "Sorry, I couldn't find an answer to your question in my knowledge base."
+
+
+def _may_be_unknown(text):
+    """
+    Whether streamed text so far could still be an "I don't know" answer.
+    """
+
+    head = text.strip().lower()
+    return "i don't know".startswith(head) or head.startswith("i don't know")
+
+
+def _outcome(sources, trace):
+    if any("fallback" in span.attrs for span in trace.spans):
+        return "fallback"
+    if sources:
+        return "answered"
+    if any("error" in span.attrs for span in trace.spans):
+        return "error"
+    return "no_answer"
+
 
 class Chatbot:
     """
     Chatbot class to handle embedding, retrieval, reranking, and response generation.
+    Models and the Chroma collection come from the process-wide registry, so
+    creating several Chatbot instances does not load extra copies.
     """
 
-    def __init__(self):
-        self.model = SentenceTransformer('all-mpnet-base-v2', device="cpu")
-        self.cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2', device="cpu")
-        self.client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-        self.collection = self.client.get_or_create_collection(COLLECTION_NAME)
-        self.genai_client = genai.Client(api_key=os.getenv(GEMINI_API_KEY_ENV))
+    def __init__(self, genai_client=None):
+        self.model = registry.get_encoder()
+        self.cross_encoder = registry.get_cross_encoder()
+        # Pool single queries and rerank pairs with concurrent requests (None when disabled)
+        self.embedding_batcher = registry.get_embedding_batcher()
+        self.rerank_batcher = registry.get_rerank_batcher()
+        self.client = registry.get_chroma_client()
+        self.collection = registry.get_collection()
+        # Pass a stub client (see backend.stub_llm) to run without a Gemini key
+        self.genai_client = genai_client if genai_client is not None else registry.get_genai_client()
+        # Deadline, retries, hedging and circuit breaker around the client
+        self.llm = registry.get_llm() if genai_client is None else registry.build_llm(genai_client)
+        self.answer_cache = registry.get_answer_cache()
+        self.bm25_index = registry.get_bm25_index()
+        # Picks the source partitions to search per query (None: whole collection)
+        self.router = registry.get_router()
+        self.partition_pool = registry.get_partition_pool()
+        # Bumped on every index swap so results retrieved from an old
+        # snapshot are never memoized for the new one
+        self.index_generation = 0
+        self.embedding_memo = MemoCache("embedding", EMBEDDING_MEMO_SIZE)
+        self.retrieval_memo = MemoCache("retrieval", RETRIEVAL_MEMO_SIZE)
+        self.score_memo = MemoCache("cross_encoder_score", SCORE_MEMO_SIZE)
+        self.reranker = BudgetedReranker(
+            target_ms=RERANK_P95_TARGET_MS,
+            min_candidates=max(TOP_K, RERANK_MIN_CANDIDATES),
+            max_candidates=N_RESULTS,
+            decisive_margin=RERANK_DECISIVE_MARGIN,
+        )
 
     def embed_query(self, query):
         """
         Generate embedding for the user query.
         """
-        return self.model.encode([query]).tolist()
+        key = normalize_query(query)
+        with telemetry.span("embed") as span:
+            emb = self.embedding_memo.get(key)
+            span.attrs["cache"] = {"embedding": emb is not None}
+            if emb is None:
+                if self.embedding_batcher is not None:
+                    emb = np.asarray(self.embedding_batcher.submit([query])).tolist()
+                else:
+                    emb = self.model.encode([query]).tolist()
+                self.embedding_memo.put(key, emb)
+        return emb
 
-    def retrieve_documents(self, query_emb, n_results=N_RESULTS):
+    def retrieve_documents(self, query_emb, n_results=N_RESULTS, query_text=None):
         """
         Retrieve documents from ChromaDB based on the query embedding.
+        When query_text is given and a BM25 index exists, vector and BM25
+        hits are fused with reciprocal rank fusion and the best
+        FUSED_RESULTS are returned.
+        Each returned metadata dict carries its chunk ID under 'chunk_id'
+        and its bi-encoder distance under 'distance' (None for BM25-only hits).
+        With a partition router, only the partition the query is routed to
+        is searched, or every partition in parallel when routing is unsure.
         """
-    
-        results = self.collection.query(
-            query_embeddings=query_emb,
-            n_results=n_results,
-            include=['documents', 'metadatas', 'distances']
+
+        hybrid = query_text is not None and self.bm25_index is not None
+        key = (
+            self.index_generation,
+            hashlib.sha1(np.asarray(query_emb, dtype=np.float32).tobytes()).hexdigest(),
+            n_results,
+            normalize_query(query_text) if hybrid else None,
         )
+        with telemetry.span("retrieve", hybrid=hybrid) as span:
+            cached = self.retrieval_memo.get(key)
+            span.attrs["cache"] = {"retrieval": cached is not None}
+            if cached is not None:
+                docs, metas = cached
+                span.attrs["candidates"] = len(docs)
+                return list(docs), [dict(meta) for meta in metas]
+
+            partitions, routed = self.router.route(query_emb) if self.router is not None else (None, False)
+            if partitions is not None:
+                span.attrs["partitions"] = partitions
+            docs, metas = self.vector_search(query_emb, n_results, partitions)
+            if hybrid:
+                docs, metas = self.fuse_lexical(query_text, docs, metas, n_results,
+                                                partitions if routed else None)
+            span.attrs["candidates"] = len(docs)
+        self.retrieval_memo.put(key, (list(docs), [dict(meta) for meta in metas]))
+        return docs, metas
+
+    def vector_search(self, query_emb, n_results=N_RESULTS, partitions=None):
+        """
+        Nearest neighbours of the query embedding in the collection, or in
+        the given source partitions only.
+        """
+
+        with telemetry.span("vector_search", n_results=n_results) as span:
+            if partitions is None:
+                results = self.collection.query(
+                    query_embeddings=query_emb,
+                    n_results=n_results,
+                    include=['documents', 'metadatas', 'distances']
+                )
+            else:
+                results, partition_ms = partitioned_query(self.collection, query_emb, n_results, partitions,
+                                                          self.partition_pool)
+                span.attrs["partition_ms"] = {p: round(ms, 2) for p, ms in partition_ms.items()}
         docs = results.get('documents', [[]])[0]
-        metas = results.get('metadatas', [[]])[0]
+        metas = [dict(meta or {}) for meta in results.get('metadatas', [[]])[0]]
+        distances = (results.get('distances') or [[]])[0] or [None] * len(metas)
+        for meta, cid, distance in zip(metas, results.get('ids', [[]])[0], distances):
+            meta['chunk_id'] = cid
+            meta['distance'] = distance
         return docs, metas
 
+    def fuse_lexical(self, query_text, docs, metas, n_results=N_RESULTS, partitions=None):
+        """
+        Fuse vector hits with BM25 hits by reciprocal rank fusion, fetching
+        documents for BM25-only hits from the collection. With partitions,
+        BM25 hits from other sources (told apart by chunk ID prefix) are dropped.
+        """
+
+        with telemetry.span("bm25") as span:
+            if partitions is None:
+                lexical_ids = [cid for cid, _ in self.bm25_index.search(query_text, n_results)]
+            else:
+                prefixes = tuple(partitions)
+                lexical_ids = [cid for cid, _ in self.bm25_index.search(query_text, 2 * n_results)
+                               if cid.startswith(prefixes)][:n_results]
+            span.attrs["candidates"] = len(lexical_ids)
+        by_id = {meta['chunk_id']: (doc, meta) for doc, meta in zip(docs, metas)}
+        missing = [cid for cid in lexical_ids if cid not in by_id]
+        if missing:
+            fetched = self.collection.get(ids=missing, include=['documents', 'metadatas'])
+            for cid, doc, meta in zip(fetched['ids'], fetched['documents'], fetched['metadatas']):
+                meta = dict(meta or {})
+                meta['chunk_id'] = cid
+                meta['distance'] = None
+                by_id[cid] = (doc, meta)
+        vector_ids = [meta['chunk_id'] for meta in metas]
+        lexical_ids = [cid for cid in lexical_ids if cid in by_id]
+        ranked, fused = reciprocal_rank_fusion([vector_ids, lexical_ids], k=RRF_K)
+        ranked = ranked[:FUSED_RESULTS]
+        for cid in ranked:
+            by_id[cid][1]['rrf_score'] = fused[cid]
+        return [by_id[cid][0] for cid in ranked], [by_id[cid][1] for cid in ranked]
+
+    def cross_encode(self, user_query, docs, metas):
+        """
+        Cross-encoder scores for (query, doc) pairs, memoized per
+        (normalized query, chunk_id). Only unseen pairs are scored, each
+        truncated to the cross-encoder token window. Returns (scores, n_scored).
+        """
+
+        query_key = normalize_query(user_query)
+        scores = np.zeros(len(docs), dtype=np.float32)
+        missing = []
+        for i, meta in enumerate(metas):
+            cid = meta.get('chunk_id')
+            score = self.score_memo.get((query_key, cid)) if cid is not None else None
+            if score is None:
+                missing.append(i)
+            else:
+                scores[i] = score
+        telemetry.annotate(scored=len(missing), cache={"cross_encoder_score": len(missing) < len(docs)})
+        if missing:
+            pairs = [(user_query, truncate_to_window(docs[i], RERANK_TOKEN_WINDOW)) for i in missing]
+            if self.rerank_batcher is not None:
+                predicted = self.rerank_batcher.submit(pairs)
+            else:
+                predicted = self.cross_encoder.predict(pairs)
+            for i, score in zip(missing, predicted):
+                scores[i] = score
+                cid = metas[i].get('chunk_id')
+                if cid is not None:
+                    self.score_memo.put((query_key, cid), float(score))
+        return scores, len(missing)
+
     def rerank_documents(self, user_query, docs, metas, top_k=TOP_K):
         """
-        Rerank documents using a cross-encoder and title matching.
+        Rerank documents using a cross-encoder and title matching, scoring
+        only as many candidates as the latency budget allows.
         """
         if not docs or not metas:
             return (
@@ -59,58 +241,269 @@ class Chatbot:
                 []
             )
 
-        pairs = [(user_query, doc) for doc in docs]
-        scores = self.cross_encoder.predict(pairs)
-        keywords = set(user_query.lower().split())
+        with telemetry.span("rerank", candidates=len(docs)):
+            return self.reranker.rerank(user_query, docs, metas, self.cross_encode, top_k)
 
-        # Boost scores based on title keyword matches
-        for i, meta in enumerate(metas):
-            title_norm = normalize(meta.get('section_title', ''))
-            title_kw = title_keywords(meta.get('section_title', ''))
-            if len(title_kw & keywords) / max(1, len(title_kw)) > 0.6:
-                scores[i] += 2.0
-            elif any(k in title_norm for k in keywords):
-                scores[i] += 0.75
+    def build_prompt(self, user_query, context_docs):
+        """
+        Build the LLM prompt from the reranked context documents, merged and
+        de-overlapped within CONTEXT_TOKEN_BUDGET. Returns (prompt, used_docs,
+        stats); documents cut by the budget are not in used_docs.
+        """
+
+        context_text, used_docs, stats = assemble_context(context_docs, CONTEXT_TOKEN_BUDGET)
+        return LLM_PROMPT_TEMPLATE.format(context=context_text, question=user_query), used_docs, stats
+
+    @staticmethod
+    def context_sources(context_docs):
+        """
+        Unique source URLs of the context documents.
+        """
+
+        return list({meta.get('url') for _, meta, _ in context_docs if meta.get('url')})
+
+    @staticmethod
+    def prompt_attrs(prompt, response=None):
+        """
+        Prompt size attributes for tracing. Uses the provider's token count
+        when the response carries usage metadata, otherwise estimates it.
+        """
+
+        usage = getattr(response, "usage_metadata", None)
+        tokens = getattr(usage, "prompt_token_count", None)
+        if tokens is None:
+            return {"prompt_chars": len(prompt), "prompt_tokens": len(prompt) // 4, "prompt_tokens_estimated": True}
+        return {"prompt_chars": len(prompt), "prompt_tokens": tokens}
+
+    @staticmethod
+    def error_response(e):
+        """
+        User-facing message for an LLM call failure. The error class is
+        recorded on the current span.
+        """
 
-        reranked = sorted(zip(docs, metas, scores), key=lambda x: x[2], reverse=True)
-        return reranked[:top_k]
+        error_type = extract_error_type(e)
+        telemetry.annotate(error=error_type or type(e).__name__)
+        if error_type.startswith("5"):
+            return "Server error (5xx). Please try again later.", []
+        return "Error generating response.", []
 
-    def generate_llm_response(self, user_query, context_docs):
+    def fallback_response(self, context_docs, reason, cache_key=None):
+        """
+        Answer without the LLM after the call layer gave up: a cached answer
+        for a similar query over the same chunks if there is one, otherwise
+        the top reranked chunk quoted as-is. cache_key is (emb, chunk_ids).
+        The reason is recorded on the current span as 'fallback'.
+        """
+
+        if cache_key is not None and self.answer_cache is not None:
+            emb, chunk_ids = cache_key
+            cached = self.answer_cache.lookup(emb[0], chunk_ids, threshold=LLM_FALLBACK_CACHE_THRESHOLD)
+            if cached is not None:
+                telemetry.annotate(fallback=reason, fallback_kind="cached")
+                return cached
+        telemetry.annotate(fallback=reason, fallback_kind="extractive")
+        doc, meta, _ = context_docs[0]
+        title, body = split_header(doc)
+        excerpt = truncate_to_tokens(body.strip(), LLM_FALLBACK_EXCERPT_TOKENS)
+        heading = f"**{title}**\n\n" if title else ""
+        return f"{LLM_FALLBACK_NOTICE}\n\n{heading}{excerpt}", self.context_sources(context_docs[:1])
+
+    def generate_llm_response(self, user_query, context_docs, cache_key=None):
         """
         Generate a response using the LLM based on the user query and context documents.
+        When Gemini is unavailable (deadline, exhausted retries or open
+        circuit) a fallback answer is returned instead; see fallback_response.
         """
     
-        context_text = "\n\n".join([doc for doc, _, _ in context_docs])
-        prompt = LLM_PROMPT_TEMPLATE.format(context=context_text, question=user_query)
+        prompt, used_docs, context_stats = self.build_prompt(user_query, context_docs)
 
-        try:
-            response = self.genai_client.models.generate_content(
-                model=GEMINI_MODEL, contents=prompt
-            )
-            response_text = response.text.strip() if hasattr(response, "text") else str(response)
+        with telemetry.span("llm", **self.prompt_attrs(prompt), **context_stats) as span:
+            try:
+                response = self.llm.generate(prompt)
+                span.attrs.update(self.prompt_attrs(prompt, response))
+                response_text = response.text.strip() if hasattr(response, "text") else str(response)
 
-            if "i don't know" in response_text.lower():
-                return (
-                    "Sorry, I couldn't find an answer to your question in my knowledge base.",
-                    []
-                )
+                if "i don't know" in response_text.lower():
+                    span.attrs["no_answer"] = True
+                    return NO_ANSWER_RESPONSE, []
     
-            sources = list({meta.get('url') for _, meta, _ in context_docs if meta.get('url')})
-            return response_text, sources
-        except Exception as e:
-            error_type = extract_error_type(e)
-            if error_type.startswith("5"):
-                return "Server error (5xx). Please try again later.", []
-            return "Error generating response.", []
+                return response_text, self.context_sources(used_docs)
+            except LLMUnavailable as e:
+                return self.fallback_response(context_docs, e.reason, cache_key)
+            except Exception as e:
+                return self.error_response(e)
 
-    def generate_response(self, user_query):
+    def generate_llm_response_stream(self, user_query, context_docs, trace=None, cache_key=None):
         """
-        Main method to generate a response for the user query.
+        Stream a response from the LLM. Yields ("text", chunk) events as text
+        arrives and ends with one ("done", response_text, sources) event.
+        Output that may still turn into "I don't know" is held back, so the
+        user never sees it before it is replaced by the fallback message.
+        The "llm" span is recorded on trace (a new trace if not given).
+        """
+
+        own_trace = trace is None
+        trace = trace if trace is not None else telemetry.Trace("llm_stream")
+        prompt, used_docs, context_stats = self.build_prompt(user_query, context_docs)
+        with trace.span("llm", streaming=True, **self.prompt_attrs(prompt), **context_stats) as span:
+            try:
+                with telemetry.use_trace(trace):
+                    stream = self.llm.stream(prompt)
+                text = ""
+                emitted = 0
+                for chunk in stream:
+                    if "ttft_ms" not in span.attrs:
+                        span.attrs["ttft_ms"] = round((time.perf_counter() - span.start) * 1000, 3)
+                    text += getattr(chunk, "text", None) or ""
+                    if emitted == 0 and _may_be_unknown(text):
+                        continue
+                    if len(text) > emitted:
+                        yield "text", text[emitted:]
+                        emitted = len(text)
+            except LLMUnavailable as e:
+                with telemetry.use_trace(trace):
+                    event = ("done",) + self.fallback_response(context_docs, e.reason, cache_key)
+            except Exception as e:
+                with telemetry.use_trace(trace):
+                    event = ("done",) + self.error_response(e)
+            else:
+                response_text = text.strip()
+                if "i don't know" in response_text.lower():
+                    span.attrs["no_answer"] = True
+                    event = ("done", NO_ANSWER_RESPONSE, [])
+                else:
+                    event = ("done", response_text, self.context_sources(used_docs))
+        if own_trace:
+            trace.finish()
+        yield event
+
+    def prepare_context(self, user_query, context=None):
+        """
+        Run embedding, retrieval and reranking. Returns (emb, chunk_ids,
+        cached, top_docs) where cached is a cached (answer, sources) or None.
+        If context is a dict it receives 'retrieved_ids' and 'chunk_ids'
+        (the chunks the answer is built from).
         """
 
         emb = self.embed_query(user_query)
-        docs, metas = self.retrieve_documents(emb)
+        docs, metas = self.retrieve_documents(emb, query_text=user_query)
+        chunk_ids = [meta.get('chunk_id') for meta in metas]
+        if context is not None:
+            context['retrieved_ids'] = chunk_ids
+            context['chunk_ids'] = chunk_ids
+        if self.answer_cache is not None and chunk_ids:
+            with telemetry.span("answer_cache") as span:
+                cached = self.answer_cache.lookup(emb[0], chunk_ids)
+                span.attrs["cache"] = {"answer": cached is not None}
+            if cached is not None:
+                return emb, chunk_ids, cached, None
         top_docs = self.rerank_documents(user_query, docs, metas)
-        if not top_docs:
-            return "No relevant info found.", []
-        return self.generate_llm_response(user_query, top_docs)
+        if context is not None and isinstance(top_docs, list):
+            context['chunk_ids'] = [meta.get('chunk_id') for _, meta, _ in top_docs]
+        return emb, chunk_ids, None, top_docs
+
+    def remember_answer(self, emb, chunk_ids, response, sources, outcome="answered"):
+        # Only real answers are cached: not errors, "I don't know" or fallbacks
+        if self.answer_cache is not None and sources and outcome == "answered":
+            self.answer_cache.put(emb[0], chunk_ids, response, sources)
+
+    def generate_response(self, user_query, context=None):
+        """
+        Main method to generate a response for the user query.
+        Pass a dict as context to receive the chunk IDs behind the answer.
+        """
+
+        with telemetry.trace("generate_response") as trace:
+            emb, chunk_ids, cached, top_docs = self.prepare_context(user_query, context)
+            if cached is not None:
+                trace.attrs["outcome"] = "cached"
+                return cached
+            if not top_docs:
+                trace.attrs["outcome"] = "no_context"
+                return "No relevant info found.", []
+            response, sources = self.generate_llm_response(user_query, top_docs, cache_key=(emb, chunk_ids))
+            trace.attrs["outcome"] = _outcome(sources, trace)
+            self.remember_answer(emb, chunk_ids, response, sources, trace.attrs["outcome"])
+            return response, sources
+
+    def generate_response_stream(self, user_query, context=None):
+        """
+        Streaming variant of generate_response. Yields the same events as
+        generate_llm_response_stream.
+        """
+
+        trace = telemetry.Trace("generate_response_stream")
+        try:
+            with telemetry.use_trace(trace):
+                emb, chunk_ids, cached, top_docs = self.prepare_context(user_query, context)
+            if cached is not None:
+                trace.attrs["outcome"] = "cached"
+                yield "text", cached[0]
+                yield "done", cached[0], cached[1]
+                return
+            if not top_docs:
+                trace.attrs["outcome"] = "no_context"
+                yield "done", "No relevant info found.", []
+                return
+            for event in self.generate_llm_response_stream(user_query, top_docs, trace=trace,
+                                                           cache_key=(emb, chunk_ids)):
+                if event[0] == "done":
+                    trace.attrs["outcome"] = _outcome(event[2], trace)
+                    self.remember_answer(emb, chunk_ids, event[1], event[2], trace.attrs["outcome"])
+                yield event
+        except Exception as e:
+            trace.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            trace.finish()
+
+    def warm_up(self, questions=FOLLOWUP_QUESTIONS):
+        """
+        Run embedding, retrieval and reranking for each question so the
+        suggestion buttons hit warm caches and warm model kernels.
+        """
+
+        for question in questions:
+            emb = self.embed_query(question)
+            docs, metas = self.retrieve_documents(emb, query_text=question)
+            self.rerank_documents(question, docs, metas)
+
+    def swap_index(self, collection, bm25_index, router=None):
+        """
+        Serve from another collection (and its BM25 index and router) from
+        the next retrieval on; requests already past retrieval finish on the
+        old one.
+        """
+
+        self.collection, self.bm25_index, self.router = collection, bm25_index, router
+        self.index_generation += 1
+        self.clear_caches()
+
+    def clear_caches(self):
+        """
+        Drop every memoized stage result and cached answer, e.g. after the
+        collection changed.
+        """
+
+        self.embedding_memo.clear()
+        self.retrieval_memo.clear()
+        self.score_memo.clear()
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate()
+
+    def cache_stats(self):
+        """
+        Hit and miss counters for every cache in the pipeline.
+        """
+
+        stats = {memo.name: memo.stats() for memo in (self.embedding_memo, self.retrieval_memo, self.score_memo)}
+        for batcher in (self.embedding_batcher, self.rerank_batcher):
+            if batcher is not None:
+                stats[f"{batcher.name}_batcher"] = batcher.stats()
+        if self.answer_cache is not None:
+            stats["answer"] = self.answer_cache.stats()
+        stats["llm"] = self.llm.stats()
+        if self.router is not None:
+            stats["router"] = self.router.stats()
+        return stats
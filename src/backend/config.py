@@ -1,5 +1,6 @@
 # ChromaDB settings
 import os
+from functools import lru_cache
 
 MAX_QUERY_LENGTH = 256
 
@@ -7,13 +8,122 @@ CHROMA_DB_ZIP_URL = "https://drive.google.com/uc?export=download&id=1h01HNP2jsbY
 CHROMA_DB_PATH = os.environ.get("CHROMA_DB_PATH", "./data/chroma_db")
 COLLECTION_NAME = "handbook_chunks"
 
+# Versioned snapshots of the Chroma directory (see backend/snapshots.py).
+# CHROMA_DB_PATH is used as long as no versioned snapshot has been activated.
+SNAPSHOT_ROOT = os.environ.get("SNAPSHOT_ROOT", "./data/snapshots")
+SNAPSHOT_MANIFEST = os.environ.get("SNAPSHOT_MANIFEST")  # URL or path of the manifest to install from
+SNAPSHOT_MIRROR = os.environ.get("SNAPSHOT_MIRROR")  # Local directory or base URL serving the snapshot zips
+SNAPSHOT_RETENTION = int(os.environ.get("SNAPSHOT_RETENTION", "3"))  # Installed versions kept for rollback
+SNAPSHOT_POLL_INTERVAL = float(os.environ.get("SNAPSHOT_POLL_INTERVAL", "30"))  # Seconds; 0 disables hot swap
+
+# Model settings
+EMBEDDING_MODEL = "all-mpnet-base-v2"
+CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+MODEL_DEVICE = "cpu"
+# One of torch, torch-int8, onnx, onnx-int8 (see backend/inference.py)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "torch")
+CROSS_ENCODER_BACKEND = os.environ.get("CROSS_ENCODER_BACKEND", INFERENCE_BACKEND)
+INGEST_INFERENCE_BACKEND = os.environ.get("INGEST_INFERENCE_BACKEND", "torch")
+ONNX_EXPORT_DIR = os.environ.get("ONNX_EXPORT_DIR", "./data/onnx")
+ONNX_QUANTIZATION = os.environ.get("ONNX_QUANTIZATION", "avx2")  # arm64, avx2, avx512 or avx512_vnni
+
+# HTML parser used by ingestion: html.parser, or lxml (pip install lxml) for faster parsing
+HTML_PARSER = os.environ.get("HTML_PARSER", "html.parser")
+
 # Gemini API settings
 GEMINI_MODEL = "gemini-2.5-flash"
 GEMINI_API_KEY_ENV = "GEMINI_API_KEY"
+STREAM_RESPONSES = os.environ.get("STREAM_RESPONSES", "1") == "1"
+
+# Gemini call layer (backend/llm_client.py)
+LLM_DEADLINE_S = float(os.environ.get("LLM_DEADLINE_S", "20"))  # Per request, retries included; to first chunk when streaming
+LLM_MAX_ATTEMPTS = int(os.environ.get("LLM_MAX_ATTEMPTS", "3"))
+LLM_BACKOFF_BASE_S = 0.25
+LLM_BACKOFF_MAX_S = 2.0
+LLM_RETRY_BUDGET = float(os.environ.get("LLM_RETRY_BUDGET", "0.2"))  # Retries + hedges allowed per request, on average
+LLM_HEDGING = os.environ.get("LLM_HEDGING", "0") == "1"
+LLM_HEDGE_MIN_DELAY_S = float(os.environ.get("LLM_HEDGE_MIN_DELAY_S", "1.0"))  # Floor for the p95-based hedge delay
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))  # Consecutive failed requests that open the breaker
+LLM_BREAKER_COOLDOWN_S = float(os.environ.get("LLM_BREAKER_COOLDOWN_S", "30"))
+LLM_FALLBACK_CACHE_THRESHOLD = 0.85  # Looser answer cache match accepted while Gemini is unavailable
+LLM_FALLBACK_EXCERPT_TOKENS = 250
+LLM_FALLBACK_NOTICE = (
+    "The answer service is temporarily unavailable. "
+    "Here is the most relevant passage from the handbook:"
+)
 
 # Retrieval settings
 N_RESULTS = 15
 TOP_K = 3
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1500"))  # Estimated tokens of context in the prompt
+
+# Hybrid lexical + vector retrieval. The BM25 index lives in this
+# subdirectory of the Chroma directory so it travels with the database snapshot.
+BM25_DIR_NAME = "bm25"
+HYBRID_RETRIEVAL = os.environ.get("HYBRID_RETRIEVAL", "1") == "1"
+
+# Vector retrieval backend: "chroma", or "numpy" for the memory-mapped
+# quantized index (backend/vector_index.py) stored in this subdirectory of
+# the Chroma directory. Falls back to Chroma when the index was not built.
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma")
+VECTOR_INDEX_DIR_NAME = "vectors"
+VECTOR_QUANTIZATION = os.environ.get("VECTOR_QUANTIZATION", "int8")  # int8 or binary
+VECTOR_OVERSAMPLE = int(os.environ.get("VECTOR_OVERSAMPLE", "4"))  # Candidates re-scored in float per result
+
+# Source-partitioned retrieval. Chunks are partitioned by 'source_prefix';
+# the router (backend/router.py) stored in this file of the Chroma directory
+# sends a query to one partition or fans out to all of them in parallel.
+PARTITION_ROUTING = os.environ.get("PARTITION_ROUTING", "0") == "1"
+PARTITION_ROUTER_FILE = "partitions.npz"
+ROUTER_CENTROIDS = 8  # k-means centroids per partition
+ROUTER_MARGIN = float(os.environ.get("ROUTER_MARGIN", "0.05"))  # Cosine lead needed to search a single partition
+PARTITION_WORKERS = 4  # Threads for fanned-out partition queries
+RRF_K = 60
+FUSED_RESULTS = 10  # Candidates passed on to the reranker after fusion
+
+# Reranking budget
+RERANK_P95_TARGET_MS = float(os.environ.get("RERANK_P95_TARGET_MS", "150"))
+RERANK_MIN_CANDIDATES = 5
+RERANK_DECISIVE_MARGIN = 0.35  # Squared L2 distance beyond the best candidate that is never reranked
+RERANK_TOKEN_WINDOW = 256  # Tokens of each candidate passed to the cross-encoder
+
+# Retrieval stage memo caches
+EMBEDDING_MEMO_SIZE = 2048  # normalized query -> embedding
+RETRIEVAL_MEMO_SIZE = 2048  # embedding -> retrieved chunks
+SCORE_MEMO_SIZE = 50000  # (normalized query, chunk_id) -> cross-encoder score
+WARMUP_ON_STARTUP = os.environ.get("WARMUP_ON_STARTUP", "1") == "1"
+
+# Cross-request micro-batching of query embeddings and cross-encoder pairs
+MICRO_BATCHING = os.environ.get("MICRO_BATCHING", "1") == "1"
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "2"))  # Max time a request waits for others to join
+EMBED_MAX_BATCH = int(os.environ.get("EMBED_MAX_BATCH", "32"))  # Queries per batched encode
+RERANK_MAX_BATCH = int(os.environ.get("RERANK_MAX_BATCH", "128"))  # Pairs per batched cross-encoder pass
+
+# Feedback store
+FEEDBACK_DB_PATH = os.environ.get("FEEDBACK_DB_PATH", "./data/feedback.sqlite")
+
+# Telemetry settings
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))  # Serve Prometheus /metrics on this port when set
+METRICS_FILE = os.environ.get("METRICS_FILE")  # Periodically write Prometheus text to this file when set
+ADMIN_PANEL = os.environ.get("ADMIN_PANEL", "0") == "1"
+
+# Streamlit UI settings
+UI_ANSWER_WORKERS = int(os.environ.get("UI_ANSWER_WORKERS", "8"))  # Questions answered at once across all sessions
+UI_POLL_INTERVAL_S = float(os.environ.get("UI_POLL_INTERVAL_S", "0.25"))  # Refresh of the pending answer
+UI_HISTORY_TURNS = int(os.environ.get("UI_HISTORY_TURNS", "20"))  # Question/answer pairs kept per session
+
+# HTTP API settings
+API_INFERENCE_WORKERS = int(os.environ.get("API_INFERENCE_WORKERS", "2"))  # Concurrent embed/retrieve/rerank
+API_LLM_WORKERS = int(os.environ.get("API_LLM_WORKERS", "32"))  # Concurrent blocking Gemini calls
+API_MAX_QUEUE = int(os.environ.get("API_MAX_QUEUE", "64"))  # Waiting requests before 503
+
+# Semantic answer cache settings
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "1") == "1"
+ANSWER_CACHE_THRESHOLD = 0.95  # Min cosine similarity between query embeddings
+ANSWER_CACHE_TTL = 6 * 3600  # Seconds
+ANSWER_CACHE_MAX_ENTRIES = 1000
+ANSWER_CACHE_MAX_BYTES = 64 * 1024 * 1024
+ANSWER_CACHE_PATH = os.environ.get("ANSWER_CACHE_PATH")  # Optional SQLite file shared across processes
 
 FOLLOWUP_QUESTIONS = [
     "What are GitLab's core values?",
@@ -50,5 +160,13 @@ LLM_PROMPT_TEMPLATE = (
 
 
 SVG_PATH = os.path.join(os.path.dirname(__file__), "../assets/gitlab.svg")
-with open(SVG_PATH, "r") as f:
-    GITLAB_SVG = f.read()
\ No newline at end of file
+
+
+@lru_cache(maxsize=1)
+def gitlab_svg():
+    """
+    GitLab logo markup, read on first use rather than at import.
+    """
+
+    with open(SVG_PATH, "r") as f:
+        return f.read()
\ No newline at end of file
@@ -0,0 +1,136 @@
+"""
+Token-budgeted context assembly for the LLM prompt.
+
+Reranked chunks are grouped by (url, section title). Within a group,
+sub-chunks that the splitter cut with overlap are stitched back together
+with the repeated text removed, and the "Section title:" header is
+written once. Groups are emitted best score first until the token budget
+is used up; the last group that does not fit whole is cut at a word
+boundary.
+"""
+
+HEADER_PREFIX = "Section title: "
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+
+def split_header(doc):
+    """
+    (section title, body) of a stored chunk; title is None without a header.
+    """
+
+    if doc.startswith(HEADER_PREFIX):
+        title, _, body = doc[len(HEADER_PREFIX):].partition("\n")
+        return title, body
+    return None, doc
+
+
+def overlap_length(first, second, max_overlap=400, min_overlap=20):
+    """
+    Length of the longest suffix of first that is also a prefix of second.
+    Overlaps shorter than min_overlap are treated as coincidence.
+    """
+
+    longest = min(len(first), len(second), max_overlap)
+    for size in range(longest, min_overlap - 1, -1):
+        if first.endswith(second[:size]):
+            return size
+    return 0
+
+
+def stitch(bodies, max_overlap=400, min_overlap=20):
+    """
+    Chain bodies whose tail overlaps another's head into single passages.
+    Returns the passages in the order of their first body.
+    """
+
+    bodies = list(bodies)
+    successor = {}
+    has_predecessor = set()
+    for i, first in enumerate(bodies):
+        best, best_size = None, 0
+        for j, second in enumerate(bodies):
+            if i == j or j in has_predecessor:
+                continue
+            size = overlap_length(first, second, max_overlap, min_overlap)
+            if size > best_size:
+                best, best_size = j, size
+        if best is not None:
+            successor[i] = (best, best_size)
+            has_predecessor.add(best)
+
+    passages = []
+    visited = set()
+    for start in range(len(bodies)):
+        if start in has_predecessor or start in visited:
+            continue
+        text, current = bodies[start], start
+        visited.add(start)
+        while current in successor and successor[current][0] not in visited:
+            nxt, size = successor[current]
+            text += bodies[nxt][size:]
+            visited.add(nxt)
+            current = nxt
+        passages.append(text)
+    # Bodies left over form a cycle (only possible with repeated text); keep them as-is
+    passages.extend(bodies[i] for i in range(len(bodies)) if i not in visited)
+    return passages
+
+
+def truncate_to_tokens(text, max_tokens):
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > limit // 2 else limit].rstrip() + " …"
+
+
+def assemble_context(context_docs, token_budget, min_tail_tokens=50):
+    """
+    Build the prompt context from (doc, meta, score) triples.
+    Returns (context_text, used_docs, stats); used_docs are the triples
+    that made it into the context, so only they are cited as sources.
+    """
+
+    groups = {}
+    for doc, meta, score in context_docs:
+        title, body = split_header(doc)
+        key = (meta.get("url"), meta.get("section_title", title))
+        group = groups.setdefault(key, {"title": title, "bodies": [], "docs": [], "score": score})
+        if body not in group["bodies"]:
+            group["bodies"].append(body)
+        group["docs"].append((doc, meta, score))
+        group["score"] = max(group["score"], score)
+
+    parts, used_docs = [], []
+    remaining = token_budget
+    truncated = False
+    for group in sorted(groups.values(), key=lambda g: g["score"], reverse=True):
+        body = "\n…\n".join(stitch(group["bodies"]))
+        text = f"{HEADER_PREFIX}{group['title']}\n{body}" if group["title"] is not None else body
+        tokens = estimate_tokens(text)
+        if tokens > remaining:
+            if remaining < min_tail_tokens:
+                break
+            text = truncate_to_tokens(text, remaining)
+            tokens = estimate_tokens(text)
+            truncated = True
+        parts.append(text)
+        used_docs.extend(group["docs"])
+        remaining -= tokens
+        if truncated:
+            break
+
+    context_text = "\n\n".join(parts)
+    raw_chars = len("\n\n".join(doc for doc, _, _ in context_docs))
+    stats = {
+        "context_docs": len(context_docs),
+        "context_passages": len(parts),
+        "context_chars_raw": raw_chars,
+        "context_chars": len(context_text),
+        "context_truncated": truncated,
+    }
+    return context_text, used_docs, stats
@@ -1,15 +1,43 @@
+import argparse
+import asyncio
+import hashlib
+import importlib.util
+import os
 import requests
 import time
+import aiohttp
 import chromadb
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
+from functools import lru_cache
 from urllib.parse import urljoin, urlparse, urldefrag
 from collections import deque
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
+from backend.config import HTML_PARSER, INGEST_INFERENCE_BACKEND
+from backend.inference import load_encoder
+from backend import router, vector_index
+from backend.bm25 import build_from_collection
+from utils.helpers import normalize, title_keywords
+from backend.embedding_cache import EmbeddingCache
+from backend.dedup import SignatureIndex
+from backend.ingest_state import CrawlCheckpoint, PageStateStore
+from backend import sitemap
+
+model_name = 'all-mpnet-base-v2'
+_model = None
+
+def get_model():
+    """
+    Load the embedding model on first use, so worker processes that only
+    parse pages never pay for it.
+    """
+
+    global _model
+    if _model is None:
+        _model = load_encoder(model_name, INGEST_INFERENCE_BACKEND, device=None)
+    return _model
 
-model = SentenceTransformer('all-mpnet-base-v2')
 def get_embedding(text):
-    return model.encode(text).tolist()
+    return get_model().encode(text).tolist()
 
 # ---- CONFIG ----
 BASE_URLS = [
@@ -18,6 +46,17 @@ BASE_URLS = [
 ]
 MAX_DEPTH = 3
 BATCH_SIZE = 100  # Save progress after every 100 URLs
+INGEST_DB_PATH = "./data/chroma_db2"
+COLLECTION_NAME = "handbook_chunks"
+REQUEST_TIMEOUT = 10
+CRAWL_CONCURRENCY = 8  # Max in-flight requests in async mode
+REQUESTS_PER_SECOND = 4.0  # Per-host token bucket rate in async mode
+EMBEDDING_CACHE_PATH = "./data/embedding_cache.sqlite"
+INGEST_STATE_PATH = "./data/ingest_state.sqlite"
+DEDUP_INDEX_NAME = "dedup.sqlite"  # Near-duplicate signatures, stored in the Chroma directory
+DEDUP_THRESHOLD = 0.8  # Estimated Jaccard similarity of word shingles at which chunks count as copies
+CRAWL_CHECKPOINT_PATH = "./data/crawl_checkpoint.sqlite"
+FLUSH_INTERVAL_S = 60  # Checkpointed crawl: also flush when this long has passed since the last flush
 
 def normalize_url(url):
     """
@@ -47,25 +86,50 @@ def is_allowed_url(url, base_url):
         not parsed.query
     )
 
+def extract_links(soup, url, url_filter=None):
+    """
+    Extract all valid subpage links from an already parsed page.
+    """
+
+    links = set()
+    for a in soup.find_all("a", href=True):
+        full_url = urljoin(url, a["href"])
+        if url_filter is None or url_filter(full_url):
+            links.add(normalize_url(full_url))
+    return links
+
 def get_subpage_links(url, url_filter=None):
     """
     Fetch the page and extract all valid subpage links.
     """
 
     try:
-        resp = requests.get(url, timeout=10)
+        resp = requests.get(url, timeout=REQUEST_TIMEOUT)
         resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "html.parser")
-        links = set()
-        for a in soup.find_all("a", href=True):
-            full_url = urljoin(url, a["href"])
-            if url_filter is None or url_filter(full_url):
-                links.add(normalize_url(full_url))
-        return links
+        soup = parse_html(resp.text)
+        return extract_links(soup, url, url_filter)
     except Exception as e:
         print(f"Error fetching links from {url}: {e}")
         return set()
 
+@lru_cache(maxsize=1)
+def html_parser():
+    """
+    The configured HTML_PARSER, or html.parser when it is not installed.
+    """
+
+    if HTML_PARSER != "html.parser" and importlib.util.find_spec(HTML_PARSER) is None:
+        print(f"[ingest] HTML parser {HTML_PARSER} is not installed, using html.parser")
+        return "html.parser"
+    return HTML_PARSER
+
+def parse_html(html):
+    """
+    Parse a page with the configured HTML parser.
+    """
+
+    return BeautifulSoup(html, html_parser())
+
 def extract_main_content(soup):
     """
     Extract the main content area from the soup.
@@ -76,46 +140,71 @@ def extract_main_content(soup):
         main = soup
     return main
 
+HEADINGS = frozenset(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+
+def ends_section(name):
+    """
+    Whether a sibling element ends the current section: any heading, and
+    also <hr>, which matches the same two-letter "h" rule.
+    """
+
+    return name is not None and name.startswith('h') and len(name) == 2
+
+def section_lines(el):
+    """
+    Lines a section takes from one sibling element that follows its heading.
+    """
+
+    name = el.name
+    if name == 'p' or name == 'div':
+        return [el.get_text(strip=True)]
+    if name == 'li':
+        return [f"- {el.get_text(strip=True)}"]
+    if name in ('ul', 'ol'):
+        return [f"- {li.get_text(strip=True)}" for li in el.find_all('li')]
+    return []
+
 def chunk_content(soup, url):
     """
     Chunk the content of the page into smaller sections.
+
+    One pass over the tree: each element's children are scanned once, and
+    every heading collects the siblings after it up to the next heading.
+    Text before the first heading of the main element becomes the
+    "Introduction" chunk. Sections come out in document order of their
+    headings, nested headings included.
     """
 
     main = extract_main_content(soup)
-    chunks = []
-
-    # Step 1: capture any text BEFORE the first heading
     intro_parts = []
-    for el in main.children:
-        if getattr(el, "name", None) and el.name.startswith('h') and len(el.name) == 2:
-            break
-        if el.name == 'p':
-            intro_parts.append(el.get_text(strip=True))
-        elif el.name == 'div':
-            intro_parts.append(el.get_text(strip=True))
+    pending = {}  # id(heading) -> lines collected while scanning its parent
+    sections = []
+    stack = [main]
+    while stack:
+        el = stack.pop()
+        if el.name in HEADINGS and el is not main:
+            lines = pending.pop(id(el))
+            if lines:
+                sections.append({"section_title": el.get_text(strip=True), "text": "\n".join(lines), "url": url})
+
+        children = [child for child in el.contents if isinstance(child, Tag)]
+        in_intro = el is main
+        current = None
+        for child in children:
+            if ends_section(child.name):
+                in_intro = False
+                current = None
+                if child.name in HEADINGS:
+                    current = pending[id(child)] = []
+            elif current is not None:
+                current.extend(section_lines(child))
+            elif in_intro and child.name in ('p', 'div'):
+                intro_parts.append(child.get_text(strip=True))
+        stack.extend(reversed(children))
+
     if intro_parts:
-        chunks.append({"section_title": "Introduction", "text": "\n".join(intro_parts), "url": url})
-
-    # Step 2: normal heading-based chunks
-    for heading in main.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-        section_title = heading.get_text(strip=True)
-        section_content = []
-        for sib in heading.find_next_siblings():
-            if sib.name and sib.name.startswith('h') and len(sib.name) == 2:
-                break
-            if sib.name == 'p':
-                section_content.append(sib.get_text(strip=True))
-            elif sib.name == 'li':
-                section_content.append(f"- {sib.get_text(strip=True)}")
-            elif sib.name in ['ul', 'ol']:
-                for li in sib.find_all('li'):
-                    section_content.append(f"- {li.get_text(strip=True)}")
-            elif sib.name == 'div':
-                section_content.append(sib.get_text(strip=True))
-        if section_content:
-            chunks.append({"section_title": section_title, "text": "\n".join(section_content), "url": url})
-
-    return chunks
+        sections.insert(0, {"section_title": "Introduction", "text": "\n".join(intro_parts), "url": url})
+    return sections
 
 splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=250)
 
@@ -124,7 +213,7 @@ def get_next_chunk_id(collection, id_prefix):
     Get the next available chunk ID with the given prefix.
     """
 
-    all_ids = collection.get()['ids']
+    all_ids = collection.get(include=[])['ids']
     max_id = 0
     for cid in all_ids:
         if cid.startswith(id_prefix):
@@ -136,34 +225,87 @@ def get_next_chunk_id(collection, id_prefix):
                 continue
     return max_id + 1
 
-def save_to_chroma(chunks, collection, chunk_id_start, id_prefix=""):
+def make_chunk_id(id_prefix, url, section_title, text):
     """
-    Save the list of chunks to ChromaDB collection.
+    Deterministic chunk ID derived from URL, section and content hash.
+    """
+
+    digest = hashlib.sha1(f"{url}\n{section_title}\n{text}".encode("utf-8")).hexdigest()[:20]
+    return f"{id_prefix}{digest}"
+
+def split_chunks(chunks, id_prefix=""):
+    """
+    Split section chunks into sub-chunks ready for ChromaDB.
+    Returns (documents, metadatas, content_ids) where content_ids are
+    deterministic; identical sub-chunks within a section are kept once.
     """
 
     documents = []
     metadatas = []
     ids = []
-    sub_chunk_count = 0
-    for i, chunk in enumerate(chunks):
-        sub_chunks = splitter.split_text(chunk["text"])
-        for j, sub_text in enumerate(sub_chunks):
-            full_text = f"Section title: {chunk['section_title']}\n{sub_text}"
-            documents.append(full_text)
-            metadatas.append({"section_title": chunk["section_title"], "url": chunk["url"], "source_prefix": id_prefix})
-            ids.append(f"{id_prefix}{chunk_id_start + sub_chunk_count}")
-            sub_chunk_count += 1
-    if documents:
-        embeddings = model.encode(documents, batch_size=16, show_progress_bar=True)
-        collection.add(
-            embeddings=[emb.tolist() for emb in embeddings],
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
+    seen = set()
+    for chunk in chunks:
+        title = chunk["section_title"]
+        # Precomputed so reranking never re-runs the title regexes per query
+        title_meta = {"title_norm": normalize(title), "title_keywords": " ".join(sorted(title_keywords(title)))}
+        for sub_text in splitter.split_text(chunk["text"]):
+            cid = make_chunk_id(id_prefix, chunk["url"], title, sub_text)
+            if cid in seen:
+                continue
+            seen.add(cid)
+            documents.append(f"Section title: {title}\n{sub_text}")
+            metadatas.append({"section_title": title, "url": chunk["url"], "source_prefix": id_prefix, **title_meta})
+            ids.append(cid)
+    return documents, metadatas, ids
+
+def open_dedup_index():
+    """
+    Near-duplicate signature index of the ingestion collection.
+    """
+
+    return SignatureIndex(os.path.join(INGEST_DB_PATH, DEDUP_INDEX_NAME), DEDUP_THRESHOLD)
+
+def save_to_chroma(chunks, collection, chunk_id_start, id_prefix="", dedup=None):
+    """
+    Save the list of chunks to ChromaDB collection.
+    With a dedup SignatureIndex, near-duplicates of stored chunks are skipped,
+    and the new signatures are committed only once the chunks are stored.
+    """
+
+    documents, metadatas, _ = split_chunks(chunks, id_prefix)
+    ids = [f"{id_prefix}{chunk_id_start + i}" for i in range(len(documents))]
+    sub_chunk_count = len(documents)
+    if dedup is not None:
+        documents, metadatas, ids = dedup.filter(documents, metadatas, ids)
+        print(f"[dedup] Kept {len(documents)} of {sub_chunk_count} sub-chunks")
+    try:
+        if documents:
+            embeddings = get_model().encode(documents, batch_size=16, show_progress_bar=True)
+            collection.add(
+                embeddings=[emb.tolist() for emb in embeddings],
+                documents=documents,
+                metadatas=metadatas,
+                ids=ids
+            )
+        if dedup is not None:
+            dedup.sync_metadata(collection)
+    except Exception:
+        if dedup is not None:
+            dedup.rollback()
+        raise
+    if dedup is not None:
+        dedup.commit()
     return chunk_id_start + sub_chunk_count
 
-def crawl_and_embed(start_url, url_filter, max_depth=2, batch_size=100, id_prefix=""):
+def get_ingest_collection():
+    """
+    Open the ChromaDB collection that ingestion writes to.
+    """
+
+    client = chromadb.PersistentClient(path=INGEST_DB_PATH)
+    return client.get_or_create_collection(COLLECTION_NAME)
+
+def crawl_and_embed(start_url, url_filter, max_depth=2, batch_size=100, id_prefix="", dedup=True):
     """
     Crawl the website starting from start_url up to max_depth using BFS.
     Extract and chunk content, then embed and store in ChromaDB.
@@ -172,9 +314,9 @@ def crawl_and_embed(start_url, url_filter, max_depth=2, batch_size=100, id_prefi
     visited = set()
     queue = deque()
     queue.append((normalize_url(start_url), 0))
-    # Setup ChromaDB persistent client
-    client = chromadb.PersistentClient(path="./data/chroma_db2")
-    collection = client.get_or_create_collection("handbook_chunks")
+    collection = get_ingest_collection()
+    index = open_dedup_index() if dedup else None
+    session = requests.Session()
     chunk_id = get_next_chunk_id(collection, id_prefix)
     url_counter = 0
     batch_chunks = []
@@ -189,13 +331,13 @@ def crawl_and_embed(start_url, url_filter, max_depth=2, batch_size=100, id_prefi
         visited.add(url)
         url_counter += 1
         try:
-            resp = requests.get(url, timeout=10)
+            resp = session.get(url, timeout=REQUEST_TIMEOUT)
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
+            soup = parse_html(resp.text)
             page_chunks = chunk_content(soup, url)
             batch_chunks.extend(page_chunks)
             if depth < max_depth:
-                subpages = get_subpage_links(url, url_filter)
+                subpages = extract_links(soup, url, url_filter)
                 for sub_url in subpages:
                     if sub_url not in visited:
                         queue.append((sub_url, depth + 1))
@@ -206,24 +348,521 @@ def crawl_and_embed(start_url, url_filter, max_depth=2, batch_size=100, id_prefi
         # Save to ChromaDB every batch_size URLs
         if url_counter % batch_size == 0:
             print(f"[chroma] Saving batch at URL count: {url_counter}")
-            chunk_id = save_to_chroma(batch_chunks, collection, chunk_id, id_prefix=id_prefix)
+            chunk_id = save_to_chroma(batch_chunks, collection, chunk_id, id_prefix=id_prefix, dedup=index)
             batch_chunks = []
 
     # Save any remaining chunks
     if batch_chunks:
         print(f"[chroma] Saving final batch at URL count: {url_counter}")
-        save_to_chroma(batch_chunks, collection, chunk_id, id_prefix=id_prefix)
+        save_to_chroma(batch_chunks, collection, chunk_id, id_prefix=id_prefix, dedup=index)
+    if index is not None:
+        print(f"[dedup] {index.stats()}")
+        index.close()
+
+def fetch_conditional(session, url, previous):
+    """
+    Fetch a page with If-None-Match / If-Modified-Since built from the
+    previous crawl. Returns the response; status 304 means unchanged.
+    """
+
+    headers = {}
+    if previous and previous.get("etag"):
+        headers["If-None-Match"] = previous["etag"]
+    if previous and previous.get("last_modified"):
+        headers["If-Modified-Since"] = previous["last_modified"]
+    return session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+
+def flush_incremental(collection, cache, state, pending, id_prefix, dedup=None):
+    """
+    Apply the pending page diffs: upsert chunks whose IDs are new, delete
+    chunks the pages no longer own, then record the new page state.
+    With a dedup SignatureIndex, near-duplicates of stored chunks are not
+    stored (pages only own the chunks that were), and pages whose copies
+    pointed at a deleted canonical lose their state so the next run
+    ingests them again.
+    """
+
+    stale_ids = []
+    for page in pending:
+        new_ids = set(page["ids"])
+        stale_ids.extend(cid for cid in page["old_ids"] if cid not in new_ids)
+    orphaned = set()
+    if dedup is not None:
+        orphaned = dedup.remove(stale_ids) - {page["url"] for page in pending}
+        for page in pending:
+            dedup.forget_url(page["url"])
+            page["documents"], page["metadatas"], page["ids"] = dedup.filter(
+                page["documents"], page["metadatas"], page["ids"]
+            )
+
+    documents, metadatas, ids = [], [], []
+    for page in pending:
+        old_ids = set(page["old_ids"])
+        for doc, meta, cid in zip(page["documents"], page["metadatas"], page["ids"]):
+            if cid not in old_ids:
+                documents.append(doc)
+                metadatas.append(meta)
+                ids.append(cid)
+    try:
+        if stale_ids:
+            collection.delete(ids=stale_ids)
+        if documents:
+            embeddings = cache.encode(get_model(), documents, batch_size=16, show_progress_bar=True)
+            collection.upsert(
+                embeddings=[emb.tolist() for emb in embeddings],
+                documents=documents,
+                metadatas=metadatas,
+                ids=ids
+            )
+        if dedup is not None:
+            dedup.sync_metadata(collection)
+    except Exception:
+        if dedup is not None:
+            dedup.rollback()
+        raise
+    if dedup is not None:
+        dedup.commit()
+    state.put_many(
+        [(p["url"], p["etag"], p["last_modified"], p["links"], p["ids"]) for p in pending],
+        id_prefix
+    )
+    if orphaned:
+        state.delete_many(orphaned)
+    print(f"[chroma] Upserted {len(ids)} chunks, deleted {len(stale_ids)} stale chunks "
+          f"(embedding cache hits={cache.hits}, misses={cache.misses})")
+
+def delete_pages(collection, state, urls, dedup=None):
+    """
+    Remove every chunk owned by the given pages, and their state.
+    """
+
+    chunk_ids = []
+    for url in urls:
+        previous = state.get(url)
+        if previous:
+            chunk_ids.extend(previous["chunk_ids"])
+    if chunk_ids:
+        collection.delete(ids=chunk_ids)
+    state.delete_many(urls)
+    if dedup is not None:
+        for url in urls:
+            dedup.forget_url(url)
+        orphaned = dedup.remove(chunk_ids) - set(urls)
+        dedup.sync_metadata(collection)
+        dedup.commit()
+        state.delete_many(orphaned)
+    print(f"[chroma] Removed {len(urls)} pages ({len(chunk_ids)} chunks)")
+
+def crawl_and_embed_incremental(start_url, url_filter, max_depth=2, batch_size=100, id_prefix="", dedup=True):
+    """
+    Incremental variant of crawl_and_embed. Unchanged pages are skipped via
+    conditional requests, changed pages only upsert/delete their diff, and
+    pages that disappeared from the crawl have their chunks removed. When a
+    fetch fails, the crawl goes on with the page's previous links and only
+    pages that returned 404/410 are removed.
+    """
+
+    visited = set()
+    queue = deque()
+    queue.append((normalize_url(start_url), 0))
+    collection = get_ingest_collection()
+    cache = EmbeddingCache(EMBEDDING_CACHE_PATH, namespace=f"{model_name}:{INGEST_INFERENCE_BACKEND}")
+    state = PageStateStore(INGEST_STATE_PATH)
+    index = open_dedup_index() if dedup else None
+    session = requests.Session()
+    gone = set()
+    pending = []
+    url_counter = 0
+    unchanged = 0
+    fetch_errors = 0
+
+    while queue:
+        url, depth = queue.popleft()
+        if url in visited or depth > max_depth:
+            continue
+        if url_filter and not url_filter(url):
+            continue
+        visited.add(url)
+        url_counter += 1
+        previous = state.get(url)
+        links = set()
+        try:
+            resp = fetch_conditional(session, url, previous)
+            if resp.status_code == 304 and previous:
+                unchanged += 1
+                links = set(previous["links"])
+            elif resp.status_code in (404, 410):
+                print(f"[crawl] Gone: {url}")
+                gone.add(url)
+            else:
+                resp.raise_for_status()
+                print(f"[crawl] Changed: {url} (depth {depth})")
+                soup = parse_html(resp.text)
+                links = extract_links(soup, url, url_filter)
+                documents, metadatas, ids = split_chunks(chunk_content(soup, url), id_prefix)
+                if previous:
+                    old_ids = previous["chunk_ids"]
+                else:
+                    # Page was ingested before incremental mode existed (sequential IDs)
+                    old_ids = collection.get(where={"url": url}, include=[])["ids"]
+                pending.append({
+                    "url": url,
+                    "etag": resp.headers.get("ETag"),
+                    "last_modified": resp.headers.get("Last-Modified"),
+                    "links": links,
+                    "documents": documents,
+                    "metadatas": metadatas,
+                    "ids": ids,
+                    "old_ids": old_ids,
+                })
+        except Exception as e:
+            print(f"[crawl] Error crawling {url}: {e}")
+            fetch_errors += 1
+            # Keep crawling below the page with the links it had last time
+            links = set(previous["links"]) if previous else set()
+        if depth < max_depth:
+            for sub_url in links:
+                if sub_url not in visited:
+                    queue.append((sub_url, depth + 1))
+
+        if url_counter % batch_size == 0 and pending:
+            flush_incremental(collection, cache, state, pending, id_prefix, dedup=index)
+            pending = []
+
+    if pending:
+        flush_incremental(collection, cache, state, pending, id_prefix, dedup=index)
+
+    # Pages ingested before but not reached by this crawl no longer exist.
+    # A failed fetch may have hidden part of the site, so after errors only
+    # pages that answered 404/410 are removed.
+    if fetch_errors:
+        print(f"[crawl] {fetch_errors} fetch errors, only removing pages that returned 404/410")
+    else:
+        gone |= state.urls(id_prefix) - visited
+    if gone:
+        delete_pages(collection, state, gone, dedup=index)
+    print(f"[crawl] {url_counter} URLs visited, {unchanged} unchanged, {len(gone)} removed")
+    if index is not None:
+        print(f"[dedup] {index.stats()}")
+        index.close()
+    cache.close()
+    state.close()
+
+def seed_frontier(checkpoint, start_url, url_filter, session, use_sitemap=True):
+    """
+    Start a checkpointed run from start_url plus, with use_sitemap, every
+    allowed page in the site's sitemaps. Pages are prioritized by lastmod,
+    most recently modified first; start_url and pages without lastmod come
+    after those with one.
+    """
+
+    seeds = {}
+    if use_sitemap:
+        for loc, lastmod in sitemap.discover(start_url, session, timeout=REQUEST_TIMEOUT).items():
+            url = normalize_url(loc)
+            if url_filter is None or url_filter(url):
+                seeds[url] = max(seeds.get(url) or 0.0, lastmod or 0.0)
+    seeds.setdefault(normalize_url(start_url), 0.0)
+    checkpoint.start(seeds)
+    dated = sum(1 for priority in seeds.values() if priority)
+    print(f"[crawl] Seeded {len(seeds)} URLs ({dated} with lastmod)")
+
+def checkpointed_crawl(checkpoint, url_filter, session, max_depth=2, delay=0.5):
+    """
+    Visit the checkpoint's frontier in priority order, following links up
+    to max_depth hops from a seed. Yields (url, depth, soup) for every page
+    fetched. Pages are marked visited in the checkpoint as they are
+    yielded; the caller commits that with checkpoint.flush() once their
+    chunks are stored.
+    """
+
+    while True:
+        item = checkpoint.next()
+        if item is None:
+            return
+        url, depth = item
+        print(f"[crawl] Crawling: {url} (depth {depth})")
+        try:
+            resp = session.get(url, timeout=REQUEST_TIMEOUT)
+            resp.raise_for_status()
+            soup = parse_html(resp.text)
+        except Exception as e:
+            print(f"[crawl] Error crawling {url}: {e}")
+            checkpoint.mark(url, "failed")
+            continue
+        checkpoint.mark(url)
+        if depth < max_depth:
+            checkpoint.add(extract_links(soup, url, url_filter), depth + 1)
+        yield url, depth, soup
+        if delay:
+            time.sleep(delay) # Be polite with a short delay
+
+def flush_checkpointed(collection, cache, checkpoint, pending, dedup=None):
+    """
+    Store the pending sub-chunks, then commit the checkpoint. Chunk IDs
+    are content hashes and chunks are upserted, so storing the same pages
+    again after an interrupted flush changes nothing.
+    """
+
+    documents, metadatas, ids = pending
+    sub_chunk_count = len(documents)
+    if dedup is not None:
+        documents, metadatas, ids = dedup.filter(documents, metadatas, ids)
+        print(f"[dedup] Kept {len(documents)} of {sub_chunk_count} sub-chunks")
+    try:
+        if documents:
+            embeddings = cache.encode(get_model(), documents, batch_size=16, show_progress_bar=True)
+            collection.upsert(
+                embeddings=[emb.tolist() for emb in embeddings],
+                documents=documents,
+                metadatas=metadatas,
+                ids=ids
+            )
+        if dedup is not None:
+            dedup.sync_metadata(collection)
+    except Exception:
+        if dedup is not None:
+            dedup.rollback()
+        raise
+    if dedup is not None:
+        dedup.commit()
+    checkpoint.flush(len(ids))
+
+def crawl_and_embed_checkpointed(start_url, url_filter, max_depth=2, batch_size=100, id_prefix="", dedup=True,
+                                 use_sitemap=True, restart=False, flush_interval=FLUSH_INTERVAL_S):
+    """
+    Resumable variant of crawl_and_embed. The frontier is seeded from the
+    site's sitemaps (see seed_frontier), so pages deeper than max_depth
+    links are still found. Frontier, visited pages and flush position are
+    kept in a SQLite checkpoint committed with every flush (every
+    batch_size URLs or flush_interval seconds); an unfinished run is
+    resumed from its last flush unless restart is set.
+    """
+
+    collection = get_ingest_collection()
+    cache = EmbeddingCache(EMBEDDING_CACHE_PATH, namespace=f"{model_name}:{INGEST_INFERENCE_BACKEND}")
+    checkpoint = CrawlCheckpoint(CRAWL_CHECKPOINT_PATH, id_prefix)
+    index = open_dedup_index() if dedup else None
+    session = requests.Session()
+    if checkpoint.can_resume() and not restart:
+        print(f"[crawl] Resuming {start_url} from checkpoint: {checkpoint.stats()}")
+    else:
+        seed_frontier(checkpoint, start_url, url_filter, session, use_sitemap)
+
+    pending = ([], [], [])
+    url_counter = 0
+    last_flush = time.monotonic()
+    for url, depth, soup in checkpointed_crawl(checkpoint, url_filter, session, max_depth):
+        url_counter += 1
+        for part, values in zip(pending, split_chunks(chunk_content(soup, url), id_prefix)):
+            part.extend(values)
+        if checkpoint.unflushed >= batch_size or time.monotonic() - last_flush >= flush_interval:
+            print(f"[chroma] Saving batch at URL count: {url_counter}")
+            flush_checkpointed(collection, cache, checkpoint, pending, dedup=index)
+            pending = ([], [], [])
+            last_flush = time.monotonic()
+
+    if pending[0]:
+        print(f"[chroma] Saving final batch at URL count: {url_counter}")
+        flush_checkpointed(collection, cache, checkpoint, pending, dedup=index)
+    checkpoint.finish()
+    print(f"[crawl] Finished {start_url}: {checkpoint.stats()}")
+    if index is not None:
+        print(f"[dedup] {index.stats()}")
+        index.close()
+    checkpoint.close()
+    cache.close()
+
+class TokenBucket:
+    """
+    Token bucket limiting the request rate against a single host.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Wait until a token is available and take it.
+        """
+
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+async def fetch_page_async(session, url, buckets, rate):
+    """
+    Fetch a page through the shared session after taking a token from
+    the bucket of its host.
+    """
+
+    host = urlparse(url).netloc
+    if host not in buckets:
+        buckets[host] = TokenBucket(rate)
+    await buckets[host].acquire()
+    async with session.get(url, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as resp:
+        resp.raise_for_status()
+        return await resp.text()
+
+async def async_crawl(start_url, url_filter, max_depth=2, concurrency=CRAWL_CONCURRENCY, rate=REQUESTS_PER_SECOND):
+    """
+    Crawl the website level by level with pooled keep-alive connections.
+    Yields (url, depth, soup) for every page fetched. Visits the same pages
+    at the same depths as the BFS in crawl_and_embed.
+    """
+
+    loop = asyncio.get_running_loop()
+    visited = set()
+    frontier = [normalize_url(start_url)]
+    buckets = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency)
+
+    async def crawl_one(session, url):
+        async with semaphore:
+            try:
+                html = await fetch_page_async(session, url, buckets, rate)
+            except Exception as e:
+                print(f"[crawl] Error crawling {url}: {e}")
+                return url, None
+        soup = await loop.run_in_executor(None, parse_html, html)
+        return url, soup
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        for depth in range(max_depth + 1):
+            level = []
+            for url in frontier:
+                if url in visited:
+                    continue
+                if url_filter and not url_filter(url):
+                    continue
+                visited.add(url)
+                level.append(url)
+            if not level:
+                break
+
+            next_frontier = {}
+            tasks = [asyncio.ensure_future(crawl_one(session, url)) for url in level]
+            for task in asyncio.as_completed(tasks):
+                url, soup = await task
+                if soup is None:
+                    continue
+                print(f"[crawl] Crawled: {url} (depth {depth})")
+                if depth < max_depth:
+                    for sub_url in extract_links(soup, url, url_filter):
+                        if sub_url not in visited:
+                            next_frontier[sub_url] = None
+                yield url, depth, soup
+            frontier = list(next_frontier)
+
+async def crawl_and_embed_async(start_url, url_filter, max_depth=2, batch_size=100, id_prefix="",
+                                concurrency=CRAWL_CONCURRENCY, rate=REQUESTS_PER_SECOND, dedup=True):
+    """
+    Async variant of crawl_and_embed. Fetches pages concurrently and writes
+    chunks to ChromaDB every batch_size URLs.
+    """
+
+    loop = asyncio.get_running_loop()
+    collection = get_ingest_collection()
+    index = open_dedup_index() if dedup else None
+    chunk_id = get_next_chunk_id(collection, id_prefix)
+    url_counter = 0
+    batch_chunks = []
+
+    async for url, depth, soup in async_crawl(start_url, url_filter, max_depth, concurrency, rate):
+        url_counter += 1
+        batch_chunks.extend(chunk_content(soup, url))
+        if url_counter % batch_size == 0:
+            print(f"[chroma] Saving batch at URL count: {url_counter}")
+            chunk_id = await loop.run_in_executor(
+                None, save_to_chroma, batch_chunks, collection, chunk_id, id_prefix, index
+            )
+            batch_chunks = []
+
+    if batch_chunks:
+        print(f"[chroma] Saving final batch at URL count: {url_counter}")
+        await loop.run_in_executor(None, save_to_chroma, batch_chunks, collection, chunk_id, id_prefix, index)
+    if index is not None:
+        print(f"[dedup] {index.stats()}")
+        index.close()
 
 def main():
+    parser = argparse.ArgumentParser(description="Crawl and embed GitLab Handbook and Direction pages.")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Use the concurrent asyncio crawler")
+    parser.add_argument("--concurrency", type=int, default=CRAWL_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_SECOND,
+                        help="Max requests per second per host (async mode)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only re-embed changed pages and remove stale chunks")
+    parser.add_argument("--no-dedup", dest="dedup", action="store_false",
+                        help="Store near-duplicate chunks instead of recording them as alternate URLs")
+    parser.add_argument("--sitemap", action="store_true",
+                        help="Seed the crawl from the sites' sitemaps and checkpoint it so it can resume")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="Checkpoint the link crawl so it can resume, without reading sitemaps")
+    parser.add_argument("--restart", action="store_true",
+                        help="Discard an unfinished checkpointed crawl instead of resuming it")
+    args = parser.parse_args()
+
     for base_url, id_prefix in BASE_URLS:
         print(f"\n--- Starting crawl for {base_url} ---\n")
-        crawl_and_embed(
-            start_url=base_url,
-            url_filter=lambda url, bu=base_url: is_allowed_url(url, bu),
-            max_depth=MAX_DEPTH,
-            batch_size=BATCH_SIZE,
-            id_prefix=id_prefix
-        )
+        url_filter = lambda url, bu=base_url: is_allowed_url(url, bu)
+        if args.sitemap or args.checkpoint:
+            crawl_and_embed_checkpointed(
+                start_url=base_url,
+                url_filter=url_filter,
+                max_depth=MAX_DEPTH,
+                batch_size=BATCH_SIZE,
+                id_prefix=id_prefix,
+                dedup=args.dedup,
+                use_sitemap=args.sitemap,
+                restart=args.restart
+            )
+        elif args.incremental:
+            crawl_and_embed_incremental(
+                start_url=base_url,
+                url_filter=url_filter,
+                max_depth=MAX_DEPTH,
+                batch_size=BATCH_SIZE,
+                id_prefix=id_prefix,
+                dedup=args.dedup
+            )
+        elif args.use_async:
+            asyncio.run(crawl_and_embed_async(
+                start_url=base_url,
+                url_filter=url_filter,
+                max_depth=MAX_DEPTH,
+                batch_size=BATCH_SIZE,
+                id_prefix=id_prefix,
+                concurrency=args.concurrency,
+                rate=args.rate,
+                dedup=args.dedup
+            ))
+        else:
+            crawl_and_embed(
+                start_url=base_url,
+                url_filter=url_filter,
+                max_depth=MAX_DEPTH,
+                batch_size=BATCH_SIZE,
+                id_prefix=id_prefix,
+                dedup=args.dedup
+            )
+
+    # Rebuild the lexical index alongside the collection
+    build_from_collection(get_ingest_collection(), os.path.join(INGEST_DB_PATH, "bm25"))
+    vector_index.refresh(get_ingest_collection(), INGEST_DB_PATH)
+    router.refresh(get_ingest_collection(), INGEST_DB_PATH)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
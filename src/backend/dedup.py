@@ -0,0 +1,302 @@
+"""
+Near-duplicate chunk detection for ingestion, with MinHash and LSH.
+
+The body of each sub-chunk (without its "Section title:" header) is cut
+into word 5-shingles and reduced to a 128-value MinHash signature. The
+signature is split into 16 bands of 8 rows, and chunks that share a band
+bucket become candidates. A candidate is confirmed as a duplicate when its
+estimated Jaccard similarity is at least the threshold. The first chunk of
+a group that is stored becomes canonical; later copies are neither embedded
+nor stored. Their page URLs are recorded on the canonical chunk's metadata
+as 'alt_urls', space separated like 'title_keywords'.
+
+Signatures are persisted in SQLite inside the Chroma directory (next to
+the BM25 and vector indexes). Later ingestion runs therefore deduplicate
+against everything already stored, and the signatures travel with the
+database. Changes are staged in an open SQLite transaction: callers
+commit() once the kept chunks are written to the collection, or
+rollback() when the write fails, so a signature never outlives a chunk
+that was not stored.
+
+Report from src/:  python -m backend.dedup --db ./data/chroma_db2
+"""
+import argparse
+import os
+import sqlite3
+import zlib
+import numpy as np
+from backend.bm25 import tokenize
+from backend.context import split_header
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+PRIME = (1 << 31) - 1
+# Fixed seed: signatures must stay comparable across runs and processes
+_rng = np.random.default_rng(20240611)
+_A = _rng.integers(1, PRIME, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, PRIME, NUM_PERM, dtype=np.uint64)
+
+
+def shingle_hashes(text, size=SHINGLE_SIZE):
+    """
+    CRC32 hashes of the distinct word shingles of text.
+    """
+
+    words = tokenize(text)
+    if len(words) <= size:
+        grams = {" ".join(words)} if words else set()
+    else:
+        grams = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash(text):
+    """
+    MinHash signature (uint32[NUM_PERM]) of a chunk body, or None when it
+    has no words. Hashes are (a * x + b) mod 2^31 - 1, exact in uint64.
+    """
+
+    hashes = shingle_hashes(text)
+    if not len(hashes):
+        return None
+    return ((_A[:, None] * hashes[None, :] + _B[:, None]) % PRIME).min(axis=1).astype(np.uint32)
+
+
+def similarity(sig_a, sig_b):
+    """
+    Estimated Jaccard similarity of two signatures.
+    """
+
+    return float(np.count_nonzero(sig_a == sig_b)) / NUM_PERM
+
+
+class SignatureIndex:
+    """
+    Persistent MinHash LSH index of the canonical chunks of a collection
+    and the alternate URLs recorded for them.
+    """
+
+    def __init__(self, path, threshold=0.8):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.threshold = threshold
+        # Ingestion may call in from executor threads, one at a time
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS signatures (chunk_id TEXT PRIMARY KEY, url TEXT, signature BLOB NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS alternates (chunk_id TEXT NOT NULL, url TEXT NOT NULL,"
+            " PRIMARY KEY (chunk_id, url))"
+        )
+        self.conn.commit()
+        self.dirty = set()  # canonicals whose alt_urls metadata is out of date
+        self.checked = 0
+        self.dropped = 0
+        self._load()
+
+    def _load(self):
+        """
+        Rebuild the in-memory index from the committed rows.
+        """
+
+        self.signatures = {}
+        self.urls = {}
+        self.buckets = {}
+        self.alternates = {}  # canonical chunk ID -> alternate URLs
+        self.alternate_of = {}  # alternate URL -> canonical chunk IDs
+        for cid, url, blob in self.conn.execute("SELECT chunk_id, url, signature FROM signatures"):
+            self._index(cid, url, np.frombuffer(blob, dtype=np.uint32))
+        for cid, url in self.conn.execute("SELECT chunk_id, url FROM alternates"):
+            self.alternates.setdefault(cid, set()).add(url)
+            self.alternate_of.setdefault(url, set()).add(cid)
+        self.dirty &= set(self.signatures)
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self.signatures
+
+    def __len__(self):
+        return len(self.signatures)
+
+    @staticmethod
+    def _band_keys(signature):
+        return [(band, signature[band * ROWS:(band + 1) * ROWS].tobytes()) for band in range(BANDS)]
+
+    def _index(self, chunk_id, url, signature):
+        self.signatures[chunk_id] = signature
+        self.urls[chunk_id] = url
+        for key in self._band_keys(signature):
+            self.buckets.setdefault(key, []).append(chunk_id)
+
+    def match(self, signature):
+        """
+        Most similar indexed chunk at or above the threshold, or None.
+        """
+
+        best, best_sim = None, self.threshold
+        seen = set()
+        for key in self._band_keys(signature):
+            for cid in self.buckets.get(key, ()):
+                if cid in seen:
+                    continue
+                seen.add(cid)
+                sim = similarity(signature, self.signatures[cid])
+                if sim >= best_sim:
+                    best, best_sim = cid, sim
+        return best
+
+    def add(self, chunk_id, url, signature):
+        self._index(chunk_id, url, signature)
+        self.conn.execute("INSERT OR REPLACE INTO signatures VALUES (?, ?, ?)",
+                          (chunk_id, url, signature.tobytes()))
+
+    def add_alternate(self, chunk_id, url):
+        """
+        Record url as another source of a canonical chunk.
+        """
+
+        if not url or url == self.urls.get(chunk_id) or url in self.alternates.get(chunk_id, ()):
+            return
+        self.alternates.setdefault(chunk_id, set()).add(url)
+        self.alternate_of.setdefault(url, set()).add(chunk_id)
+        self.dirty.add(chunk_id)
+        self.conn.execute("INSERT OR IGNORE INTO alternates VALUES (?, ?)", (chunk_id, url))
+
+    def forget_url(self, url):
+        """
+        Drop url from the alternates of every canonical, before the page
+        is re-ingested or removed.
+        """
+
+        for cid in self.alternate_of.pop(url, ()):
+            self.alternates.get(cid, set()).discard(url)
+            self.dirty.add(cid)
+        self.conn.execute("DELETE FROM alternates WHERE url = ?", (url,))
+
+    def remove(self, chunk_ids):
+        """
+        Forget chunks deleted from the collection. Returns the alternate
+        URLs of removed canonicals: their copies were never stored, so those
+        pages must be ingested again to keep the content.
+        """
+
+        orphaned = set()
+        for cid in chunk_ids:
+            signature = self.signatures.pop(cid, None)
+            if signature is None:
+                continue
+            self.urls.pop(cid, None)
+            for key in self._band_keys(signature):
+                bucket = self.buckets.get(key)
+                if bucket is not None:
+                    bucket.remove(cid)
+                    if not bucket:
+                        del self.buckets[key]
+            for url in self.alternates.pop(cid, ()):
+                orphaned.add(url)
+                self.alternate_of.get(url, set()).discard(cid)
+            self.dirty.discard(cid)
+        rows = [(cid,) for cid in chunk_ids]
+        self.conn.executemany("DELETE FROM signatures WHERE chunk_id = ?", rows)
+        self.conn.executemany("DELETE FROM alternates WHERE chunk_id = ?", rows)
+        return orphaned
+
+    def filter(self, documents, metadatas, ids):
+        """
+        Drop near-duplicates of indexed chunks and of earlier chunks in the
+        same batch; the rest are indexed as canonical. Returns the kept
+        (documents, metadatas, ids). New signatures and alternates stay
+        staged until commit().
+        """
+
+        kept = ([], [], [])
+        for doc, meta, cid in zip(documents, metadatas, ids):
+            self.checked += 1
+            if cid not in self.signatures:
+                signature = minhash(split_header(doc)[1])
+                canonical = self.match(signature) if signature is not None else None
+                if canonical is not None:
+                    self.dropped += 1
+                    self.add_alternate(canonical, meta.get("url"))
+                    continue
+                if signature is not None:
+                    self.add(cid, meta.get("url"), signature)
+            kept[0].append(doc)
+            kept[1].append(meta)
+            kept[2].append(cid)
+        return kept
+
+    def sync_metadata(self, collection, page_size=500):
+        """
+        Write 'alt_urls' onto the stored canonical chunks whose alternates
+        changed. Canonicals not in the collection yet stay pending.
+        """
+
+        pending = sorted(self.dirty)
+        updated = 0
+        for start in range(0, len(pending), page_size):
+            stored = collection.get(ids=pending[start:start + page_size], include=["metadatas"])
+            metas = []
+            for cid, meta in zip(stored["ids"], stored["metadatas"]):
+                meta = dict(meta or {})
+                meta["alt_urls"] = " ".join(sorted(self.alternates.get(cid, ())))
+                metas.append(meta)
+                self.dirty.discard(cid)
+            if metas:
+                collection.update(ids=stored["ids"], metadatas=metas)
+                updated += len(metas)
+        return updated
+
+    def commit(self):
+        """
+        Persist the changes staged since the last commit, once the chunks
+        kept by filter() are stored.
+        """
+
+        self.conn.commit()
+
+    def rollback(self):
+        """
+        Discard the changes staged since the last commit, after the kept
+        chunks failed to be stored.
+        """
+
+        self.conn.rollback()
+        self._load()
+
+    def stats(self):
+        return {
+            "canonical_chunks": len(self.signatures),
+            "chunks_with_alternates": sum(1 for urls in self.alternates.values() if urls),
+            "alternate_urls": sum(len(urls) for urls in self.alternates.values()),
+            "checked": self.checked,
+            "dropped": self.dropped,
+            "dropped_pct": round(100 * self.dropped / self.checked, 2) if self.checked else 0.0,
+        }
+
+    def close(self):
+        # Anything not committed belongs to chunks that were never stored
+        self.conn.close()
+
+
+def main():
+    from backend.data_ingestion import DEDUP_INDEX_NAME, INGEST_DB_PATH
+    parser = argparse.ArgumentParser(description="Summarize the near-duplicate signature index of a Chroma directory.")
+    parser.add_argument("--db", default=INGEST_DB_PATH)
+    parser.add_argument("--top", type=int, default=10, help="Show the chunks with the most alternate URLs")
+    args = parser.parse_args()
+    index = SignatureIndex(os.path.join(args.db, DEDUP_INDEX_NAME))
+    stats = index.stats()
+    print(f"[dedup] {stats['canonical_chunks']} canonical chunks, {stats['chunks_with_alternates']} with "
+          f"{stats['alternate_urls']} alternate URLs")
+    ranked = sorted(index.alternates.items(), key=lambda item: len(item[1]), reverse=True)[:args.top]
+    for cid, urls in ranked:
+        if urls:
+            print(f"  {cid} ({index.urls.get(cid)}): {len(urls)} alternates")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
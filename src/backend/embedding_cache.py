@@ -0,0 +1,88 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import numpy as np
+
+
+def content_hash(text, namespace=""):
+    """
+    Content address of a text, namespaced by the model that embeds it.
+    """
+
+    return hashlib.sha256(f"{namespace}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent content-addressed embedding cache backed by SQLite.
+    Unchanged text is looked up by hash instead of being re-encoded.
+    """
+
+    def __init__(self, path, namespace):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (hash TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, hashes):
+        """
+        Return a dict of hash -> float32 vector for the hashes in the cache.
+        """
+
+        found = {}
+        hashes = list(hashes)
+        with self.lock:
+            # Stay well below SQLite's host parameter limit
+            for start in range(0, len(hashes), 500):
+                part = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self.conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE hash IN ({placeholders})", part
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items):
+        """
+        Store (hash, vector) pairs.
+        """
+
+        rows = [(h, np.asarray(vec, dtype=np.float32).tobytes()) for h, vec in items]
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?)", rows)
+            self.conn.commit()
+
+    def encode(self, model, texts, batch_size=16, show_progress_bar=False):
+        """
+        Embed texts, encoding only those not already in the cache.
+        Returns a list of float32 vectors in the same order as texts.
+        """
+
+        hashes = [content_hash(t, self.namespace) for t in texts]
+        cached = self.get_many(set(hashes))
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in cached and h not in missing:
+                missing[h] = t
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            vectors = model.encode(list(missing.values()), batch_size=batch_size,
+                                   show_progress_bar=show_progress_bar)
+            new_items = list(zip(missing.keys(), vectors))
+            self.put_many(new_items)
+            cached.update((h, np.asarray(v, dtype=np.float32)) for h, v in new_items)
+        return [cached[h] for h in hashes]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,273 @@
+"""
+Feedback store backed by SQLite in WAL mode.
+
+Ratings are queued in memory and written in batches by one background
+thread per process; WAL mode and a busy timeout let several Streamlit
+server processes share the same file. Ratings still queued when the
+process exits are written by an atexit hook. Each row keeps the rated query and
+answer, an answer hash, the chunk IDs the answer was built from and the
+source URLs, so feedback can be aggregated per query, per answer and per
+chunk (e.g. to tune reranking).
+
+Summary from src/:  python -m backend.feedback_store
+"""
+import argparse
+import atexit
+import csv
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS feedback ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " created REAL NOT NULL,"
+    " query TEXT NOT NULL,"
+    " answer TEXT NOT NULL,"
+    " answer_hash TEXT NOT NULL,"
+    " rating INTEGER NOT NULL,"
+    " chunk_ids TEXT NOT NULL,"
+    " sources TEXT NOT NULL,"
+    " session_id TEXT)",
+    "CREATE INDEX IF NOT EXISTS feedback_query ON feedback(query)",
+    "CREATE INDEX IF NOT EXISTS feedback_answer_hash ON feedback(answer_hash)",
+    "CREATE INDEX IF NOT EXISTS feedback_created ON feedback(created)",
+    "CREATE TABLE IF NOT EXISTS feedback_chunks ("
+    " feedback_id INTEGER NOT NULL REFERENCES feedback(id),"
+    " chunk_id TEXT NOT NULL,"
+    " rating INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS feedback_chunks_chunk ON feedback_chunks(chunk_id)",
+)
+
+RATINGS = {"up": 1, "down": -1}
+
+
+def answer_hash(answer):
+    return hashlib.sha1(answer.encode("utf-8")).hexdigest()
+
+
+class FeedbackStore:
+    """
+    Buffered, concurrent-safe feedback store.
+    """
+
+    def __init__(self, path, flush_interval=2.0, batch_size=100):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.conn = self._connect()
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+        self.conn.commit()
+        self.read_lock = threading.Lock()
+        self.flushed = threading.Condition()
+        self.pending = 0
+        self.closed = False
+        self.writer = threading.Thread(target=self._writer_loop, name="feedback-writer", daemon=True)
+        self.writer.start()
+        # The writer is a daemon thread, so drain the queue before the process exits
+        atexit.register(self.close)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def record(self, query, answer, rating, chunk_ids=(), sources=(), session_id=None):
+        """
+        Queue one rating ('up' or 'down') for a specific query and answer.
+        Returns immediately; the row is written by the background thread,
+        or right away once the store is closed.
+        """
+
+        row = (time.time(), query, answer, RATINGS.get(rating, rating),
+               list(chunk_ids or ()), list(sources or ()), session_id)
+        with self.flushed:
+            if not self.closed:
+                self.pending += 1
+                self.queue.put(row)
+                return
+        conn = self._connect()
+        try:
+            self._write(conn, [row])
+        finally:
+            conn.close()
+
+    def _write(self, conn, rows):
+        with conn:
+            for created, query, answer, rating, chunk_ids, sources, session_id in rows:
+                cur = conn.execute(
+                    "INSERT INTO feedback (created, query, answer, answer_hash, rating, chunk_ids, sources, session_id)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (created, query, answer, answer_hash(answer), rating,
+                     json.dumps(chunk_ids), json.dumps(sources), session_id)
+                )
+                conn.executemany(
+                    "INSERT INTO feedback_chunks (feedback_id, chunk_id, rating) VALUES (?, ?, ?)",
+                    [(cur.lastrowid, cid, rating) for cid in chunk_ids]
+                )
+
+    def _writer_loop(self):
+        conn = self._connect()
+        while True:
+            rows = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while rows[-1] is not None and len(rows) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    rows.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            stop = rows[-1] is None
+            rows = [row for row in rows if row is not None]
+            try:
+                if rows:
+                    self._write(conn, rows)
+            except sqlite3.Error as e:
+                print(f"[feedback] Failed to write {len(rows)} rows: {e}")
+            with self.flushed:
+                self.pending -= len(rows)
+                self.flushed.notify_all()
+            if stop:
+                conn.close()
+                return
+
+    def flush(self, timeout=10.0):
+        """
+        Wait until every queued rating has been written.
+        """
+
+        deadline = time.monotonic() + timeout
+        with self.flushed:
+            while self.pending > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.flushed.wait(remaining)
+        return True
+
+    def close(self):
+        """
+        Write every queued rating and stop the writer. The sentinel is
+        queued behind them and makes the writer flush without waiting for
+        flush_interval.
+        """
+
+        with self.flushed:
+            if self.closed:
+                return
+            self.closed = True
+            self.queue.put(None)
+        atexit.unregister(self.close)
+        self.writer.join(timeout=10.0)
+        self.conn.close()
+
+    # --- Aggregation ---
+
+    def _query(self, sql, params=()):
+        with self.read_lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def summary(self, since=None):
+        """
+        Total, positive and negative ratings, optionally since a timestamp.
+        """
+
+        up, down = self._query(
+            "SELECT COALESCE(SUM(rating > 0), 0), COALESCE(SUM(rating < 0), 0) FROM feedback WHERE created >= ?",
+            (since or 0,)
+        )[0]
+        total = up + down
+        return {"total": total, "up": up, "down": down, "up_rate": round(up / total, 4) if total else 0.0}
+
+    def by_query(self, limit=20, since=None):
+        """
+        Ratings grouped by query, most rated first.
+        """
+
+        rows = self._query(
+            "SELECT query, SUM(rating > 0), SUM(rating < 0), COUNT(*) FROM feedback"
+            " WHERE created >= ? GROUP BY query ORDER BY COUNT(*) DESC LIMIT ?",
+            (since or 0, limit)
+        )
+        return [{"query": q, "up": up, "down": down, "total": n} for q, up, down, n in rows]
+
+    def by_day(self, since=None):
+        """
+        Ratings per UTC day.
+        """
+
+        rows = self._query(
+            "SELECT date(created, 'unixepoch'), SUM(rating > 0), SUM(rating < 0) FROM feedback"
+            " WHERE created >= ? GROUP BY 1 ORDER BY 1",
+            (since or 0,)
+        )
+        return [{"day": day, "up": up, "down": down} for day, up, down in rows]
+
+    def chunk_feedback(self, min_votes=1):
+        """
+        Net rating per chunk ID, for rerank tuning: {chunk_id: (up, down)}.
+        """
+
+        rows = self._query(
+            "SELECT chunk_id, SUM(rating > 0), SUM(rating < 0) FROM feedback_chunks"
+            " GROUP BY chunk_id HAVING COUNT(*) >= ?",
+            (min_votes,)
+        )
+        return {cid: (up, down) for cid, up, down in rows}
+
+    def for_answer(self, answer):
+        """
+        Ratings of one exact answer text.
+        """
+
+        rows = self._query(
+            "SELECT SUM(rating > 0), SUM(rating < 0) FROM feedback WHERE answer_hash = ?", (answer_hash(answer),)
+        )
+        up, down = rows[0]
+        return {"up": up or 0, "down": down or 0}
+
+    def import_csv(self, csv_path):
+        """
+        Import rows from the legacy feedback.csv (question, answer, feedback).
+        """
+
+        count = 0
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                if len(row) >= 3:
+                    self.record(row[0], row[1], row[2])
+                    count += 1
+        self.flush()
+        return count
+
+
+def main():
+    from backend.config import FEEDBACK_DB_PATH
+    parser = argparse.ArgumentParser(description="Feedback analytics.")
+    parser.add_argument("--import-csv", default=None, help="Import a legacy feedback.csv first")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    store = FeedbackStore(FEEDBACK_DB_PATH)
+    if args.import_csv:
+        print(f"Imported {store.import_csv(args.import_csv)} rows")
+    print(json.dumps({
+        "summary": store.summary(),
+        "by_day": store.by_day(),
+        "top_queries": store.by_query(limit=args.limit),
+    }, indent=2))
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Pluggable CPU inference backends for the bi-encoder and cross-encoder.
+
+    torch       fp32 PyTorch (baseline)
+    torch-int8  PyTorch with dynamic int8 quantization of Linear layers
+    onnx        ONNX Runtime, fp32 export
+    onnx-int8   ONNX Runtime, dynamically quantized int8 export
+
+The ONNX backends need the optional extra: pip install "sentence-transformers[onnx]".
+Exported models are cached under ONNX_EXPORT_DIR so the export runs once.
+sentence-transformers (and with it torch) is imported on first load, not
+when this module is imported.
+"""
+import os
+from backend.config import ONNX_EXPORT_DIR, ONNX_QUANTIZATION
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+
+def _export_dir(model_name, kind):
+    return os.path.join(ONNX_EXPORT_DIR, kind, model_name.replace("/", "__"))
+
+
+def _quantized_file_name():
+    return f"onnx/model_qint8_{ONNX_QUANTIZATION}.onnx"
+
+
+def _quantize_torch(module):
+    import torch
+    return torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def _load_onnx_int8(cls, model_name, device, kind):
+    """
+    Load a dynamically quantized ONNX model, exporting it on first use.
+    """
+
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+    export_dir = _export_dir(model_name, kind)
+    quantized_path = os.path.join(export_dir, _quantized_file_name())
+    if not os.path.exists(quantized_path):
+        model = cls(model_name, device=device, backend="onnx")
+        model.save_pretrained(export_dir)
+        export_dynamic_quantized_onnx_model(model, ONNX_QUANTIZATION, export_dir)
+    return cls(export_dir, device=device, backend="onnx",
+               model_kwargs={"file_name": _quantized_file_name()})
+
+
+def _check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}, expected one of {BACKENDS}")
+
+
+def load_encoder(model_name, backend="torch", device="cpu"):
+    """
+    Load a SentenceTransformer bi-encoder with the given backend.
+    """
+
+    from sentence_transformers import SentenceTransformer
+    _check_backend(backend)
+    if backend == "onnx":
+        return SentenceTransformer(model_name, device=device, backend="onnx")
+    if backend == "onnx-int8":
+        return _load_onnx_int8(SentenceTransformer, model_name, device, "encoder")
+    model = SentenceTransformer(model_name, device=device)
+    if backend == "torch-int8":
+        _quantize_torch(model)
+    return model
+
+
+def load_cross_encoder(model_name, backend="torch", device="cpu"):
+    """
+    Load a CrossEncoder with the given backend.
+    """
+
+    from sentence_transformers import CrossEncoder
+    _check_backend(backend)
+    if backend == "onnx":
+        return CrossEncoder(model_name, device=device, backend="onnx")
+    if backend == "onnx-int8":
+        return _load_onnx_int8(CrossEncoder, model_name, device, "cross_encoder")
+    model = CrossEncoder(model_name, device=device)
+    if backend == "torch-int8":
+        _quantize_torch(model.model)
+    return model
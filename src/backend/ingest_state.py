@@ -0,0 +1,215 @@
+import json
+import os
+import sqlite3
+import time
+
+
+class PageStateStore:
+    """
+    Per-URL crawl state for incremental ingestion: HTTP validators
+    (ETag / Last-Modified), outgoing links and the chunk IDs the page
+    currently owns in the collection.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " url TEXT PRIMARY KEY,"
+            " prefix TEXT NOT NULL,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " links TEXT NOT NULL,"
+            " chunk_ids TEXT NOT NULL,"
+            " crawled_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pages_prefix ON pages(prefix)")
+        self.conn.commit()
+
+    def get(self, url):
+        """
+        Return the stored state for url, or None if it was never ingested.
+        """
+
+        row = self.conn.execute(
+            "SELECT etag, last_modified, links, chunk_ids FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "etag": row[0],
+            "last_modified": row[1],
+            "links": json.loads(row[2]),
+            "chunk_ids": json.loads(row[3]),
+        }
+
+    def put_many(self, pages, prefix):
+        """
+        Store state for several pages in one transaction.
+        pages is a list of (url, etag, last_modified, links, chunk_ids).
+        """
+
+        now = time.time()
+        rows = [
+            (url, prefix, etag, last_modified, json.dumps(sorted(links)), json.dumps(chunk_ids), now)
+            for url, etag, last_modified, links, chunk_ids in pages
+        ]
+        self.conn.executemany("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        self.conn.commit()
+
+    def urls(self, prefix):
+        """
+        All URLs currently stored for a source prefix.
+        """
+
+        return {row[0] for row in self.conn.execute("SELECT url FROM pages WHERE prefix = ?", (prefix,))}
+
+    def delete_many(self, urls):
+        self.conn.executemany("DELETE FROM pages WHERE url = ?", [(u,) for u in urls])
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class CrawlCheckpoint:
+    """
+    Durable crawl frontier for one source prefix: queued URLs with their
+    depth and priority, the pages already visited, and the flush position.
+    Changes are only committed by flush(), right after the chunks of the
+    pages visited since the previous flush are stored, so an interrupted
+    crawl resumes from its last flush.
+    """
+
+    def __init__(self, path, prefix):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.prefix = prefix
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS frontier ("
+            " prefix TEXT NOT NULL,"
+            " url TEXT NOT NULL,"
+            " depth INTEGER NOT NULL,"
+            " priority REAL NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " state TEXT NOT NULL,"  # queued, done or failed
+            " PRIMARY KEY (prefix, url))"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS frontier_next ON frontier(prefix, state, depth, priority DESC, seq)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS crawl_runs ("
+            " prefix TEXT PRIMARY KEY,"
+            " started_at REAL NOT NULL,"
+            " flushed_at REAL,"
+            " flushes INTEGER NOT NULL,"
+            " pages INTEGER NOT NULL,"
+            " chunks INTEGER NOT NULL,"
+            " completed INTEGER NOT NULL)"
+        )
+        self.conn.commit()
+        self.seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM frontier WHERE prefix = ?",
+                                     (prefix,)).fetchone()[0]
+        self.unflushed = 0
+
+    def run(self):
+        """
+        Progress of the current run, or None when there is none.
+        """
+
+        row = self.conn.execute(
+            "SELECT started_at, flushed_at, flushes, pages, chunks, completed FROM crawl_runs WHERE prefix = ?",
+            (self.prefix,)
+        ).fetchone()
+        if row is None:
+            return None
+        keys = ("started_at", "flushed_at", "flushes", "pages", "chunks", "completed")
+        return dict(zip(keys, row))
+
+    def can_resume(self):
+        run = self.run()
+        return run is not None and not run["completed"]
+
+    def start(self, seeds):
+        """
+        Begin a new run, discarding any previous one, with seeds
+        ({url: priority}) queued at depth 0.
+        """
+
+        self.conn.execute("DELETE FROM frontier WHERE prefix = ?", (self.prefix,))
+        self.conn.execute("DELETE FROM crawl_runs WHERE prefix = ?", (self.prefix,))
+        self.seq = 0
+        self.conn.execute("INSERT INTO crawl_runs VALUES (?, ?, NULL, 0, 0, 0, 0)", (self.prefix, time.time()))
+        for url, priority in seeds.items():
+            self._queue(url, 0, priority)
+        self.conn.commit()
+        self.unflushed = 0
+
+    def _queue(self, url, depth, priority):
+        self.seq += 1
+        self.conn.execute("INSERT OR IGNORE INTO frontier VALUES (?, ?, ?, ?, ?, 'queued')",
+                          (self.prefix, url, depth, priority or 0.0, self.seq))
+
+    def add(self, urls, depth, priority=0.0):
+        """
+        Queue newly discovered URLs. URLs already known (queued or visited)
+        are left as they are.
+        """
+
+        for url in urls:
+            self._queue(url, depth, priority)
+
+    def next(self):
+        """
+        Next URL to visit as (url, depth): shallowest first, then highest
+        priority, then discovery order. None when the frontier is empty.
+        """
+
+        return self.conn.execute(
+            "SELECT url, depth FROM frontier WHERE prefix = ? AND state = 'queued'"
+            " ORDER BY depth, priority DESC, seq LIMIT 1",
+            (self.prefix,)
+        ).fetchone()
+
+    def mark(self, url, state="done"):
+        self.conn.execute("UPDATE frontier SET state = ? WHERE prefix = ? AND url = ?", (state, self.prefix, url))
+        self.unflushed += 1
+
+    def flush(self, chunks):
+        """
+        Commit the frontier changes since the last flush, counting the pages
+        visited and the chunks stored for them.
+        """
+
+        self.conn.execute(
+            "UPDATE crawl_runs SET flushed_at = ?, flushes = flushes + 1, pages = pages + ?, chunks = chunks + ?"
+            " WHERE prefix = ?",
+            (time.time(), self.unflushed, chunks, self.prefix)
+        )
+        self.conn.commit()
+        self.unflushed = 0
+
+    def finish(self, chunks=0):
+        """
+        Final flush; marks the run completed so the next one starts over.
+        """
+
+        self.conn.execute("UPDATE crawl_runs SET completed = 1 WHERE prefix = ?", (self.prefix,))
+        self.flush(chunks)
+
+    def stats(self):
+        counts = dict(self.conn.execute(
+            "SELECT state, COUNT(*) FROM frontier WHERE prefix = ? GROUP BY state", (self.prefix,)
+        ).fetchall())
+        return {**(self.run() or {}), **{state: counts.get(state, 0) for state in ("queued", "done", "failed")}}
+
+    def close(self):
+        """
+        Close without committing: anything not flushed is rolled back.
+        """
+
+        self.conn.close()
@@ -0,0 +1,324 @@
+"""
+Deadline-aware call layer around the Gemini client.
+
+Every call gets an overall deadline. Retryable failures (429, 5xx,
+timeouts and connection errors) are retried with full-jitter exponential
+backoff while the deadline and the retry budget allow. The budget is a
+token bucket that earns retry_ratio tokens per request and pays one per
+retry or hedge, so extra load on a struggling provider stays bounded to
+that share of traffic. With hedging on, a duplicate request is sent once
+an attempt has run longer than the observed p95 latency, and the first
+success wins. A circuit breaker opens after consecutive failed requests
+and fails fast until a probe request succeeds after the cooldown.
+
+The SDK calls block and cannot be cancelled, so attempts run on a thread
+pool; an attempt abandoned at the deadline finishes in the background and
+its result is dropped.
+"""
+import itertools
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from backend import telemetry
+
+
+class LLMUnavailable(Exception):
+    """
+    The call layer gave up. reason is "circuit_open", "deadline" or
+    "provider_error" (retryable failures outlasted the retries or budget).
+    """
+
+    def __init__(self, reason, cause=None):
+        super().__init__(f"LLM unavailable: {reason}" + (f" ({cause})" if cause is not None else ""))
+        self.reason = reason
+        self.cause = cause
+
+
+def status_of(e):
+    """
+    HTTP status of a provider error, from its attributes or message.
+    """
+
+    for attr in ("status_code", "code"):
+        value = getattr(e, attr, None)
+        if isinstance(value, int):
+            return value
+    match = re.search(r'\b(429|5\d{2})\b', str(e))
+    return int(match.group(1)) if match else None
+
+
+def is_retryable(e):
+    if isinstance(e, (TimeoutError, ConnectionError)):
+        return True
+    status = status_of(e)
+    return status is not None and (status == 429 or status >= 500)
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after failure_threshold consecutive failed requests;
+    open -> half-open after cooldown_s, letting a single probe through;
+    the probe's outcome closes or re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, cooldown_s=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.opens = 0
+
+    def allow(self):
+        with self.lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown_s:
+                self.state = "half_open"
+                self.probing = False
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = "closed"
+            self.failures = 0
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opens += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+
+class RetryBudget:
+    """
+    Token bucket shared by all requests: each request deposits ratio
+    tokens (up to max_tokens), each retry or hedge withdraws one.
+    """
+
+    def __init__(self, ratio=0.2, max_tokens=10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.lock = threading.Lock()
+
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self):
+        with self.lock:
+            if self.tokens < 1.0:
+                return False
+            self.tokens -= 1.0
+            return True
+
+
+class ResilientLLM:
+    """
+    generate(prompt) and stream(prompt) over a genai-style client with a
+    deadline, retries, optional hedging and a circuit breaker. Raises
+    LLMUnavailable when it gives up; non-retryable errors (e.g. a 400)
+    are raised unchanged.
+    """
+
+    def __init__(self, client, model, deadline_s=20.0, max_attempts=3, backoff_base_s=0.25, backoff_max_s=2.0,
+                 retry_ratio=0.2, hedge=False, hedge_min_delay_s=0.5, failure_threshold=5, cooldown_s=30.0,
+                 max_workers=32, seed=None):
+        self.client = client
+        self.model = model
+        self.deadline_s = deadline_s
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.hedge = hedge
+        self.hedge_min_delay_s = hedge_min_delay_s
+        self.breaker = CircuitBreaker(failure_threshold, cooldown_s)
+        self.budget = RetryBudget(retry_ratio)
+        self.pool = ThreadPoolExecutor(max_workers, thread_name_prefix="llm-call")
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=200)
+        self.counts = dict.fromkeys(
+            ("requests", "primary", "retry", "hedge", "hedge_wins", "circuit_open", "deadline", "provider_error"), 0
+        )
+
+    def _count(self, key, amount=1):
+        with self.lock:
+            self.counts[key] += amount
+
+    def hedge_delay(self):
+        """
+        p95 of recent successful attempt latencies, never below hedge_min_delay_s.
+        """
+
+        with self.lock:
+            ordered = sorted(self.latencies)
+        if len(ordered) < 20:
+            return max(self.hedge_min_delay_s, ordered[-1] if ordered else 0.0)
+        return max(self.hedge_min_delay_s, ordered[int(0.95 * (len(ordered) - 1))])
+
+    def backoff(self, retry):
+        """
+        Full-jitter exponential backoff before the given retry (1-based).
+        """
+
+        cap = min(self.backoff_max_s, self.backoff_base_s * 2 ** (retry - 1))
+        with self.lock:
+            return self.random.uniform(0, cap)
+
+    def generate(self, prompt, deadline_s=None):
+        """
+        generate_content for prompt within the deadline.
+        """
+
+        return self._call(lambda: self.client.models.generate_content(model=self.model, contents=prompt), deadline_s)
+
+    def stream(self, prompt, deadline_s=None):
+        """
+        generate_content_stream for prompt. The deadline, retries and hedging
+        cover the wait for the first chunk; after that the stream is passed
+        through as-is.
+        """
+
+        def start():
+            chunks = iter(self.client.models.generate_content_stream(model=self.model, contents=prompt))
+            return next(chunks, None), chunks
+
+        def discard(started):
+            close = getattr(started[1], "close", None)
+            if close is not None:
+                close()
+
+        first, chunks = self._call(start, deadline_s, discard)
+        return chunks if first is None else itertools.chain([first], chunks)
+
+    @staticmethod
+    def _timed(fn):
+        start = time.perf_counter()
+        result = fn()
+        return result, time.perf_counter() - start
+
+    def _call(self, fn, deadline_s=None, discard=None):
+        deadline = time.monotonic() + (self.deadline_s if deadline_s is None else deadline_s)
+        self._count("requests")
+        self.budget.deposit()
+        if not self.breaker.allow():
+            self._count("circuit_open")
+            telemetry.annotate(breaker="open")
+            raise LLMUnavailable("circuit_open")
+
+        attempts = {"primary": 0, "retry": 0, "hedge": 0}
+        error = None
+        try:
+            for retry in range(self.max_attempts):
+                if retry:
+                    if not self.budget.withdraw():
+                        break
+                    pause = self.backoff(retry)
+                    if time.monotonic() + pause >= deadline:
+                        raise LLMUnavailable("deadline", error)
+                    time.sleep(pause)
+                try:
+                    result = self._attempt(fn, deadline, discard, attempts, "retry" if retry else "primary")
+                except LLMUnavailable:
+                    raise
+                except Exception as e:
+                    if not is_retryable(e):
+                        # The provider answered, so it counts as healthy
+                        self.breaker.record_success()
+                        raise
+                    error = e
+                    continue
+                self.breaker.record_success()
+                return result
+            raise LLMUnavailable("provider_error", error)
+        except LLMUnavailable as e:
+            self.breaker.record_failure()
+            self._count(e.reason)
+            raise
+        finally:
+            for kind, n in attempts.items():
+                self._count(kind, n)
+            telemetry.annotate(llm_attempts=attempts, breaker=self.breaker.state)
+
+    def _attempt(self, fn, deadline, discard, attempts, kind):
+        """
+        Run fn once, plus a hedged duplicate if it is still running after
+        the hedge delay. Returns the first successful result, raises the
+        last error when every copy failed, or LLMUnavailable("deadline").
+        """
+
+        futures = {self.pool.submit(self._timed, fn): kind}
+        attempts[kind] += 1
+        hedge_at = time.monotonic() + self.hedge_delay() if self.hedge else None
+        error = None
+        while futures:
+            now = time.monotonic()
+            if now >= deadline:
+                self._abandon(futures, discard)
+                raise LLMUnavailable("deadline")
+            timeout = deadline - now
+            if hedge_at is not None:
+                timeout = min(timeout, max(0.0, hedge_at - now))
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                label = futures.pop(future)
+                try:
+                    result, elapsed = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                with self.lock:
+                    self.latencies.append(elapsed)
+                if label == "hedge":
+                    self._count("hedge_wins")
+                self._abandon(futures, discard)
+                return result
+            if futures and hedge_at is not None and time.monotonic() >= hedge_at:
+                hedge_at = None
+                if self.budget.withdraw():
+                    futures[self.pool.submit(self._timed, fn)] = "hedge"
+                    attempts["hedge"] += 1
+        raise error
+
+    @staticmethod
+    def _abandon(futures, discard):
+        """
+        Drop the results of attempts still running, releasing them with
+        discard(result) once they finish.
+        """
+
+        if discard is None:
+            return
+
+        def release(future):
+            if not future.cancelled() and future.exception() is None:
+                discard(future.result()[0])
+
+        for future in futures:
+            future.add_done_callback(release)
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        counts.update({
+            "breaker": self.breaker.state,
+            "breaker_opens": self.breaker.opens,
+            "retry_tokens": round(self.budget.tokens, 2),
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1),
+        })
+        return counts
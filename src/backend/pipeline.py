@@ -0,0 +1,365 @@
+"""
+Staged ingestion pipeline.
+
+    fetch (thread pool) -> parse + split (process pool) -> embed (worker thread) -> write (worker thread)
+
+Stages are connected by bounded queues so a slow stage applies backpressure
+to the ones before it and memory stays bounded. Chunk IDs are content-derived
+(see data_ingestion.make_chunk_id) and written with upsert, so stages never
+need to coordinate sequence numbers.
+
+Run from src/:  python -m backend.pipeline
+"""
+import argparse
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import requests
+from backend import router, vector_index
+from backend.bm25 import build_from_collection
+from backend.data_ingestion import (
+    BASE_URLS,
+    INGEST_DB_PATH,
+    MAX_DEPTH,
+    REQUEST_TIMEOUT,
+    chunk_content,
+    extract_links,
+    get_ingest_collection,
+    get_model,
+    is_allowed_url,
+    normalize_url,
+    open_dedup_index,
+    parse_html,
+    split_chunks,
+)
+
+FETCH_WORKERS = 8
+PARSE_WORKERS = 4
+EMBED_QUEUE_SIZE = 2048  # Max sub-chunks waiting to be embedded
+WRITE_QUEUE_SIZE = 2048  # Max embedded sub-chunks waiting to be written
+EMBED_BATCH = 256  # Sub-chunks gathered before one encode call
+ENCODE_BATCH_SIZE = 64  # Forward-pass batch size inside encode
+WRITE_BATCH = 512  # Sub-chunks per collection.upsert
+FLUSH_INTERVAL = 1.0  # Seconds a partial batch may wait before being flushed
+
+_SENTINEL = None
+_local = threading.local()
+
+
+class StageStats:
+    """
+    Thread-safe item and busy-time counters for one pipeline stage.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, items, seconds):
+        with self.lock:
+            self.items += items
+            self.busy += seconds
+
+    def report(self, wall):
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "busy_s": round(self.busy, 3),
+            "items_per_busy_s": round(self.items / self.busy, 2) if self.busy else 0.0,
+            "items_per_wall_s": round(self.items / wall, 2) if wall else 0.0,
+        }
+
+
+def fetch_page(url):
+    """
+    Fetch a page with a keep-alive session owned by the calling thread.
+    """
+
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    start = time.perf_counter()
+    resp = session.get(url, timeout=REQUEST_TIMEOUT)
+    resp.raise_for_status()
+    return resp.text, time.perf_counter() - start
+
+
+def parse_page(html, url, base_url, id_prefix, want_links):
+    """
+    Parse, chunk and split one page. Runs in a worker process.
+    """
+
+    start = time.perf_counter()
+    soup = parse_html(html)
+    documents, metadatas, ids = split_chunks(chunk_content(soup, url), id_prefix)
+    links = set()
+    if want_links:
+        links = extract_links(soup, url, lambda u: is_allowed_url(u, base_url))
+    return documents, metadatas, ids, links, time.perf_counter() - start
+
+
+def _drain(q, first, limit, deadline):
+    """
+    Gather items after first until limit is reached, the deadline passes
+    or the sentinel arrives. Returns (items, saw_sentinel).
+    """
+
+    items = [first]
+    while len(items) < limit:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            break
+        try:
+            item = q.get(timeout=timeout)
+        except queue.Empty:
+            break
+        if item is _SENTINEL:
+            return items, True
+        items.append(item)
+    return items, False
+
+
+def embed_worker(embed_queue, write_queue, stats, embed_batch, encode_batch_size, errors):
+    """
+    Embed sub-chunks in large batches. Each batch is sorted by length so
+    the forward passes inside encode see similar-length inputs. Stops when
+    another stage fails.
+    """
+
+    model = get_model()
+    done = False
+    while not done:
+        first = _get(embed_queue, errors)
+        if first is _SENTINEL:
+            break
+        items, done = _drain(embed_queue, first, embed_batch, time.monotonic() + FLUSH_INTERVAL)
+        items.sort(key=lambda item: len(item[0]))
+        start = time.perf_counter()
+        vectors = model.encode([doc for doc, _, _ in items], batch_size=encode_batch_size)
+        stats.add(len(items), time.perf_counter() - start)
+        for (doc, meta, cid), vec in zip(items, vectors):
+            _put(write_queue, (doc, meta, cid, vec), errors)
+    _put(write_queue, _SENTINEL, errors)
+
+
+def write_worker(write_queue, collection, stats, write_batch, errors):
+    """
+    Upsert embedded sub-chunks into ChromaDB in batches. Stops when another
+    stage fails.
+    """
+
+    done = False
+    while not done:
+        first = _get(write_queue, errors)
+        if first is _SENTINEL:
+            break
+        items, done = _drain(write_queue, first, write_batch, time.monotonic() + FLUSH_INTERVAL)
+        start = time.perf_counter()
+        collection.upsert(
+            documents=[doc for doc, _, _, _ in items],
+            metadatas=[meta for _, meta, _, _ in items],
+            ids=[cid for _, _, cid, _ in items],
+            embeddings=[vec.tolist() for _, _, _, vec in items]
+        )
+        stats.add(len(items), time.perf_counter() - start)
+
+
+def _run_worker(target, errors, *args):
+    try:
+        target(*args)
+    except Exception as e:
+        errors.append(e)
+
+
+def _put(q, item, errors):
+    """
+    Blocking put that gives up if a downstream worker has failed.
+    """
+
+    while True:
+        if errors:
+            raise errors[0]
+        try:
+            q.put(item, timeout=1.0)
+            return
+        except queue.Full:
+            continue
+
+
+def _get(q, errors):
+    """
+    Blocking get that returns the sentinel once any stage has failed, so a
+    worker whose producer died does not wait forever.
+    """
+
+    while not errors:
+        try:
+            return q.get(timeout=1.0)
+        except queue.Empty:
+            continue
+    return _SENTINEL
+
+
+def _join(workers, errors):
+    """
+    Wait for the workers to finish, or until one of them has failed.
+    """
+
+    for w in workers:
+        while w.is_alive() and not errors:
+            w.join(timeout=1.0)
+
+
+def run_pipeline(start_url, base_url, max_depth=MAX_DEPTH, id_prefix="", collection=None,
+                 fetch_workers=FETCH_WORKERS, parse_workers=PARSE_WORKERS,
+                 embed_batch=EMBED_BATCH, encode_batch_size=ENCODE_BATCH_SIZE, write_batch=WRITE_BATCH,
+                 dedup=None):
+    """
+    Crawl start_url level by level (same BFS depths and is_allowed_url
+    filter as crawl_and_embed) with all stages running concurrently.
+    With a dedup SignatureIndex, near-duplicates are dropped in the main
+    process before they reach the embedder, and the new signatures are
+    committed once the writer has stored every chunk. Returns a per-stage
+    throughput report.
+    """
+
+    collection = collection if collection is not None else get_ingest_collection()
+    embed_queue = queue.Queue(maxsize=EMBED_QUEUE_SIZE)
+    write_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+    stats = {name: StageStats(name) for name in ("fetch", "parse", "embed", "write")}
+    errors = []
+
+    workers = [
+        threading.Thread(target=_run_worker, daemon=True,
+                         args=(embed_worker, errors, embed_queue, write_queue, stats["embed"],
+                               embed_batch, encode_batch_size, errors)),
+        threading.Thread(target=_run_worker, daemon=True,
+                         args=(write_worker, errors, write_queue, collection, stats["write"], write_batch,
+                               errors)),
+    ]
+    for w in workers:
+        w.start()
+
+    started = time.perf_counter()
+    visited = set()
+    frontier = [normalize_url(start_url)]
+    max_inflight = fetch_workers + parse_workers * 2
+
+    try:
+        with ThreadPoolExecutor(fetch_workers) as fetch_pool, ProcessPoolExecutor(parse_workers) as parse_pool:
+            for depth in range(max_depth + 1):
+                level = deque()
+                for url in frontier:
+                    if url not in visited and is_allowed_url(url, base_url):
+                        visited.add(url)
+                        level.append(url)
+                if not level:
+                    break
+                print(f"[pipeline] Depth {depth}: {len(level)} URLs")
+
+                next_frontier = {}
+                inflight = {}
+                while level or inflight:
+                    while level and len(inflight) < max_inflight:
+                        url = level.popleft()
+                        inflight[fetch_pool.submit(fetch_page, url)] = ("fetch", url)
+                    done, _ = wait(list(inflight), return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        kind, url = inflight.pop(fut)
+                        try:
+                            result = fut.result()
+                        except Exception as e:
+                            print(f"[pipeline] Error {kind} {url}: {e}")
+                            continue
+                        if kind == "fetch":
+                            html, elapsed = result
+                            stats["fetch"].add(1, elapsed)
+                            parse_fut = parse_pool.submit(parse_page, html, url, base_url, id_prefix,
+                                                          depth < max_depth)
+                            inflight[parse_fut] = ("parse", url)
+                            continue
+                        documents, metadatas, ids, links, elapsed = result
+                        stats["parse"].add(1, elapsed)
+                        if dedup is not None:
+                            documents, metadatas, ids = dedup.filter(documents, metadatas, ids)
+                        for sub_url in links:
+                            if sub_url not in visited:
+                                next_frontier[sub_url] = None
+                        # Blocks when the embedder falls behind, which stops new fetches
+                        for item in zip(documents, metadatas, ids):
+                            _put(embed_queue, item, errors)
+                frontier = list(next_frontier)
+
+        _put(embed_queue, _SENTINEL, errors)
+        _join(workers, errors)
+        if errors:
+            raise errors[0]
+        if dedup is not None:
+            # Canonicals are only guaranteed to be written once the writer is done
+            dedup.sync_metadata(collection)
+            dedup.commit()
+    except Exception as e:
+        if not errors:
+            errors.append(e)  # Stops the workers
+        if dedup is not None:
+            dedup.rollback()
+        raise
+
+    wall = time.perf_counter() - started
+    report = {
+        "start_url": start_url,
+        "pages": len(visited),
+        "wall_s": round(wall, 3),
+        "stages": [s.report(wall) for s in stats.values()],
+    }
+    if dedup is not None:
+        report["dedup"] = dedup.stats()
+    for stage in report["stages"]:
+        print(f"[pipeline] {stage['stage']:>5}: {stage['items']} items, "
+              f"{stage['items_per_busy_s']}/s busy, {stage['items_per_wall_s']}/s wall")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the staged ingestion pipeline.")
+    parser.add_argument("--fetch-workers", type=int, default=FETCH_WORKERS)
+    parser.add_argument("--parse-workers", type=int, default=PARSE_WORKERS)
+    parser.add_argument("--embed-batch", type=int, default=EMBED_BATCH)
+    parser.add_argument("--write-batch", type=int, default=WRITE_BATCH)
+    parser.add_argument("--no-dedup", dest="dedup", action="store_false",
+                        help="Store near-duplicate chunks instead of recording them as alternate URLs")
+    args = parser.parse_args()
+
+    index = open_dedup_index() if args.dedup else None
+
+    try:
+        for base_url, id_prefix in BASE_URLS:
+            print(f"\n--- Starting pipeline for {base_url} ---\n")
+            run_pipeline(
+                start_url=base_url,
+                base_url=base_url,
+                max_depth=MAX_DEPTH,
+                id_prefix=id_prefix,
+                fetch_workers=args.fetch_workers,
+                parse_workers=args.parse_workers,
+                embed_batch=args.embed_batch,
+                write_batch=args.write_batch,
+                dedup=index
+            )
+    finally:
+        if index is not None:
+            print(f"[dedup] {index.stats()}")
+            index.close()
+
+    build_from_collection(get_ingest_collection(), os.path.join(INGEST_DB_PATH, "bm25"))
+    vector_index.refresh(get_ingest_collection(), INGEST_DB_PATH)
+    router.refresh(get_ingest_collection(), INGEST_DB_PATH)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from backend import telemetry
+from backend.answer_cache import SemanticAnswerCache
+from backend.batching import MicroBatcher
+from backend.feedback_store import FeedbackStore
+from backend.bm25 import BM25Index
+from backend.vector_index import VectorIndex
+from backend import snapshots
+from backend.inference import load_encoder, load_cross_encoder
+from backend.llm_client import ResilientLLM
+from backend.router import PartitionRouter
+from backend.config import (
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_MAX_BYTES,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_PATH,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL,
+    BATCH_MAX_WAIT_MS,
+    BM25_DIR_NAME,
+    EMBED_MAX_BATCH,
+    HYBRID_RETRIEVAL,
+    MICRO_BATCHING,
+    RERANK_MAX_BATCH,
+    METRICS_FILE,
+    METRICS_PORT,
+    PARTITION_ROUTER_FILE,
+    PARTITION_ROUTING,
+    PARTITION_WORKERS,
+    ROUTER_MARGIN,
+    SNAPSHOT_POLL_INTERVAL,
+    VECTOR_BACKEND,
+    VECTOR_INDEX_DIR_NAME,
+    VECTOR_OVERSAMPLE,
+    FEEDBACK_DB_PATH,
+    COLLECTION_NAME,
+    EMBEDDING_MODEL,
+    CROSS_ENCODER_MODEL,
+    CROSS_ENCODER_BACKEND,
+    INFERENCE_BACKEND,
+    MODEL_DEVICE,
+    GEMINI_API_KEY_ENV,
+    GEMINI_MODEL,
+    API_LLM_WORKERS,
+    UI_ANSWER_WORKERS,
+    LLM_BACKOFF_BASE_S,
+    LLM_BACKOFF_MAX_S,
+    LLM_BREAKER_COOLDOWN_S,
+    LLM_BREAKER_FAILURES,
+    LLM_DEADLINE_S,
+    LLM_HEDGE_MIN_DELAY_S,
+    LLM_HEDGING,
+    LLM_MAX_ATTEMPTS,
+    LLM_RETRY_BUDGET,
+)
+
+load_dotenv()
+
+# Process-wide resources shared by every Streamlit session. Each entry has
+# its own lock so loading one model never blocks access to another.
+_resources = {}
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(key):
+    with _locks_guard:
+        if key not in _locks:
+            _locks[key] = threading.Lock()
+        return _locks[key]
+
+
+def get_or_create(key, factory):
+    """
+    Return the shared resource stored under key, building it with factory
+    exactly once even when several threads ask for it at the same time.
+    """
+
+    resource = _resources.get(key)
+    if resource is not None:
+        return resource
+    with _lock_for(key):
+        resource = _resources.get(key)
+        if resource is None:
+            resource = factory()
+            _resources[key] = resource
+    return resource
+
+
+def is_loaded(key):
+    """
+    Check whether a shared resource has already been built.
+    """
+
+    return key in _resources
+
+
+def set_resource(key, resource):
+    """
+    Install a resource under key, replacing any existing one. Used by
+    benchmarks to point the shared Chatbot at a synthetic collection.
+    """
+
+    with _lock_for(key):
+        _resources[key] = resource
+
+
+def reset(key=None):
+    """
+    Drop one shared resource (or all of them) so it is rebuilt on next access.
+    """
+
+    with _locks_guard:
+        if key is None:
+            _resources.clear()
+        else:
+            _resources.pop(key, None)
+
+
+def get_encoder():
+    """
+    Shared bi-encoder used for query embeddings.
+    """
+
+    return get_or_create(
+        "encoder", lambda: load_encoder(EMBEDDING_MODEL, INFERENCE_BACKEND, MODEL_DEVICE)
+    )
+
+
+def get_cross_encoder():
+    """
+    Shared cross-encoder used for reranking.
+    """
+
+    return get_or_create(
+        "cross_encoder", lambda: load_cross_encoder(CROSS_ENCODER_MODEL, CROSS_ENCODER_BACKEND, MODEL_DEVICE)
+    )
+
+
+def get_embedding_batcher():
+    """
+    Shared micro-batcher for query embeddings, or None when disabled.
+    """
+
+    if not MICRO_BATCHING:
+        return None
+
+    def build():
+        encoder = get_encoder()
+        return MicroBatcher(
+            "embedding",
+            lambda queries: encoder.encode(queries, batch_size=EMBED_MAX_BATCH),
+            max_batch=EMBED_MAX_BATCH,
+            max_wait_ms=BATCH_MAX_WAIT_MS,
+        )
+
+    return get_or_create("embedding_batcher", build)
+
+
+def get_rerank_batcher():
+    """
+    Shared micro-batcher for cross-encoder (query, passage) pairs, or None when disabled.
+    """
+
+    if not MICRO_BATCHING:
+        return None
+
+    def build():
+        cross_encoder = get_cross_encoder()
+        return MicroBatcher(
+            "cross_encoder",
+            lambda pairs: cross_encoder.predict(pairs, batch_size=RERANK_MAX_BATCH),
+            max_batch=RERANK_MAX_BATCH,
+            max_wait_ms=BATCH_MAX_WAIT_MS,
+        )
+
+    return get_or_create("rerank_batcher", build)
+
+
+def get_chroma_client():
+    """
+    Shared persistent ChromaDB client on the active snapshot.
+    """
+
+    import chromadb
+    return get_or_create("chroma_client", lambda: chromadb.PersistentClient(path=snapshots.active_db_path()))
+
+
+def get_collection():
+    """
+    Shared handle to the handbook collection: the Chroma collection, or the
+    memory-mapped VectorIndex when VECTOR_BACKEND is "numpy" and it was built.
+    """
+
+    def build():
+        index = _load_vector_index(snapshots.active_db_path())
+        return index or get_chroma_client().get_or_create_collection(COLLECTION_NAME)
+
+    return get_or_create("collection", build)
+
+
+def _load_vector_index(db_path):
+    """
+    VectorIndex stored in a Chroma directory, or None when the numpy
+    backend is not selected or no index was built.
+    """
+
+    index_path = os.path.join(db_path, VECTOR_INDEX_DIR_NAME)
+    if VECTOR_BACKEND != "numpy":
+        return None
+    if not os.path.exists(os.path.join(index_path, "meta.json")):
+        print(f"[registry] No vector index in {index_path}, falling back to Chroma")
+        return None
+    return VectorIndex(index_path, oversample=VECTOR_OVERSAMPLE)
+
+
+def get_genai_client():
+    """
+    Shared Gemini client.
+    """
+
+    from google import genai
+    return get_or_create("genai_client", lambda: genai.Client(api_key=os.getenv(GEMINI_API_KEY_ENV)))
+
+
+def build_llm(client):
+    """
+    Gemini call layer over client with the configured deadline, retries,
+    hedging and circuit breaker.
+    """
+
+    return ResilientLLM(
+        client,
+        GEMINI_MODEL,
+        deadline_s=LLM_DEADLINE_S,
+        max_attempts=LLM_MAX_ATTEMPTS,
+        backoff_base_s=LLM_BACKOFF_BASE_S,
+        backoff_max_s=LLM_BACKOFF_MAX_S,
+        retry_ratio=LLM_RETRY_BUDGET,
+        hedge=LLM_HEDGING,
+        hedge_min_delay_s=LLM_HEDGE_MIN_DELAY_S,
+        failure_threshold=LLM_BREAKER_FAILURES,
+        cooldown_s=LLM_BREAKER_COOLDOWN_S,
+        # Hedges and abandoned attempts need threads beyond the API's LLM workers
+        max_workers=2 * API_LLM_WORKERS,
+    )
+
+
+def get_llm():
+    """
+    Shared call layer over the shared Gemini client, so every session sees
+    the same circuit breaker, retry budget and latency history.
+    """
+
+    return get_or_create("llm", lambda: build_llm(get_genai_client()))
+
+
+def get_bm25_index():
+    """
+    Shared lazily loaded BM25 index, or None when hybrid retrieval is
+    disabled or no index was built for the collection.
+    """
+
+    return get_or_create("bm25_index", lambda: _load_bm25(snapshots.active_db_path())) or None
+
+
+def _load_bm25(db_path):
+    """
+    BM25 index stored in a Chroma directory, or False when there is none
+    (False rather than None so the registry remembers the miss).
+    """
+
+    index_path = os.path.join(db_path, BM25_DIR_NAME)
+    if not HYBRID_RETRIEVAL or not os.path.exists(os.path.join(index_path, "meta.json")):
+        return False
+    return BM25Index(index_path)
+
+
+def get_router():
+    """
+    Shared partition router, or None when routing is disabled or no router
+    was built for the collection.
+    """
+
+    return get_or_create("router", lambda: _load_router(snapshots.active_db_path())) or None
+
+
+def _load_router(db_path):
+    """
+    PartitionRouter stored in a Chroma directory, or False when there is none.
+    """
+
+    path = os.path.join(db_path, PARTITION_ROUTER_FILE)
+    if not PARTITION_ROUTING:
+        return False
+    if not os.path.exists(path):
+        print(f"[registry] No partition router in {db_path}, searching the whole collection")
+        return False
+    return PartitionRouter.load(path, ROUTER_MARGIN)
+
+
+def get_partition_pool():
+    """
+    Thread pool for querying partitions in parallel.
+    """
+
+    return get_or_create("partition_pool",
+                         lambda: ThreadPoolExecutor(PARTITION_WORKERS, thread_name_prefix="partition-query"))
+
+
+def get_answer_cache():
+    """
+    Shared semantic answer cache, or None when disabled. It is invalidated
+    whenever the collection size changes.
+    """
+
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    return get_or_create("answer_cache", lambda: SemanticAnswerCache(
+        threshold=ANSWER_CACHE_THRESHOLD,
+        ttl=ANSWER_CACHE_TTL,
+        max_entries=ANSWER_CACHE_MAX_ENTRIES,
+        max_bytes=ANSWER_CACHE_MAX_BYTES,
+        path=ANSWER_CACHE_PATH,
+        fingerprint_fn=lambda: f"{snapshots.active_version()}:{get_collection().count()}",
+    ))
+
+
+def get_feedback_store():
+    """
+    Shared feedback store with its background writer.
+    """
+
+    return get_or_create("feedback_store", lambda: FeedbackStore(FEEDBACK_DB_PATH))
+
+
+def get_answer_pool():
+    """
+    Thread pool on which the Streamlit sessions' questions are answered.
+    """
+
+    return get_or_create("answer_pool", lambda: ThreadPoolExecutor(UI_ANSWER_WORKERS, thread_name_prefix="ui-answer"))
+
+
+def get_chatbot():
+    """
+    Shared Chatbot instance. The Chatbot holds no per-user state, so every
+    session can safely use the same one.
+    """
+
+    from backend.chatbot import Chatbot
+    return get_or_create("chatbot", Chatbot)
+
+
+def start_background_loading(warm_up=False):
+    """
+    Load models, collection and chatbot on a background thread, at most once
+    per process. Returns the backend.startup.StartupStatus to poll for readiness.
+    """
+
+    from backend import startup
+    return get_or_create("startup_status", lambda: startup.start(warm_up=warm_up))
+
+
+def startup_status():
+    """
+    Status of the background loader, or None if it was never started.
+    """
+
+    return _resources.get("startup_status")
+
+
+def activate_snapshot(version):
+    """
+    Switch the shared client, collection, BM25 index and router to an installed
+    snapshot version without a restart. The new collection is opened
+    before anything is switched; requests already running keep the
+    handles they started with, since old versions stay on disk.
+    """
+
+    import chromadb
+    path = snapshots.db_path(version)
+    client = chromadb.PersistentClient(path=path)
+    collection = _load_vector_index(path) or client.get_collection(COLLECTION_NAME)
+    bm25_index = _load_bm25(path)
+    router = _load_router(path)
+    if snapshots.active_version() != version:
+        snapshots.activate(version)
+    set_resource("chroma_client", client)
+    set_resource("collection", collection)
+    set_resource("bm25_index", bm25_index)
+    set_resource("router", router)
+    chatbot = _resources.get("chatbot")
+    if chatbot is not None:
+        chatbot.swap_index(collection, bm25_index or None, router or None)
+    print(f"[snapshots] Serving version {version} ({collection.count()} chunks)")
+
+
+def start_snapshot_watcher():
+    """
+    Poll the active snapshot pointer and hot swap when another process
+    (e.g. python -m backend.snapshots install) activates a new version.
+    At most one watcher per process; disabled when SNAPSHOT_POLL_INTERVAL is 0.
+    """
+
+    if SNAPSHOT_POLL_INTERVAL <= 0:
+        return None
+
+    def run():
+        serving = snapshots.active_version()
+        while True:
+            time.sleep(SNAPSHOT_POLL_INTERVAL)
+            version = snapshots.active_version()
+            if version and version != serving:
+                try:
+                    activate_snapshot(version)
+                    serving = version
+                except Exception as e:
+                    print(f"[snapshots] Could not switch to {version}: {e}")
+
+    def start():
+        thread = threading.Thread(target=run, name="snapshot-watcher", daemon=True)
+        thread.start()
+        return thread
+
+    return get_or_create("snapshot_watcher", start)
+
+
+def start_metrics_exporters():
+    """
+    Start the configured metrics exporters, at most once per process.
+    """
+
+    def start():
+        exporters = []
+        if METRICS_PORT:
+            exporters.append(telemetry.start_http_exporter(METRICS_PORT))
+        if METRICS_FILE:
+            exporters.append(telemetry.start_file_exporter(METRICS_FILE))
+        return exporters
+
+    return get_or_create("metrics_exporters", start)
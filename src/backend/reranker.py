@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+import numpy as np
+from utils.helpers import normalize, title_keywords
+
+
+@lru_cache(maxsize=8192)
+def title_features(section_title):
+    """
+    Normalized title and title keyword set, for collections ingested
+    before these were precomputed into chunk metadata.
+    """
+
+    return normalize(section_title), frozenset(title_keywords(section_title))
+
+
+def candidate_title_features(meta):
+    """
+    Title features of a candidate, read from metadata when ingestion
+    stored them ('title_norm' and space-separated 'title_keywords').
+    """
+
+    if 'title_norm' in meta and 'title_keywords' in meta:
+        return meta['title_norm'], frozenset(meta['title_keywords'].split())
+    return title_features(meta.get('section_title', ''))
+
+
+def title_boosts(user_query, metas, strong_boost=2.0, weak_boost=0.75, overlap_threshold=0.6):
+    """
+    Title keyword boost for every candidate as one NumPy operation:
+    strong_boost when more than overlap_threshold of the title keywords
+    appear in the query, otherwise weak_boost when any query word occurs
+    in the normalized title.
+    """
+
+    keywords = list(set(user_query.lower().split()))
+    if not metas or not keywords:
+        return np.zeros(len(metas), dtype=np.float32)
+
+    features = [candidate_title_features(meta) for meta in metas]
+    title_norms = np.array([norm for norm, _ in features], dtype=str)
+    vocab = {word: j for j, word in enumerate(keywords)}
+    membership = np.zeros((len(metas), len(keywords)), dtype=np.float32)
+    title_sizes = np.empty(len(metas), dtype=np.float32)
+    for i, (_, kw) in enumerate(features):
+        title_sizes[i] = max(1, len(kw))
+        for word in kw:
+            j = vocab.get(word)
+            if j is not None:
+                membership[i, j] = 1.0
+
+    overlap = membership.sum(axis=1) / title_sizes
+    contains = np.zeros(len(metas), dtype=bool)
+    for word in keywords:
+        contains |= np.char.find(title_norms, word) >= 0
+    return np.where(overlap > overlap_threshold, strong_boost,
+                    np.where(contains, weak_boost, 0.0)).astype(np.float32)
+
+
+def truncate_to_window(text, max_tokens, chars_per_token=4):
+    """
+    Cut a candidate down to roughly max_tokens tokens before it is paired
+    with the query, so the cross-encoder never processes text it would drop.
+    """
+
+    limit = max_tokens * chars_per_token
+    return text if len(text) <= limit else text[:limit]
+
+
+class BudgetedReranker:
+    """
+    Chooses how many candidates to cross-encode so the rerank step stays
+    within a p95 latency target.
+
+    Per-pair cross-encoder cost is tracked online; the candidate count is
+    the largest that fits target_ms at the observed p95 per-pair cost
+    (never fewer than min_candidates). Candidates whose bi-encoder distance
+    is worse than the best by more than decisive_margin are not scored.
+    """
+
+    def __init__(self, target_ms=150.0, min_candidates=3, max_candidates=15, decisive_margin=0.35,
+                 window=200, initial_pair_ms=8.0):
+        self.target_ms = target_ms
+        self.min_candidates = min_candidates
+        self.max_candidates = max_candidates
+        self.decisive_margin = decisive_margin
+        self.pair_ms = deque([initial_pair_ms], maxlen=window)
+        self.lock = threading.Lock()
+
+    def pair_cost_p95(self):
+        with self.lock:
+            ordered = sorted(self.pair_ms)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def budget(self):
+        """
+        Number of candidates that fit the latency target.
+        """
+
+        fit = int(self.target_ms // max(self.pair_cost_p95(), 1e-3))
+        return max(self.min_candidates, min(self.max_candidates, fit))
+
+    def observe(self, n_pairs, elapsed_ms):
+        if n_pairs:
+            with self.lock:
+                self.pair_ms.append(elapsed_ms / n_pairs)
+
+    def select(self, metas):
+        """
+        Indices of the candidates worth cross-encoding, in retrieval order.
+        Candidates without a bi-encoder distance (lexical-only hits) are
+        never pruned by the margin.
+        """
+
+        order = list(range(len(metas)))
+        distances = [meta.get('distance') for meta in metas]
+        known = [d for d in distances if d is not None]
+        if known:
+            best = min(known)
+            keep = [i for i in order if distances[i] is None or distances[i] - best <= self.decisive_margin]
+            # The margin may not prune below the minimum candidate count
+            if len(keep) >= self.min_candidates:
+                order = keep
+        return order[:self.budget()]
+
+    def rerank(self, user_query, docs, metas, score_fn, top_k):
+        """
+        Score the selected candidates with score_fn(query, docs, metas),
+        add title boosts and return the top_k (doc, meta, score) triples.
+        """
+
+        selected = self.select(metas)
+        sel_docs = [docs[i] for i in selected]
+        sel_metas = [metas[i] for i in selected]
+        start = time.perf_counter()
+        scores, n_scored = score_fn(user_query, sel_docs, sel_metas)
+        self.observe(n_scored, (time.perf_counter() - start) * 1000)
+        scores = np.asarray(scores, dtype=np.float32) + title_boosts(user_query, sel_metas)
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return [(sel_docs[i], sel_metas[i], float(scores[i])) for i in order]
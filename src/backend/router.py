@@ -0,0 +1,197 @@
+"""
+Query routing across the source partitions of the collection.
+
+Chunks are partitioned by their 'source_prefix' metadata (handbook_,
+direction_), and every partition can be searched on its own with a
+metadata where filter. Each partition is summarized by a few spherical
+k-means centroids of its normalized embeddings, stored in one .npz file
+next to the BM25 and vector indexes. A query is sent to a single partition
+when that partition's best centroid beats every other partition's by at
+least the margin (cosine similarity). Otherwise it fans out to all
+partitions in parallel and the hits are merged by distance.
+
+Build from src/:  python -m backend.router
+"""
+import os
+import threading
+import time
+import numpy as np
+
+PARTITION_KEY = "source_prefix"
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def spherical_kmeans(vectors, k, iterations=15, seed=0):
+    """
+    k unit centroids of unit vectors (cosine k-means). Returns fewer when
+    there are fewer vectors than k.
+    """
+
+    k = min(k, len(vectors))
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)]
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(k):
+            members = vectors[assignment == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids = normalize_rows(centroids)
+    return centroids
+
+
+def build_router(collection, path, centroids_per_partition=8, page_size=1000):
+    """
+    Compute partition centroids from every row of a collection and write
+    them to path. Rows without a partition key are left out.
+    """
+
+    vectors = {}
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings", "metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        for embedding, meta in zip(page["embeddings"], page["metadatas"]):
+            name = (meta or {}).get(PARTITION_KEY)
+            if name:
+                vectors.setdefault(name, []).append(embedding)
+        offset += len(page["ids"])
+
+    names, centroids, owners, sizes = [], [], [], []
+    for i, name in enumerate(sorted(vectors)):
+        part = spherical_kmeans(normalize_rows(vectors[name]), centroids_per_partition)
+        names.append(name)
+        sizes.append(len(vectors[name]))
+        centroids.append(part)
+        owners.extend([i] * len(part))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "wb") as f:
+        np.savez(f, names=np.array(names), sizes=np.array(sizes, dtype=np.int64),
+                 centroids=np.concatenate(centroids) if centroids else np.zeros((0, 0), dtype=np.float32),
+                 owners=np.array(owners, dtype=np.int32))
+    print(f"[router] {len(names)} partitions ({', '.join(f'{n}: {s}' for n, s in zip(names, sizes))}) into {path}")
+    return len(names)
+
+
+def refresh(collection, db_path):
+    """
+    Rebuild the router of a Chroma directory after ingestion.
+    """
+
+    from backend.config import PARTITION_ROUTER_FILE, ROUTER_CENTROIDS
+    return build_router(collection, os.path.join(db_path, PARTITION_ROUTER_FILE), ROUTER_CENTROIDS)
+
+
+class PartitionRouter:
+    """
+    Picks the partitions to search for a query embedding.
+    """
+
+    def __init__(self, names, centroids, owners, sizes=None, margin=0.05):
+        self.names = list(names)
+        self.centroids = normalize_rows(centroids) if len(centroids) else np.zeros((0, 0), dtype=np.float32)
+        self.owners = np.asarray(owners)
+        self.sizes = dict(zip(self.names, sizes)) if sizes is not None else {}
+        self.margin = margin
+        self.lock = threading.Lock()
+        self.counts = {"routed": 0, "fanned_out": 0, **{name: 0 for name in self.names}}
+
+    @classmethod
+    def load(cls, path, margin=0.05):
+        with np.load(path) as data:
+            return cls([str(n) for n in data["names"]], data["centroids"], data["owners"],
+                       data["sizes"].tolist(), margin)
+
+    def scores(self, query_emb):
+        """
+        Best centroid cosine similarity per partition.
+        """
+
+        query = normalize_rows(np.asarray(query_emb, dtype=np.float32).reshape(1, -1))[0]
+        sims = self.centroids @ query
+        best = np.full(len(self.names), -np.inf, dtype=np.float32)
+        np.maximum.at(best, self.owners, sims)
+        return dict(zip(self.names, best.tolist()))
+
+    def route(self, query_emb):
+        """
+        (partitions to search, routed): a single partition when it leads by
+        the margin, otherwise every partition.
+        """
+
+        if len(self.names) < 2:
+            return list(self.names), False
+        ranked = sorted(self.scores(query_emb).items(), key=lambda item: item[1], reverse=True)
+        routed = ranked[0][1] - ranked[1][1] >= self.margin
+        with self.lock:
+            if routed:
+                self.counts["routed"] += 1
+                self.counts[ranked[0][0]] += 1
+            else:
+                self.counts["fanned_out"] += 1
+        return ([ranked[0][0]] if routed else list(self.names)), routed
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+
+def query_partition(collection, query_emb, n_results, partition, include=("documents", "metadatas", "distances")):
+    """
+    Nearest neighbours within one partition, as (ids, documents, metadatas,
+    distances, elapsed ms).
+    """
+
+    start = time.perf_counter()
+    results = collection.query(
+        query_embeddings=query_emb,
+        n_results=n_results,
+        where={PARTITION_KEY: partition},
+        include=list(include)
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+    ids = results.get("ids", [[]])[0]
+    return (ids, results.get("documents", [[]])[0], results.get("metadatas", [[]])[0],
+            (results.get("distances") or [[]])[0] or [None] * len(ids), elapsed)
+
+
+def partitioned_query(collection, query_emb, n_results, partitions, pool=None):
+    """
+    Query each partition (in parallel on pool when there are several) and
+    merge the hits by distance into one Chroma-style result. Also returns
+    the query time in ms per partition.
+    """
+
+    if pool is not None and len(partitions) > 1:
+        futures = {p: pool.submit(query_partition, collection, query_emb, n_results, p) for p in partitions}
+        parts = {p: future.result() for p, future in futures.items()}
+    else:
+        parts = {p: query_partition(collection, query_emb, n_results, p) for p in partitions}
+    hits = []
+    for ids, docs, metas, distances, _ in parts.values():
+        hits.extend(zip(distances, ids, docs, metas))
+    hits.sort(key=lambda hit: float("inf") if hit[0] is None else hit[0])
+    hits = hits[:n_results]
+    merged = {
+        "ids": [[hit[1] for hit in hits]],
+        "documents": [[hit[2] for hit in hits]],
+        "metadatas": [[hit[3] for hit in hits]],
+        "distances": [[hit[0] for hit in hits]],
+    }
+    return merged, {p: part[4] for p, part in parts.items()}
+
+
+def main():
+    from backend.registry import get_collection
+    from backend.snapshots import active_db_path
+    refresh(get_collection(), active_db_path())
+
+
+if __name__ == "__main__":
+    main()
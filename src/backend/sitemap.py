@@ -0,0 +1,116 @@
+"""
+Sitemap discovery for the ingestion crawl.
+
+Finds a site's sitemaps from the Sitemap: lines of robots.txt (falling back
+to /sitemap.xml), follows sitemap index files and gzipped sitemaps, and
+returns every listed page with its lastmod as a Unix timestamp (None when
+the sitemap gives none or it cannot be parsed).
+"""
+import gzip
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from urllib.parse import urljoin, urlparse
+
+MAX_SITEMAPS = 1000  # Sitemap files fetched per site, index files included
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_lastmod(value):
+    """
+    W3C datetime (2024-05-01, 2024-05-01T10:00:00Z, ...) as a Unix
+    timestamp, or None.
+    """
+
+    if not value:
+        return None
+    value = value.strip()
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def parse_sitemap(content):
+    """
+    Parse a sitemap or sitemap index (optionally gzipped). Returns
+    (is_index, [(loc, lastmod), ...]).
+    """
+
+    if content[:2] == b"\x1f\x8b":
+        content = gzip.decompress(content)
+    root = ET.fromstring(content)
+    entries = []
+    for node in root:
+        if _local(node.tag) not in ("url", "sitemap"):
+            continue
+        loc = lastmod = None
+        for field in node:
+            name = _local(field.tag)
+            if name == "loc" and field.text:
+                loc = field.text.strip()
+            elif name == "lastmod":
+                lastmod = parse_lastmod(field.text)
+        if loc:
+            entries.append((loc, lastmod))
+    return _local(root.tag) == "sitemapindex", entries
+
+
+def sitemap_locations(base_url, session, timeout=10):
+    """
+    Sitemap URLs advertised in the site's robots.txt, or the conventional
+    /sitemap.xml when it lists none.
+    """
+
+    parsed = urlparse(base_url)
+    origin = f"{parsed.scheme}://{parsed.netloc}/"
+    locations = []
+    try:
+        resp = session.get(urljoin(origin, "robots.txt"), timeout=timeout)
+        if resp.status_code == 200:
+            for line in resp.text.splitlines():
+                key, _, value = line.partition(":")
+                if key.strip().lower() == "sitemap" and value.strip():
+                    locations.append(urljoin(origin, value.strip()))
+    except Exception as e:
+        print(f"[sitemap] Could not read robots.txt for {origin}: {e}")
+    return locations or [urljoin(origin, "sitemap.xml")]
+
+
+def discover(base_url, session, timeout=10, max_sitemaps=MAX_SITEMAPS):
+    """
+    Every page listed in the sitemaps of base_url's site, as {loc: lastmod}.
+    Pages listed more than once keep their latest lastmod. Sitemaps that
+    fail to download or parse are skipped.
+    """
+
+    pages = {}
+    queue = sitemap_locations(base_url, session, timeout)
+    seen = set()
+    while queue and len(seen) < max_sitemaps:
+        location = queue.pop()
+        if location in seen:
+            continue
+        seen.add(location)
+        try:
+            resp = session.get(location, timeout=timeout)
+            resp.raise_for_status()
+            is_index, entries = parse_sitemap(resp.content)
+        except Exception as e:
+            print(f"[sitemap] Skipping {location}: {e}")
+            continue
+        if is_index:
+            queue.extend(loc for loc, _ in entries)
+            continue
+        for loc, lastmod in entries:
+            if loc not in pages or (lastmod or 0) > (pages[loc] or 0):
+                pages[loc] = lastmod
+    print(f"[sitemap] {len(pages)} pages listed in {len(seen)} sitemaps for {base_url}")
+    return pages
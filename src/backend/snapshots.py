@@ -0,0 +1,396 @@
+"""
+Versioned Chroma database snapshots.
+
+A manifest (JSON, local path or URL) describes one published snapshot:
+
+    {"version": "2026-10-01", "url": "https://example.com/chroma_db-2026-10-01.zip",
+     "sha256": "<hex digest of the zip>", "size": 123456789, "file": "chroma_db-2026-10-01.zip"}
+
+The zip is streamed to SNAPSHOT_ROOT/downloads with resume support (HTTP
+Range requests, or a copy from a local mirror), verified against the
+manifest checksum and extracted into SNAPSHOT_ROOT/versions/<version>.
+SNAPSHOT_ROOT/CURRENT names the active version together with the versions
+that were active before it, and is replaced atomically. Old versions are
+kept for rollback up to SNAPSHOT_RETENTION.
+
+From src/:
+    python -m backend.snapshots install [--manifest URL_OR_PATH] [--mirror DIR_OR_URL] [--no-activate]
+    python -m backend.snapshots list
+    python -m backend.snapshots activate VERSION
+    python -m backend.snapshots rollback
+    python -m backend.snapshots prune
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+import zipfile
+from urllib.parse import urlparse
+from backend.config import (
+    CHROMA_DB_PATH,
+    CHROMA_DB_ZIP_URL,
+    SNAPSHOT_MANIFEST,
+    SNAPSHOT_MIRROR,
+    SNAPSHOT_RETENTION,
+    SNAPSHOT_ROOT,
+)
+
+CHUNK_SIZE = 1 << 20
+LEGACY_VERSION = "legacy"
+
+
+class SnapshotError(Exception):
+    pass
+
+
+# --- Layout ---
+
+def versions_dir():
+    return os.path.join(SNAPSHOT_ROOT, "versions")
+
+
+def version_dir(version):
+    return os.path.join(versions_dir(), version)
+
+
+def _current_path():
+    return os.path.join(SNAPSHOT_ROOT, "CURRENT")
+
+
+def read_current():
+    """
+    {"version": ..., "history": [previously active versions, newest first]} or None.
+    """
+
+    try:
+        with open(_current_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def active_version():
+    current = read_current()
+    return current["version"] if current else None
+
+
+def db_path(version):
+    """
+    Chroma directory inside an installed version.
+    """
+
+    with open(os.path.join(version_dir(version), "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    return os.path.join(version_dir(version), manifest.get("db_subdir", ""))
+
+
+def active_db_path():
+    """
+    Chroma directory of the active snapshot, or CHROMA_DB_PATH when no
+    versioned snapshot has been installed yet.
+    """
+
+    version = active_version()
+    return db_path(version) if version else CHROMA_DB_PATH
+
+
+def installed_versions():
+    """
+    Installed versions, most recently installed first.
+    """
+
+    if not os.path.isdir(versions_dir()):
+        return []
+    versions = [
+        name for name in os.listdir(versions_dir())
+        if os.path.exists(os.path.join(version_dir(name), "manifest.json"))
+    ]
+    return sorted(versions, key=lambda v: os.path.getmtime(os.path.join(version_dir(v), "manifest.json")),
+                  reverse=True)
+
+
+# --- Manifest ---
+
+def load_manifest(source=SNAPSHOT_MANIFEST):
+    """
+    Read a manifest from a URL or file. Without one, describe the original
+    Google Drive zip (no checksum available).
+    """
+
+    if not source:
+        return {"version": LEGACY_VERSION, "url": CHROMA_DB_ZIP_URL, "sha256": None, "file": "chroma_db.zip"}
+    if urlparse(source).scheme in ("http", "https"):
+        import requests
+        response = requests.get(source, timeout=30)
+        response.raise_for_status()
+        manifest = response.json()
+    else:
+        with open(source, encoding="utf-8") as f:
+            manifest = json.load(f)
+    if not manifest.get("version") or not manifest.get("url"):
+        raise SnapshotError(f"Manifest {source} needs 'version' and 'url'")
+    return manifest
+
+
+def snapshot_file_name(manifest):
+    return manifest.get("file") or f"chroma_db-{manifest['version']}.zip"
+
+
+def resolve_source(manifest, mirror=SNAPSHOT_MIRROR):
+    """
+    Where to fetch the zip from: the mirror (local directory or base URL)
+    when one is configured, otherwise the manifest URL.
+    """
+
+    if not mirror:
+        return manifest["url"]
+    name = snapshot_file_name(manifest)
+    if urlparse(mirror).scheme in ("http", "https"):
+        return f"{mirror.rstrip('/')}/{name}"
+    return os.path.join(mirror[len("file://"):] if mirror.startswith("file://") else mirror, name)
+
+
+# --- Download ---
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _copy_local(source, part_path):
+    """
+    Resume copying a mirrored file from where the partial copy stopped.
+    """
+
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    with open(source, "rb") as src, open(part_path, "ab") as dst:
+        src.seek(offset)
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+
+def _download_http(url, part_path):
+    """
+    Stream url to part_path, resuming with a Range request when a partial
+    download exists. Servers that ignore Range restart the file.
+    """
+
+    import requests
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    with requests.get(url, headers=headers, stream=True, timeout=(10, 60)) as response:
+        if response.status_code == 416:
+            return
+        response.raise_for_status()
+        mode = "ab" if offset and response.status_code == 206 else "wb"
+        with open(part_path, mode) as f:
+            for block in response.iter_content(CHUNK_SIZE):
+                f.write(block)
+
+
+def download(manifest, mirror=SNAPSHOT_MIRROR, retries=3):
+    """
+    Fetch and verify the snapshot zip, resuming partial downloads.
+    Returns the path of the verified zip.
+    """
+
+    downloads = os.path.join(SNAPSHOT_ROOT, "downloads")
+    os.makedirs(downloads, exist_ok=True)
+    zip_path = os.path.join(downloads, snapshot_file_name(manifest))
+    part_path = zip_path + ".part"
+    if os.path.exists(zip_path):
+        return zip_path
+
+    source = resolve_source(manifest, mirror)
+    for attempt in range(1, retries + 1):
+        try:
+            if urlparse(source).netloc == "drive.google.com":
+                # Drive needs gdown for its confirmation page; gdown resumes .part files itself
+                import gdown
+                gdown.download(source, part_path, quiet=True, resume=True)
+            elif urlparse(source).scheme in ("http", "https"):
+                _download_http(source, part_path)
+            else:
+                _copy_local(source, part_path)
+            break
+        except Exception as e:
+            print(f"[snapshots] Download attempt {attempt}/{retries} failed: {e}")
+            if attempt == retries:
+                raise
+            time.sleep(2 ** attempt)
+
+    expected_size = manifest.get("size")
+    actual_size = os.path.getsize(part_path)
+    if expected_size and actual_size != expected_size:
+        # A corrupt .part would otherwise be resumed, and fail, on every run
+        os.remove(part_path)
+        raise SnapshotError(f"Size mismatch: got {actual_size} bytes, expected {expected_size}")
+    expected_sha = manifest.get("sha256")
+    if expected_sha:
+        actual = sha256_file(part_path)
+        if actual != expected_sha:
+            os.remove(part_path)
+            raise SnapshotError(f"Checksum mismatch for {manifest['version']}: {actual} != {expected_sha}")
+    os.replace(part_path, zip_path)
+    return zip_path
+
+
+# --- Install ---
+
+def _find_db_root(root):
+    """
+    Directory holding chroma.sqlite3, relative to root.
+    """
+
+    for dirpath, _, filenames in os.walk(root):
+        if "chroma.sqlite3" in filenames:
+            return os.path.relpath(dirpath, root)
+    raise SnapshotError("Snapshot contains no chroma.sqlite3")
+
+
+def extract(zip_path, manifest):
+    """
+    Extract into a temporary directory and rename it to the version
+    directory, so a half-extracted snapshot is never visible.
+    """
+
+    target = version_dir(manifest["version"])
+    tmp = f"{target}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    with zipfile.ZipFile(zip_path) as zf:
+        root = os.path.realpath(tmp)
+        for member in zf.infolist():
+            path = os.path.realpath(os.path.join(tmp, member.filename))
+            if os.path.commonpath([root, path]) != root:
+                raise SnapshotError(f"Unsafe path in snapshot: {member.filename}")
+            zf.extract(member, tmp)
+    installed = dict(manifest, db_subdir=_find_db_root(tmp), installed=time.time())
+    with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(installed, f, indent=2)
+    os.replace(tmp, target)
+    return target
+
+
+def install(manifest, mirror=SNAPSHOT_MIRROR, keep_zip=False):
+    """
+    Download, verify and extract a snapshot version if it is not installed yet.
+    """
+
+    version = manifest["version"]
+    if version in installed_versions():
+        return version_dir(version)
+    os.makedirs(versions_dir(), exist_ok=True)
+    print(f"[snapshots] Installing {version}")
+    zip_path = download(manifest, mirror)
+    target = extract(zip_path, manifest)
+    if not keep_zip:
+        os.remove(zip_path)
+    return target
+
+
+def activate(version, rollback=False):
+    """
+    Point CURRENT at an installed version (atomic rename). The previously
+    active version is remembered for rollback unless this is a rollback.
+    Running processes pick the change up through the snapshot watcher.
+    """
+
+    if version not in installed_versions():
+        raise SnapshotError(f"Version {version} is not installed")
+    current = read_current() or {"version": None, "history": []}
+    previous = current["history"] if rollback else [current["version"]] + current["history"]
+    history = [v for v in previous if v and v != version]
+    tmp = _current_path() + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "history": history, "activated": time.time()}, f)
+    os.replace(tmp, _current_path())
+
+
+def rollback_target():
+    """
+    The most recent previously active version that is still installed.
+    """
+
+    current = read_current()
+    installed = set(installed_versions())
+    for version in (current or {}).get("history", []):
+        if version in installed:
+            return version
+    raise SnapshotError("No earlier version to roll back to")
+
+
+def prune(retention=SNAPSHOT_RETENTION):
+    """
+    Delete installed versions beyond the newest `retention`, never the
+    active version or the one rollback would return to.
+    """
+
+    protected = {active_version()}
+    try:
+        protected.add(rollback_target())
+    except SnapshotError:
+        pass
+    removed = []
+    for version in installed_versions()[retention:]:
+        if version not in protected:
+            shutil.rmtree(version_dir(version), ignore_errors=True)
+            removed.append(version)
+    return removed
+
+
+def ensure_snapshot(manifest_source=SNAPSHOT_MANIFEST, mirror=SNAPSHOT_MIRROR):
+    """
+    Make sure a database is available: keep using the active snapshot or a
+    pre-existing CHROMA_DB_PATH, otherwise install and activate the
+    manifest's version.
+    """
+
+    if active_version() or os.path.exists(CHROMA_DB_PATH):
+        return active_db_path()
+    manifest = load_manifest(manifest_source)
+    install(manifest, mirror)
+    activate(manifest["version"])
+    return active_db_path()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage versioned Chroma snapshots.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    install_parser = sub.add_parser("install", help="Download, verify and extract a snapshot")
+    install_parser.add_argument("--manifest", default=SNAPSHOT_MANIFEST)
+    install_parser.add_argument("--mirror", default=SNAPSHOT_MIRROR)
+    install_parser.add_argument("--no-activate", action="store_true")
+    sub.add_parser("list", help="Show installed versions")
+    activate_parser = sub.add_parser("activate", help="Make an installed version active")
+    activate_parser.add_argument("version")
+    sub.add_parser("rollback", help="Re-activate the previously active version")
+    sub.add_parser("prune", help="Delete versions beyond the retention limit")
+    args = parser.parse_args()
+
+    if args.command == "install":
+        manifest = load_manifest(args.manifest)
+        print(install(manifest, args.mirror))
+        if not args.no_activate:
+            activate(manifest["version"])
+            print(f"Activated {manifest['version']}")
+    elif args.command == "list":
+        active = active_version()
+        for version in installed_versions():
+            print(f"{'*' if version == active else ' '} {version}")
+    elif args.command == "activate":
+        activate(args.version)
+    elif args.command == "rollback":
+        version = rollback_target()
+        activate(version, rollback=True)
+        print(f"Rolled back to {version}")
+    elif args.command == "prune":
+        print(f"Removed: {prune() or 'nothing'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Process startup: heavy imports, model loading and warm-up run on a
+background thread at boot, so the UI can render immediately and report
+readiness while they finish. Each step is timed.
+
+Startup-time breakdown from src/:  python -m backend.startup [--warm-up]
+"""
+import argparse
+import importlib
+import importlib.util
+import json
+import sys
+import threading
+import time
+
+HEAVY_MODULES = ("torch", "sentence_transformers", "chromadb", "google.genai")
+
+
+class StartupStatus:
+    """
+    Progress of the background loader: current stage, per-step timings,
+    readiness and the error that stopped it, if any.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.stage = "pending"
+        self.ready = False
+        self.error = None
+        self.timings = {}
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "stage": self.stage,
+                "ready": self.ready,
+                "error": self.error,
+                "elapsed_s": round(self.elapsed(), 3),
+                "timings_s": dict(self.timings),
+            }
+
+
+def _installed(name):
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def load_steps():
+    """
+    (name, fn) pairs in load order: the database snapshot (downloaded on
+    first run), then the installed heavy modules, so their import cost is
+    kept separate from the model and collection loading.
+    """
+
+    from backend import registry, snapshots
+    steps = [("snapshot", snapshots.ensure_snapshot)] + [
+        (f"import {name}", lambda name=name: importlib.import_module(name))
+        for name in HEAVY_MODULES if _installed(name)
+    ]
+    return steps + [
+        ("encoder", registry.get_encoder),
+        ("cross_encoder", registry.get_cross_encoder),
+        ("collection", registry.get_collection),
+        ("llm", registry.get_llm),
+        ("chatbot", registry.get_chatbot),
+    ]
+
+
+def _run_step(status, name, fn):
+    with status.lock:
+        status.stage = name
+    start = time.perf_counter()
+    result = fn()
+    with status.lock:
+        status.timings[name] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run(status, warm_up=False):
+    """
+    Run every load step, mark the status ready once the chatbot exists,
+    then optionally warm it up.
+    """
+
+    try:
+        chatbot = None
+        for name, fn in load_steps():
+            chatbot = _run_step(status, name, fn)
+        with status.lock:
+            status.ready = True
+        if warm_up:
+            _run_step(status, "warm_up", chatbot.warm_up)
+        with status.lock:
+            status.stage = "done"
+    except Exception as e:
+        with status.lock:
+            status.stage = "failed"
+            status.error = f"{type(e).__name__}: {e}"
+        print(f"[startup] Loading failed: {e}")
+    return status
+
+
+def start(warm_up=False):
+    """
+    Start the loader thread and return its StartupStatus.
+    """
+
+    status = StartupStatus()
+    threading.Thread(target=run, args=(status, warm_up), name="startup-loader", daemon=True).start()
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report a startup-time breakdown.")
+    parser.add_argument("--warm-up", action="store_true", help="Include warming up the suggestion questions")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    importlib.import_module("backend.chatbot")
+    import_s = time.perf_counter() - start_time
+    heavy_at_import = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    status = run(StartupStatus(), warm_up=args.warm_up)
+    report = status.snapshot()
+    report["import_backend_chatbot_s"] = round(import_s, 3)
+    report["heavy_modules_loaded_by_import"] = heavy_at_import
+    report["total_s"] = round(time.perf_counter() - start_time, 3)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Offline stand-in for google.genai.Client.
+
+Implements the subset of the client the Chatbot uses
+(models.generate_content and models.generate_content_stream) with
+configurable latency, streaming speed and injected failures, so the
+pipeline can be exercised and benchmarked without a Gemini key.
+"""
+import random
+import threading
+import time
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubError(Exception):
+    def __init__(self, status_code, message="Injected failure"):
+        super().__init__(f"{status_code} {message}")
+        self.status_code = status_code
+
+
+class StubModels:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def generate_content(self, model, contents, **kwargs):
+        owner = self.owner
+        owner._record_call(contents)
+        time.sleep(owner._latency())
+        owner._maybe_fail()
+        return StubResponse(owner._answer(contents))
+
+    def generate_content_stream(self, model, contents, **kwargs):
+        owner = self.owner
+        owner._record_call(contents)
+        time.sleep(owner._latency())
+        owner._maybe_fail()
+        words = owner._answer(contents).split(" ")
+        for i in range(0, len(words), owner.words_per_chunk):
+            if i:
+                time.sleep(owner.chunk_interval)
+            piece = " ".join(words[i:i + owner.words_per_chunk])
+            yield StubResponse(piece if i == 0 else " " + piece)
+
+
+class StubGenaiClient:
+    """
+    Fake genai.Client. latency is the time to first token in seconds
+    (plus up to jitter extra), tail_rate the share of calls that take
+    tail_latency longer, failure_rate the share of calls raising a
+    StubError with failure_status. answer may be a string or a callable
+    receiving the prompt. Attributes may be changed while calls are running,
+    e.g. to simulate an outage.
+    """
+
+    def __init__(self, latency=0.5, jitter=0.0, chunk_interval=0.02, words_per_chunk=4,
+                 failure_rate=0.0, failure_status=503, answer=None, seed=None, tail_rate=0.0, tail_latency=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_interval = chunk_interval
+        self.words_per_chunk = words_per_chunk
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.answer = answer
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.prompt_chars = 0
+        self.models = StubModels(self)
+
+    def _record_call(self, contents):
+        with self.lock:
+            self.calls += 1
+            self.prompt_chars += len(contents)
+
+    def _latency(self):
+        with self.lock:
+            latency = self.latency + self.random.uniform(0, self.jitter)
+            if self.random.random() < self.tail_rate:
+                latency += self.tail_latency
+            return latency
+
+    def _maybe_fail(self):
+        with self.lock:
+            fail = self.random.random() < self.failure_rate
+        if fail:
+            raise StubError(self.failure_status)
+
+    def _answer(self, contents):
+        if callable(self.answer):
+            return self.answer(contents)
+        if self.answer is not None:
+            return self.answer
+        return ("Based on the GitLab Handbook, this is a synthesized stub answer "
+                "that stands in for Gemini output during offline runs.")
@@ -0,0 +1,401 @@
+"""
+Per-request tracing and metrics for the Chatbot pipeline.
+
+A Trace collects timed spans (embed, retrieve, rerank, llm, ...) with
+attributes such as candidate counts, prompt size, cache hits and error
+class. When a trace finishes it is passed to every registered hook; the
+default hook feeds Prometheus-style histograms, counters and gauges that
+can be exported over HTTP or written to a file.
+"""
+import bisect
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+_current_trace = contextvars.ContextVar("chatbot_trace", default=None)
+_hooks = []
+_recent = deque(maxlen=500)
+_recent_lock = threading.Lock()
+
+
+# --- Metrics ---
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=None):
+    items = list(key) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1.0, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[_label_key(labels)] = float(value)
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            counts, total = self.series.get(key, ([0] * (len(self.buckets) + 1), [0.0, 0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+            total[1] += 1
+            self.series[key] = (counts, total)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total) in sorted(self.series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, {'le': bound})} {cumulative}")
+                cumulative += counts[-1]
+                lines.append(f"{self.name}_bucket{_format_labels(key, {'le': '+Inf'})} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total[0]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {total[1]}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("chatbot_stage_seconds", "Duration of each pipeline stage.")
+REQUEST_SECONDS = Histogram("chatbot_request_seconds", "End-to-end request duration.")
+PROMPT_CHARS = Histogram("chatbot_prompt_chars", "LLM prompt size in characters.", SIZE_BUCKETS)
+PROMPT_TOKENS = Histogram("chatbot_prompt_tokens", "LLM prompt size in tokens.", SIZE_BUCKETS)
+REQUESTS = Counter("chatbot_requests_total", "Requests by outcome.")
+ERRORS = Counter("chatbot_errors_total", "Errors by stage and error class.")
+CACHE_EVENTS = Counter("chatbot_cache_events_total", "Cache hits and misses by cache.")
+CANDIDATES = Gauge("chatbot_candidates", "Candidates handled by the last request, per stage.")
+INFLIGHT = Gauge("chatbot_inflight_requests", "Requests currently being processed.")
+LLM_ATTEMPTS = Counter("chatbot_llm_attempts_total", "LLM calls by kind (primary, retry, hedge).")
+LLM_FALLBACKS = Counter("chatbot_llm_fallbacks_total", "Answers served without the LLM, by reason and kind.")
+METRICS = [STAGE_SECONDS, REQUEST_SECONDS, PROMPT_CHARS, PROMPT_TOKENS, REQUESTS, ERRORS, CACHE_EVENTS,
+           CANDIDATES, INFLIGHT, LLM_ATTEMPTS, LLM_FALLBACKS]
+_inflight = [0]
+_inflight_lock = threading.Lock()
+
+
+def render_prometheus():
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Tracing ---
+
+class Span:
+    __slots__ = ("name", "start", "duration", "attrs")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.start = time.perf_counter()
+        self.duration = None
+        self.attrs = dict(attrs)
+
+
+class Trace:
+    """
+    Spans of one request. Spans live on the trace itself rather than in
+    context variables, so a trace can be carried across generator yields.
+    """
+
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = dict(attrs)
+        self.spans = []
+        self.stack = []
+        self.start = time.perf_counter()
+        self.duration = None
+        self.finished = False
+        with _inflight_lock:
+            _inflight[0] += 1
+            INFLIGHT.set(_inflight[0])
+
+    @contextmanager
+    def span(self, name, **attrs):
+        span = Span(name, attrs)
+        self.stack.append(span)
+        try:
+            yield span
+        except Exception as e:
+            span.attrs.setdefault("error", type(e).__name__)
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.start
+            self.stack.remove(span)
+            self.spans.append(span)
+
+    def annotate(self, **attrs):
+        """
+        Set attributes on the innermost open span, or on the trace itself.
+        """
+
+        target = self.stack[-1].attrs if self.stack else self.attrs
+        target.update(attrs)
+
+    def finish(self, **attrs):
+        if self.finished:
+            return
+        self.finished = True
+        self.attrs.update(attrs)
+        self.duration = time.perf_counter() - self.start
+        with _inflight_lock:
+            _inflight[0] -= 1
+            INFLIGHT.set(_inflight[0])
+        for hook in list(_hooks):
+            try:
+                hook(self)
+            except Exception as e:
+                print(f"[telemetry] Hook failed: {e}")
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "attrs": self.attrs,
+            "spans": [
+                {"name": s.name, "duration_ms": round((s.duration or 0.0) * 1000, 3), "attrs": s.attrs}
+                for s in self.spans
+            ],
+        }
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def use_trace(trace):
+    """
+    Make trace the current trace for a synchronous block (no yields inside).
+    """
+
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def trace(name, **attrs):
+    """
+    Trace a synchronous request; finished (and passed to hooks) on exit.
+    """
+
+    tr = Trace(name, **attrs)
+    try:
+        with use_trace(tr):
+            yield tr
+    except Exception as e:
+        tr.attrs.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        tr.finish()
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Span on the current trace. Without a trace the stage is still timed and
+    recorded in the stage histogram.
+    """
+
+    tr = current_trace()
+    if tr is not None:
+        with tr.span(name, **attrs) as s:
+            yield s
+        return
+    s = Span(name, attrs)
+    try:
+        yield s
+    finally:
+        s.duration = time.perf_counter() - s.start
+        STAGE_SECONDS.observe(s.duration, stage=name)
+
+
+def annotate(**attrs):
+    tr = current_trace()
+    if tr is not None:
+        tr.annotate(**attrs)
+
+
+def add_hook(hook):
+    """
+    Register hook(trace), called for every finished trace.
+    """
+
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+
+def remove_hook(hook):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+# --- Default hooks ---
+
+def record_metrics(tr):
+    """
+    Feed the Prometheus metrics from a finished trace.
+    """
+
+    REQUEST_SECONDS.observe(tr.duration, request=tr.name)
+    REQUESTS.inc(outcome=tr.attrs.get("outcome", "error" if "error" in tr.attrs else "ok"))
+    for s in tr.spans:
+        STAGE_SECONDS.observe(s.duration, stage=s.name)
+        attrs = s.attrs
+        if "error" in attrs:
+            ERRORS.inc(stage=s.name, error_type=attrs["error"])
+        if "candidates" in attrs:
+            CANDIDATES.set(attrs["candidates"], stage=s.name)
+        if "prompt_chars" in attrs:
+            PROMPT_CHARS.observe(attrs["prompt_chars"])
+        if "prompt_tokens" in attrs:
+            PROMPT_TOKENS.observe(attrs["prompt_tokens"])
+        for cache, hit in attrs.get("cache", {}).items():
+            CACHE_EVENTS.inc(cache=cache, event="hit" if hit else "miss")
+        for kind, n in attrs.get("llm_attempts", {}).items():
+            if n:
+                LLM_ATTEMPTS.inc(n, kind=kind)
+        if "fallback" in attrs:
+            LLM_FALLBACKS.inc(reason=attrs["fallback"], kind=attrs.get("fallback_kind", "extractive"))
+
+
+def record_recent(tr):
+    with _recent_lock:
+        _recent.append(tr.to_dict())
+
+
+def recent_traces(limit=50):
+    with _recent_lock:
+        return list(_recent)[-limit:]
+
+
+def stage_latency_summary():
+    """
+    p50/p95/max per stage (and for whole requests) over the recent traces, in ms.
+    """
+
+    samples = {}
+    for tr in recent_traces(limit=_recent.maxlen):
+        samples.setdefault("request", []).append(tr["duration_ms"])
+        for s in tr["spans"]:
+            samples.setdefault(s["name"], []).append(s["duration_ms"])
+    rows = []
+    for stage, values in samples.items():
+        values.sort()
+        rows.append({
+            "stage": stage,
+            "count": len(values),
+            "p50_ms": values[len(values) // 2],
+            "p95_ms": values[min(len(values) - 1, int(0.95 * len(values)))],
+            "max_ms": values[-1],
+        })
+    return rows
+
+
+add_hook(record_metrics)
+add_hook(record_recent)
+
+
+# --- Exporters ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_exporter(port, host="0.0.0.0"):
+    """
+    Serve /metrics on a background thread.
+    """
+
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def start_file_exporter(path, interval=15.0):
+    """
+    Periodically write the metrics to path (atomically replaced).
+    """
+
+    def run():
+        while True:
+            tmp = f"{path}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(render_prometheus())
+                os.replace(tmp, path)
+            except OSError as e:
+                print(f"[telemetry] Could not write {path}: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="metrics-file", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,311 @@
+"""
+In-process vector index over memory-mapped NumPy arrays, a drop-in
+alternative to the Chroma collection for retrieval.
+
+Embeddings are stored quantized, either int8 (per-dimension scales) or
+binary (sign bits), and searched with one vectorized pass; the best
+oversample * k candidates are then re-scored exactly against the float32
+vectors. Documents and metadata live in a compact side store: two UTF-8
+blobs with row offsets. Everything is opened with mmap, so several worker
+processes share the same pages and only touched rows are read.
+
+    meta.json        count, dim, quantization
+    ids.json         row -> chunk ID
+    codes.npy        int8[n, dim] or packed uint8[n, dim / 8]
+    scales.npy       float32[dim] int8 dequantization scales
+    vectors.npy      float32[n, dim] for re-scoring
+    sq_norms.npy     float32[n] squared norms
+    docs.bin         UTF-8 documents, row i is docs[doc_offsets[i]:doc_offsets[i + 1]]
+    doc_offsets.npy  int64[n + 1]
+    metas.bin        JSON metadata per row, same layout
+    meta_offsets.npy int64[n + 1]
+
+The object mimics the parts of the Chroma collection API the Chatbot uses
+(query, get, count), so retrieve_documents works unchanged on either.
+query also takes a Chroma-style where filter on one metadata key
+({"source_prefix": "handbook_"} or {"source_prefix": {"$in": [...]}}); the
+matching rows are found once per value and only they are scanned.
+Distances are squared L2, like Chroma's default space.
+
+Build from src/:  python -m backend.vector_index --quantization int8
+"""
+import argparse
+import json
+import os
+import threading
+import numpy as np
+
+QUANTIZATIONS = ("int8", "binary")
+BLOCK_ROWS = 256  # Rows dequantized at a time; small enough to stay in cache
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def quantize_int8(vectors):
+    """
+    Symmetric per-dimension int8 quantization. Returns (codes, scales).
+    """
+
+    scales = np.abs(vectors).max(axis=0) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(vectors):
+    """
+    Sign bits packed eight dimensions per byte.
+    """
+
+    return np.packbits(vectors > 0, axis=1)
+
+
+def _write_blob(path, offsets_path, items):
+    offsets = np.zeros(len(items) + 1, dtype=np.int64)
+    with open(path, "wb") as f:
+        for i, item in enumerate(items):
+            data = item.encode("utf-8")
+            f.write(data)
+            offsets[i + 1] = offsets[i] + len(data)
+    np.save(offsets_path, offsets)
+
+
+def build_index(ids, embeddings, documents, metadatas, path, quantization="int8"):
+    """
+    Write a vector index for the given rows to path.
+    """
+
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization {quantization!r}, expected one of {QUANTIZATIONS}")
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    os.makedirs(path, exist_ok=True)
+    if quantization == "int8":
+        codes, scales = quantize_int8(vectors)
+        np.save(os.path.join(path, "scales.npy"), scales)
+    else:
+        codes = quantize_binary(vectors)
+    np.save(os.path.join(path, "codes.npy"), codes)
+    np.save(os.path.join(path, "vectors.npy"), vectors)
+    np.save(os.path.join(path, "sq_norms.npy"), np.einsum("ij,ij->i", vectors, vectors))
+    _write_blob(os.path.join(path, "docs.bin"), os.path.join(path, "doc_offsets.npy"),
+                [doc or "" for doc in documents])
+    _write_blob(os.path.join(path, "metas.bin"), os.path.join(path, "meta_offsets.npy"),
+                [json.dumps(meta or {}, separators=(",", ":")) for meta in metadatas])
+    with open(os.path.join(path, "ids.json"), "w", encoding="utf-8") as f:
+        json.dump(list(ids), f)
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"count": len(ids), "dim": int(vectors.shape[1]) if len(ids) else 0,
+                   "quantization": quantization}, f)
+
+
+def build_from_collection(collection, path, quantization="int8", page_size=1000):
+    """
+    Build the vector index from every row of a Chroma collection.
+    """
+
+    ids, embeddings, documents, metadatas = [], [], [], []
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        ids.extend(page["ids"])
+        embeddings.extend(page["embeddings"])
+        documents.extend(page["documents"])
+        metadatas.extend(page["metadatas"])
+        offset += len(page["ids"])
+    build_index(ids, embeddings, documents, metadatas, path, quantization)
+    print(f"[vector_index] Indexed {len(ids)} vectors ({quantization}) into {path}")
+    return len(ids)
+
+
+def refresh(collection, db_path):
+    """
+    Rebuild the vector index of a Chroma directory after ingestion, if one
+    was built there before, keeping its quantization.
+    """
+
+    from backend.config import VECTOR_INDEX_DIR_NAME
+    path = os.path.join(db_path, VECTOR_INDEX_DIR_NAME)
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return 0
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        quantization = json.load(f)["quantization"]
+    return build_from_collection(collection, path, quantization)
+
+
+def _open_blob(path):
+    # np.memmap cannot map an empty file
+    if not os.path.getsize(path):
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+
+class VectorIndex:
+    """
+    Lazily loaded, memory-mapped vector index with Chroma-style query/get/count.
+    """
+
+    def __init__(self, path, oversample=4):
+        self.path = path
+        self.oversample = oversample
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.value_rows = {}  # (metadata key, value) -> rows, for where filters
+
+    def _load(self):
+        with self.lock:
+            if self.loaded:
+                return
+            p = self.path
+            with open(os.path.join(p, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(os.path.join(p, "ids.json"), encoding="utf-8") as f:
+                self.ids = json.load(f)
+            self.rows = {cid: row for row, cid in enumerate(self.ids)}
+            self.quantization = meta["quantization"]
+            self.codes = np.load(os.path.join(p, "codes.npy"), mmap_mode="r")
+            if self.quantization == "int8":
+                self.scales = np.load(os.path.join(p, "scales.npy"))
+            self.vectors = np.load(os.path.join(p, "vectors.npy"), mmap_mode="r")
+            self.sq_norms = np.load(os.path.join(p, "sq_norms.npy"), mmap_mode="r")
+            self.docs = _open_blob(os.path.join(p, "docs.bin"))
+            self.doc_offsets = np.load(os.path.join(p, "doc_offsets.npy"), mmap_mode="r")
+            self.metas = _open_blob(os.path.join(p, "metas.bin"))
+            self.meta_offsets = np.load(os.path.join(p, "meta_offsets.npy"), mmap_mode="r")
+            self.loaded = True
+
+    def count(self):
+        if not self.loaded:
+            self._load()
+        return len(self.ids)
+
+    def _approx_scores(self, query, rows=None):
+        """
+        Approximate similarity to query (higher is closer) of every row, or
+        of the given rows, computed block by block to bound temporary
+        memory. For int8 this is 2 q.x - |x|^2, which ranks rows like -|q - x|^2.
+        """
+
+        n = len(self.ids) if rows is None else len(rows)
+        scores = np.empty(n, dtype=np.float32)
+        if self.quantization == "int8":
+            q = 2 * query * self.scales
+        else:
+            q_bits = quantize_binary(query[None, :])[0]
+        for start in range(0, n, BLOCK_ROWS):
+            block_rows = slice(start, start + BLOCK_ROWS) if rows is None else rows[start:start + BLOCK_ROWS]
+            if self.quantization == "int8":
+                block = np.asarray(self.codes[block_rows], dtype=np.float32)
+                scores[start:start + BLOCK_ROWS] = block @ q - self.sq_norms[block_rows]
+            else:
+                block = np.asarray(self.codes[block_rows])
+                scores[start:start + BLOCK_ROWS] = -POPCOUNT[np.bitwise_xor(block, q_bits)].sum(axis=1, dtype=np.int32)
+        return scores
+
+    def rows_where(self, where):
+        """
+        Sorted rows matching a where filter on a single metadata key, with
+        an equality or {"$in": [...]} condition.
+        """
+
+        if not self.loaded:
+            self._load()
+        (key, condition), = where.items()
+        values = condition["$in"] if isinstance(condition, dict) else [condition]
+        missing = [v for v in values if (key, v) not in self.value_rows]
+        if missing:
+            with self.lock:
+                found = {(key, v): [] for v in missing}
+                for row in range(len(self.ids)):
+                    value = self.metadata(row).get(key)
+                    if (key, value) in found:
+                        found[(key, value)].append(row)
+                for value_key, value_rows in found.items():
+                    self.value_rows[value_key] = np.asarray(value_rows, dtype=np.int64)
+        if len(values) == 1:
+            return self.value_rows[(key, values[0])]
+        return np.unique(np.concatenate([self.value_rows[(key, v)] for v in values]))
+
+    def search(self, query, k, rows=None):
+        """
+        Rows and squared L2 distances of the k nearest rows (among rows,
+        when given), nearest first.
+        """
+
+        if not self.loaded:
+            self._load()
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        n = len(self.ids) if rows is None else len(rows)
+        k = min(k, n)
+        if k == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        approx = self._approx_scores(query, rows)
+        n_candidates = min(n, k * self.oversample)
+        candidates = np.argpartition(-approx, n_candidates - 1)[:n_candidates]
+        if rows is not None:
+            candidates = rows[candidates]
+        candidates.sort()  # Sequential reads from the mmapped float vectors
+        exact = np.asarray(self.vectors[candidates]) @ query
+        distances = np.asarray(self.sq_norms[candidates]) - 2 * exact + float(query @ query)
+        order = np.argsort(distances, kind="stable")[:k]
+        return candidates[order], distances[order]
+
+    def document(self, row):
+        return bytes(self.docs[self.doc_offsets[row]:self.doc_offsets[row + 1]]).decode("utf-8")
+
+    def metadata(self, row):
+        return json.loads(bytes(self.metas[self.meta_offsets[row]:self.meta_offsets[row + 1]]).decode("utf-8"))
+
+    def _rows_result(self, rows, include):
+        result = {"ids": [self.ids[row] for row in rows]}
+        if "documents" in include:
+            result["documents"] = [self.document(row) for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [self.metadata(row) for row in rows]
+        if "embeddings" in include:
+            result["embeddings"] = [np.asarray(self.vectors[row]) for row in rows]
+        return result
+
+    def query(self, query_embeddings, n_results=10, include=("documents", "metadatas", "distances"), where=None):
+        """
+        Chroma-style nearest neighbour query: one result list per query embedding.
+        """
+
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        allowed = self.rows_where(where) if where else None
+        for query in np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)):
+            rows, distances = self.search(query, n_results, allowed)
+            one = self._rows_result(rows, include)
+            for key in ("ids", "documents", "metadatas"):
+                results[key].append(one.get(key, []))
+            results["distances"].append([float(d) for d in distances])
+        return results
+
+    def get(self, ids=None, include=("documents", "metadatas"), limit=None, offset=0):
+        """
+        Chroma-style fetch by ID (unknown IDs are skipped) or by page.
+        """
+
+        if not self.loaded:
+            self._load()
+        if ids is not None:
+            rows = [self.rows[cid] for cid in ids if cid in self.rows]
+        else:
+            end = len(self.ids) if limit is None else min(len(self.ids), offset + limit)
+            rows = list(range(offset, end))
+        return self._rows_result(rows, include)
+
+
+def main():
+    from backend.config import COLLECTION_NAME, VECTOR_INDEX_DIR_NAME, VECTOR_QUANTIZATION
+    from backend.registry import get_chroma_client
+    from backend.snapshots import active_db_path
+    parser = argparse.ArgumentParser(description="Build the memory-mapped vector index from the Chroma collection.")
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default=VECTOR_QUANTIZATION)
+    args = parser.parse_args()
+    collection = get_chroma_client().get_collection(COLLECTION_NAME)
+    build_from_collection(collection, os.path.join(active_db_path(), VECTOR_INDEX_DIR_NAME), args.quantization)
+
+
+if __name__ == "__main__":
+    main()
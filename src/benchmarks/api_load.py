@@ -0,0 +1,131 @@
+"""
+Load test for the HTTP API (api.py).
+
+Sends --requests questions from --concurrency concurrent clients and reports
+throughput, latency percentiles, time to first streamed event, and status
+counts (503s show admission control kicking in). Point it at a running
+server with --url, or pass --spawn to start one in-process on the real
+collection with the stub LLM in place of Gemini.
+
+Run from src/:  python -m benchmarks.api_load --spawn --requests 200 --concurrency 32 --stream
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+import aiohttp
+from aiohttp import web
+from backend.config import FOLLOWUP_QUESTIONS
+from benchmarks.common import emit, peak_rss_mb, percentiles
+
+
+async def spawn_server(port, llm_latency, inference_workers, llm_workers, max_queue):
+    from api import create_app
+    from backend.chatbot import Chatbot
+    from backend.stub_llm import StubGenaiClient
+
+    chatbot = Chatbot(genai_client=StubGenaiClient(latency=llm_latency, jitter=llm_latency / 2, seed=0))
+    chatbot.answer_cache = None
+    app = create_app(chatbot, inference_workers, llm_workers, max_queue)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def one_request(session, url, query, stream):
+    """
+    Returns (status, latency_ms, first_event_ms).
+    """
+
+    start = time.perf_counter()
+    first = None
+    path = "/v1/answer/stream" if stream else "/v1/answer"
+    async with session.post(url + path, json={"query": query}) as resp:
+        if resp.status == 200 and stream:
+            async for _ in resp.content:
+                if first is None:
+                    first = (time.perf_counter() - start) * 1000
+        else:
+            await resp.read()
+        return resp.status, (time.perf_counter() - start) * 1000, first
+
+
+async def run_load(url, n_requests, concurrency, stream, unique):
+    queries = [
+        FOLLOWUP_QUESTIONS[i % len(FOLLOWUP_QUESTIONS)] + (f" #{i}" if unique else "")
+        for i in range(n_requests)
+    ]
+    results = []
+    pending = iter(queries)
+
+    async def client(session):
+        for query in pending:
+            try:
+                results.append(await one_request(session, url, query, stream))
+            except aiohttp.ClientError as e:
+                results.append((type(e).__name__, None, None))
+
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+
+    ok = [r for r in results if r[0] == 200]
+    report = {
+        "requests": len(results),
+        "concurrency": concurrency,
+        "stream": stream,
+        "wall_s": round(wall, 3),
+        "ok_per_s": round(len(ok) / wall, 3) if wall else 0.0,
+        "status": dict(Counter(str(r[0]) for r in results)),
+        "latency_ms": {k: round(v, 2) for k, v in percentiles([r[1] for r in ok]).items()},
+    }
+    if stream:
+        firsts = [r[2] for r in ok if r[2] is not None]
+        report["first_event_ms"] = {k: round(v, 2) for k, v in percentiles(firsts).items()}
+    return report
+
+
+async def main_async(args):
+    runner = None
+    url = args.url
+    if args.spawn:
+        runner = await spawn_server(args.port, args.llm_latency, args.inference_workers, args.llm_workers,
+                                    args.max_queue)
+        url = f"http://127.0.0.1:{args.port}"
+    try:
+        report = await run_load(url.rstrip("/"), args.requests, args.concurrency, args.stream, args.unique)
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url.rstrip("/") + "/healthz") as resp:
+                report["server"] = await resp.json()
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+    report["config"] = vars(args)
+    if args.spawn:
+        report["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--spawn", action="store_true", help="Start an in-process server with the stub LLM")
+    parser.add_argument("--port", type=int, default=8099, help="Port of the spawned server")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--stream", action="store_true", help="Use the streaming endpoint")
+    parser.add_argument("--unique", action="store_true", help="Make every query distinct so caches miss")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Stub LLM latency in seconds")
+    parser.add_argument("--inference-workers", type=int, default=2)
+    parser.add_argument("--llm-workers", type=int, default=32)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    emit(asyncio.run(main_async(args)), args.output)
+
+
+if __name__ == "__main__":
+    main()
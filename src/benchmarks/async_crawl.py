@@ -0,0 +1,121 @@
+"""
+Parity and throughput of the async crawler against the BFS of crawl_and_embed.
+
+Serves the generated handbook-like site of benchmarks.sitemap_crawl from a
+local HTTP server that answers every request after --latency seconds. The
+pages get extra links that exercise the crawl rules: shortcuts to pages at
+other depths, fragments, query strings, external and out-of-prefix links,
+and links to missing pages (404). It compares:
+
+  * sync: the link-only BFS of crawl_and_embed, one request at a time
+    (without its 0.5 s politeness delay)
+  * async_c<n>: backend.data_ingestion.async_crawl with n connections and
+    the per-host token bucket at --rate requests per second
+
+For each it reports pages fetched, seconds and pages per second. For the
+async crawls it also reports whether the (url, depth) pairs visited are
+exactly those of the sync BFS, and the pairs seen by only one of them. No
+models or collection are loaded.
+
+Run from src/:  python -m benchmarks.async_crawl --sections 6 --latency 0.02 --concurrency 1 4 8 16
+"""
+import argparse
+import asyncio
+import random
+import time
+import requests
+from backend.data_ingestion import MAX_DEPTH, async_crawl, is_allowed_url
+from benchmarks.common import emit
+from benchmarks.sitemap_crawl import bfs_crawl, generated_site, serve
+
+
+def with_edge_links(site, share, seed=0):
+    """
+    path -> html with extra links added to a share of the pages.
+    """
+
+    rng = random.Random(seed)
+    paths = sorted(site)
+    pages = {}
+    for i, path in enumerate(paths):
+        html = site[path][0]
+        if rng.random() < share:
+            extra = [
+                rng.choice(paths),
+                f"{path}#details",
+                f"{path}?page=2",
+                "https://example.com/handbook/",
+                "/about/",
+                f"/handbook/missing-{i}/",
+                rng.choice(paths).rstrip("/"),
+            ]
+            links = "".join(f'<a href="{href}">{href}</a>' for href in extra)
+            html = html.replace("</main>", links + "</main>").replace("</nav>", links + "</nav>")
+        pages[path] = html
+    return pages
+
+
+def run_sync(start_url, url_filter, max_depth):
+    session = requests.Session()
+    start = time.perf_counter()
+    visits = [(url, depth) for url, depth, _ in bfs_crawl(start_url, url_filter, session, max_depth)]
+    return visits, time.perf_counter() - start
+
+
+def run_async(start_url, url_filter, max_depth, concurrency, rate):
+    async def crawl():
+        return [(url, depth) async for url, depth, _ in async_crawl(start_url, url_filter, max_depth,
+                                                                    concurrency, rate)]
+
+    start = time.perf_counter()
+    visits = asyncio.run(crawl())
+    return visits, time.perf_counter() - start
+
+
+def summary(visits, elapsed):
+    return {
+        "pages": len(visits),
+        "seconds": round(elapsed, 3),
+        "pages_per_s": round(len(visits) / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sections", type=int, default=6)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--site-depth", type=int, default=6, help="Link depth of the deepest content pages")
+    parser.add_argument("--max-depth", type=int, default=MAX_DEPTH, help="Link hops followed by the crawls")
+    parser.add_argument("--edge-share", type=float, default=0.3, help="Share of pages given the extra links")
+    parser.add_argument("--latency", type=float, default=0.02, help="Server delay per request in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--rate", type=float, default=1000.0, help="Async requests per second per host")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    site = generated_site(args.sections, args.fanout, args.site_depth, recent_share=0.0)
+    pages = with_edge_links(site, args.edge_share)
+    server, host = serve({path: html.encode() for path, html in pages.items()}, latency=args.latency)
+    start_url = f"{host}/handbook/"
+    url_filter = lambda url: is_allowed_url(url, start_url)
+    report = {"config": vars(args), "site_pages": len(site)}
+
+    sync_visits, elapsed = run_sync(start_url, url_filter, args.max_depth)
+    report["sync"] = summary(sync_visits, elapsed)
+    expected = set(sync_visits)
+    for concurrency in args.concurrency:
+        visits, elapsed = run_async(start_url, url_filter, args.max_depth, concurrency, args.rate)
+        seen = set(visits)
+        report[f"async_c{concurrency}"] = {
+            **summary(visits, elapsed),
+            "speedup": round(report["sync"]["seconds"] / elapsed, 2) if elapsed else None,
+            "same_visits_as_sync": seen == expected and len(visits) == len(sync_visits),
+            "only_sync": sorted(expected - seen)[:10],
+            "only_async": sorted(seen - expected)[:10],
+        }
+    server.shutdown()
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
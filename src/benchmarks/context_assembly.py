@@ -0,0 +1,76 @@
+"""
+Prompt-size reduction from token-budgeted context assembly.
+
+For each question in the query set, runs embedding, retrieval and
+reranking on the handbook collection, then builds the context both ways:
+the old verbatim join of the top chunks and backend.context's merged,
+de-overlapped and budgeted assembly. No LLM is called.
+
+Run from src/:  python -m benchmarks.context_assembly --budget 1500 --top-k 3 5
+"""
+import argparse
+import time
+import numpy as np
+from backend import registry
+from backend.config import CONTEXT_TOKEN_BUDGET, FOLLOWUP_QUESTIONS, LLM_PROMPT_TEMPLATE
+from backend.context import assemble_context, estimate_tokens
+from benchmarks.common import emit, percentiles
+
+
+def prompt_sizes(chatbot, questions, top_k, budget):
+    rows = []
+    for question in questions:
+        emb = chatbot.embed_query(question)
+        docs, metas = chatbot.retrieve_documents(emb, query_text=question)
+        context_docs = chatbot.rerank_documents(question, docs, metas, top_k=top_k)
+        if not isinstance(context_docs, list) or not context_docs:
+            continue
+        raw = LLM_PROMPT_TEMPLATE.format(context="\n\n".join(doc for doc, _, _ in context_docs), question=question)
+        start = time.perf_counter()
+        context_text, used_docs, stats = assemble_context(context_docs, budget)
+        assemble_ms = (time.perf_counter() - start) * 1000
+        assembled = LLM_PROMPT_TEMPLATE.format(context=context_text, question=question)
+        rows.append({
+            "raw_tokens": estimate_tokens(raw),
+            "assembled_tokens": estimate_tokens(assembled),
+            "passages": stats["context_passages"],
+            "dropped_docs": len(context_docs) - len(used_docs),
+            "truncated": stats["context_truncated"],
+            "assemble_ms": assemble_ms,
+        })
+    return rows
+
+
+def summarize(rows):
+    if not rows:
+        return {"queries": 0}
+    raw = np.array([r["raw_tokens"] for r in rows], dtype=np.float64)
+    assembled = np.array([r["assembled_tokens"] for r in rows], dtype=np.float64)
+    return {
+        "queries": len(rows),
+        "raw_tokens_mean": round(float(raw.mean()), 1),
+        "assembled_tokens_mean": round(float(assembled.mean()), 1),
+        "reduction_pct_mean": round(float(((raw - assembled) / raw).mean() * 100), 2),
+        "total_tokens_saved": int(raw.sum() - assembled.sum()),
+        "truncated_queries": sum(r["truncated"] for r in rows),
+        "dropped_docs": sum(r["dropped_docs"] for r in rows),
+        "assemble_ms": {k: round(v, 3) for k, v in percentiles([r["assemble_ms"] for r in rows]).items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget", type=int, default=CONTEXT_TOKEN_BUDGET)
+    parser.add_argument("--top-k", type=int, nargs="+", default=[3])
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    chatbot = registry.get_chatbot()
+    report = {"config": vars(args)}
+    for top_k in args.top_k:
+        report[f"top_{top_k}"] = summarize(prompt_sizes(chatbot, FOLLOWUP_QUESTIONS, top_k, args.budget))
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
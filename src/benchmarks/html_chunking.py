@@ -0,0 +1,170 @@
+"""
+Parse and chunk time of ingestion's HTML chunker, with a parity check.
+
+Compares data_ingestion.chunk_content with the previous implementation
+(reproduced below as legacy_chunk_content, which walked
+find_next_siblings() once per heading) on the same parsed pages, for each
+available parser backend. Reports parse and chunk time percentiles over
+the largest pages, the pages where the two chunkers disagree, and the
+pages whose chunks change when switching parser. Without --html-dir, long
+generated pages with nested sections and lists are used.
+
+Run from src/:  python -m benchmarks.html_chunking --html-dir path/to/pages --largest 50
+"""
+import argparse
+import glob
+import importlib.util
+import os
+import random
+import time
+from bs4 import BeautifulSoup
+from backend.data_ingestion import chunk_content, extract_main_content
+from benchmarks.common import emit, percentiles
+
+PARSERS = ("html.parser", "lxml")
+
+
+def legacy_chunk_content(soup, url):
+    """
+    chunk_content as it was before the single-pass chunker, kept as the
+    parity reference.
+    """
+
+    main = extract_main_content(soup)
+    chunks = []
+
+    intro_parts = []
+    for el in main.children:
+        if getattr(el, "name", None) and el.name.startswith('h') and len(el.name) == 2:
+            break
+        if el.name == 'p':
+            intro_parts.append(el.get_text(strip=True))
+        elif el.name == 'div':
+            intro_parts.append(el.get_text(strip=True))
+    if intro_parts:
+        chunks.append({"section_title": "Introduction", "text": "\n".join(intro_parts), "url": url})
+
+    for heading in main.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
+        section_title = heading.get_text(strip=True)
+        section_content = []
+        for sib in heading.find_next_siblings():
+            if sib.name and sib.name.startswith('h') and len(sib.name) == 2:
+                break
+            if sib.name == 'p':
+                section_content.append(sib.get_text(strip=True))
+            elif sib.name == 'li':
+                section_content.append(f"- {sib.get_text(strip=True)}")
+            elif sib.name in ['ul', 'ol']:
+                for li in sib.find_all('li'):
+                    section_content.append(f"- {li.get_text(strip=True)}")
+            elif sib.name == 'div':
+                section_content.append(sib.get_text(strip=True))
+        if section_content:
+            chunks.append({"section_title": section_title, "text": "\n".join(section_content), "url": url})
+
+    return chunks
+
+
+def generated_page(rng, n_sections):
+    """
+    A long handbook-like page: intro, h2 sections with paragraphs, nested
+    lists, <hr> separators and divs holding h3 subsections.
+    """
+
+    words = ("gitlab handbook remote values iteration results transparency collaboration efficiency "
+             "diversity onboarding security incident review merge request pipeline direction").split()
+
+    def sentence():
+        return " ".join(rng.choice(words) for _ in range(rng.randint(8, 30))).capitalize() + "."
+
+    def items(depth):
+        out = []
+        for _ in range(rng.randint(2, 5)):
+            nested = f"<ul>{items(depth + 1)}</ul>" if depth < 2 and rng.random() < 0.3 else ""
+            out.append(f"<li>{sentence()}{nested}</li>")
+        return "".join(out)
+
+    parts = [f"<p>{sentence()}</p>", f"<div>{sentence()}</div>"]
+    for i in range(n_sections):
+        parts.append(f"<h2>Section {i}</h2><p>{sentence()}</p>")
+        if rng.random() < 0.5:
+            parts.append(f"<ul>{items(0)}</ul>")
+        if rng.random() < 0.3:
+            parts.append(f"<div><h3>Subsection {i}</h3><p>{sentence()}</p><ol>{items(1)}</ol></div>")
+        if rng.random() < 0.1:
+            parts.append(f"<hr><p>{sentence()}</p>")
+    return f"<html><body><nav><a href='/'>Home</a></nav><main>{''.join(parts)}</main></body></html>"
+
+
+def load_pages(html_dir, n_generated, sections):
+    if not html_dir:
+        rng = random.Random(0)
+        return [(f"https://handbook.gitlab.com/generated/{i}", generated_page(rng, sections * (i + 1) // n_generated))
+                for i in range(n_generated)]
+    pages = []
+    for path in sorted(glob.glob(os.path.join(html_dir, "**", "*.html"), recursive=True)):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            pages.append((f"file://{os.path.abspath(path)}", f.read()))
+    return pages
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def rounded(samples):
+    return {k: round(v, 3) for k, v in percentiles(samples).items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--html-dir", default=None, help="Directory of saved handbook pages (*.html)")
+    parser.add_argument("--largest", type=int, default=50, help="Time only the N largest pages")
+    parser.add_argument("--generated", type=int, default=20, help="Generated pages when no --html-dir is given")
+    parser.add_argument("--sections", type=int, default=400, help="Sections in the largest generated page")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    pages = load_pages(args.html_dir, args.generated, args.sections)
+    largest = sorted(pages, key=lambda page: len(page[1]), reverse=True)[:args.largest]
+    report = {"config": vars(args), "pages": len(pages),
+              "largest_page_kb": round(len(largest[0][1]) / 1024, 1) if largest else 0}
+    chunks_by_parser = {}
+    for name in PARSERS:
+        if name != "html.parser" and importlib.util.find_spec(name) is None:
+            report[name] = "not installed"
+            continue
+        parse_ms, legacy_ms, new_ms, mismatches = [], [], [], []
+        chunks_by_parser[name] = {}
+        for url, html in pages:
+            soup, ms = timed(BeautifulSoup, html, name)
+            legacy, ms_legacy = timed(legacy_chunk_content, soup, url)
+            chunks, ms_new = timed(chunk_content, soup, url)
+            chunks_by_parser[name][url] = chunks
+            if chunks != legacy:
+                mismatches.append(url)
+            if any(url == big_url for big_url, _ in largest):
+                parse_ms.append(ms)
+                legacy_ms.append(ms_legacy)
+                new_ms.append(ms_new)
+        report[name] = {
+            "parse_ms": rounded(parse_ms),
+            "legacy_chunk_ms": rounded(legacy_ms),
+            "chunk_ms": rounded(new_ms),
+            "chunk_speedup_total": round(sum(legacy_ms) / sum(new_ms), 2) if sum(new_ms) else None,
+            "parity_mismatches": len(mismatches),
+            "mismatched_pages": mismatches[:10],
+        }
+    if len(chunks_by_parser) > 1:
+        reference = chunks_by_parser["html.parser"]
+        for name, by_url in chunks_by_parser.items():
+            if name != "html.parser":
+                differ = [url for url, chunks in by_url.items() if chunks != reference[url]]
+                report[name]["pages_differing_from_html_parser"] = len(differ)
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Compare inference backends for the bi-encoder and cross-encoder.
+
+Each backend runs in a fresh process so RSS is measured in isolation.
+Reports load time, single-query latency, batch throughput, RSS and
+agreement with the fp32 torch baseline: embedding cosine similarity,
+top-k retrieval overlap and top-k rerank overlap.
+
+Run from src/:  python -m benchmarks.inference_backends --backends torch torch-int8 onnx onnx-int8
+"""
+import argparse
+import multiprocessing
+import time
+import numpy as np
+from backend.config import CROSS_ENCODER_MODEL, EMBEDDING_MODEL, FOLLOWUP_QUESTIONS, TOP_K
+from benchmarks.common import current_rss_mb, emit, percentiles
+
+SAMPLE_PASSAGES = [
+    "GitLab's values are Collaboration, Results, Efficiency, Diversity, Inclusion & Belonging, Iteration, and Transparency.",
+    "All team members work remotely and communicate asynchronously, documenting decisions in the handbook.",
+    "Onboarding issues guide new team members through their first weeks, with an onboarding buddy assigned.",
+    "Anyone can propose a change to the handbook by opening a merge request against the handbook project.",
+    "The security program focuses on application security, infrastructure security and security operations.",
+    "Incident management follows a defined process with severity levels, an incident commander and post-incident reviews.",
+    "GitLab offers a growth and development fund to support professional development and certifications.",
+    "The CTO leadership team includes leaders for development, infrastructure, quality and security.",
+    "Performance reviews combine self-assessment, manager feedback and talent assessment twice per year.",
+    "GitLab supports open source contributors through its community programs and contributor success team.",
+    "Family and friends days are company-wide days off to support team member well-being.",
+    "Product direction pages describe the vision, strategy and themes for each stage of the DevSecOps platform.",
+]
+
+
+def load_corpus(size):
+    """
+    Passages to encode: the handbook collection when available, otherwise
+    the built-in samples repeated with variations.
+    """
+
+    try:
+        from backend.registry import get_collection
+        docs = get_collection().get(limit=size, include=["documents"])["documents"]
+        if docs:
+            return docs
+    except Exception:
+        pass
+    return [f"{SAMPLE_PASSAGES[i % len(SAMPLE_PASSAGES)]} (variant {i})" for i in range(size)]
+
+
+def run_backend(backend, queries, corpus, repeats, conn):
+    """
+    Measure one backend in a child process and send the results back.
+    """
+
+    from backend.inference import load_cross_encoder, load_encoder
+
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    encoder = load_encoder(EMBEDDING_MODEL, backend)
+    cross_encoder = load_cross_encoder(CROSS_ENCODER_MODEL, backend)
+    load_s = time.perf_counter() - start
+
+    # Warm kernels before timing
+    encoder.encode(queries[:2])
+    cross_encoder.predict([(queries[0], corpus[0])])
+
+    query_latencies = []
+    for _ in range(repeats):
+        for q in queries:
+            t = time.perf_counter()
+            encoder.encode([q])
+            query_latencies.append((time.perf_counter() - t) * 1000)
+
+    t = time.perf_counter()
+    corpus_emb = encoder.encode(corpus, batch_size=32)
+    encode_s = time.perf_counter() - t
+    query_emb = encoder.encode(queries)
+
+    rerank_latencies = []
+    rerank_scores = []
+    for q in queries:
+        pairs = [(q, doc) for doc in corpus[:15]]
+        t = time.perf_counter()
+        rerank_scores.append(np.asarray(cross_encoder.predict(pairs), dtype=np.float32).tolist())
+        rerank_latencies.append((time.perf_counter() - t) * 1000)
+
+    conn.send({
+        "backend": backend,
+        "load_s": round(load_s, 3),
+        "rss_delta_mb": round(current_rss_mb() - rss_before, 1),
+        "query_encode_ms": {k: round(v, 3) for k, v in percentiles(query_latencies).items()},
+        "corpus_encode_per_s": round(len(corpus) / encode_s, 1),
+        "rerank_15_ms": {k: round(v, 3) for k, v in percentiles(rerank_latencies).items()},
+        "_query_emb": np.asarray(query_emb, dtype=np.float32).tolist(),
+        "_corpus_emb": np.asarray(corpus_emb, dtype=np.float32).tolist(),
+        "_rerank_scores": rerank_scores,
+    })
+    conn.close()
+
+
+def _normalize(m):
+    m = np.asarray(m, dtype=np.float32)
+    return m / np.maximum(np.linalg.norm(m, axis=1, keepdims=True), 1e-12)
+
+
+def _topk_overlap(a, b, k):
+    return len(set(a[:k]) & set(b[:k])) / k
+
+
+def agreement(baseline, result, k):
+    """
+    Agreement of a backend with the fp32 baseline.
+    """
+
+    bq, rq = _normalize(baseline["_query_emb"]), _normalize(result["_query_emb"])
+    bc, rc = _normalize(baseline["_corpus_emb"]), _normalize(result["_corpus_emb"])
+    cosine = np.concatenate([np.sum(bq * rq, axis=1), np.sum(bc * rc, axis=1)])
+    base_rank = np.argsort(-(bq @ bc.T), axis=1)
+    res_rank = np.argsort(-(rq @ rc.T), axis=1)
+    retrieval = [_topk_overlap(list(b), list(r), k) for b, r in zip(base_rank, res_rank)]
+    rerank = [
+        _topk_overlap(list(np.argsort(-np.array(b))), list(np.argsort(-np.array(r))), min(k, len(b)))
+        for b, r in zip(baseline["_rerank_scores"], result["_rerank_scores"])
+    ]
+    return {
+        "embedding_cosine_min": round(float(cosine.min()), 4),
+        "embedding_cosine_mean": round(float(cosine.mean()), 4),
+        f"retrieval_top{k}_overlap": round(float(np.mean(retrieval)), 4),
+        f"rerank_top{k}_overlap": round(float(np.mean(rerank)), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=["torch", "torch-int8", "onnx", "onnx-int8"])
+    parser.add_argument("--corpus-size", type=int, default=256)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    queries = list(FOLLOWUP_QUESTIONS)
+    corpus = load_corpus(args.corpus_size)
+    ctx = multiprocessing.get_context("spawn")
+
+    results = {}
+    for backend in backends:
+        parent, child = ctx.Pipe(duplex=False)
+        proc = ctx.Process(target=run_backend, args=(backend, queries, corpus, args.repeats, child))
+        proc.start()
+        # Only the child may hold the write end, so its death shows up as EOF
+        child.close()
+        while not parent.poll(1.0) and proc.is_alive():
+            continue
+        try:
+            results[backend] = parent.recv()
+        except EOFError:
+            proc.join()
+            results[backend] = {"backend": backend, "error": f"process exited with {proc.exitcode}"}
+        proc.join()
+        parent.close()
+
+    baseline = results["torch"]
+    report = []
+    for backend in backends:
+        result = results[backend]
+        row = {k: v for k, v in result.items() if not k.startswith("_")}
+        if "error" not in result and "error" not in baseline:
+            row["agreement"] = agreement(baseline, result, TOP_K)
+        report.append(row)
+    emit({"corpus_size": len(corpus), "queries": len(queries), "backends": report}, args.output)
+
+
+if __name__ == "__main__":
+    main()
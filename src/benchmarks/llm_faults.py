@@ -0,0 +1,98 @@
+"""
+Fault-injection report for the Gemini call layer (backend.llm_client).
+
+Drives ResilientLLM over backend.stub_llm.StubGenaiClient from several
+threads in a few scenarios: a healthy provider, a slow tail (hedging off
+and on), intermittent 503s (retries off and on) and a full outage that
+should trip the circuit breaker. For each it reports the share of calls
+answered, how they failed, latency percentiles and LLM attempts per call.
+No models or collection are loaded.
+
+Run from src/:  python -m benchmarks.llm_faults --calls 400 --concurrency 16
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from backend.llm_client import LLMUnavailable, ResilientLLM
+from backend.stub_llm import StubGenaiClient
+from benchmarks.common import emit, percentiles
+
+
+def scenarios(latency, deadline):
+    """
+    name -> (stub client options, ResilientLLM options).
+    """
+
+    return {
+        "healthy": ({}, {"max_attempts": 1}),
+        "slow_tail": ({"tail_rate": 0.05, "tail_latency": 10 * latency}, {"max_attempts": 1}),
+        "slow_tail_hedged": ({"tail_rate": 0.05, "tail_latency": 10 * latency},
+                             {"max_attempts": 1, "hedge": True}),
+        "errors_no_retry": ({"failure_rate": 0.2}, {"max_attempts": 1}),
+        "errors_retry": ({"failure_rate": 0.2}, {"max_attempts": 3}),
+        "outage": ({"failure_rate": 1.0}, {"max_attempts": 3}),
+        "hung": ({"latency": 5 * deadline}, {"max_attempts": 3}),
+    }
+
+
+def run_scenario(stub_options, llm_options, calls, concurrency, latency, deadline):
+    client = StubGenaiClient(**{"latency": latency, "jitter": latency / 2, "seed": 0, **stub_options})
+    llm = ResilientLLM(client, "stub", deadline_s=deadline, backoff_base_s=latency / 2,
+                       backoff_max_s=4 * latency, hedge_min_delay_s=latency, cooldown_s=60.0,
+                       max_workers=4 * concurrency, seed=0, **llm_options)
+    outcomes = {}
+    latencies = []
+    lock = threading.Lock()
+
+    def one(_):
+        start = time.perf_counter()
+        try:
+            llm.generate("benchmark prompt")
+            outcome = "ok"
+        except LLMUnavailable as e:
+            outcome = e.reason
+        except Exception as e:
+            outcome = type(e).__name__
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            latencies.append(elapsed)
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(calls)))
+    stats = llm.stats()
+    llm.pool.shutdown(wait=False)
+    return {
+        "answered_pct": round(100 * outcomes.get("ok", 0) / calls, 2),
+        "outcomes": outcomes,
+        "latency_ms": {k: round(v, 1) for k, v in percentiles(latencies).items()},
+        "provider_calls_per_request": round(client.calls / calls, 3),
+        "hedges": stats["hedge"],
+        "hedge_wins": stats["hedge_wins"],
+        "retries": stats["retry"],
+        "breaker_opens": stats["breaker_opens"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub time to first token in seconds")
+    parser.add_argument("--deadline", type=float, default=1.0, help="Per-call deadline in seconds")
+    parser.add_argument("--scenarios", nargs="+", default=None)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    report = {"config": vars(args)}
+    for name, (stub_options, llm_options) in scenarios(args.latency, args.deadline).items():
+        if args.scenarios and name not in args.scenarios:
+            continue
+        report[name] = run_scenario(stub_options, llm_options, args.calls, args.concurrency,
+                                    args.latency, args.deadline)
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
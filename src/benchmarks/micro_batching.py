@@ -0,0 +1,88 @@
+"""
+Throughput of per-request inference calls vs. cross-request micro-batching.
+
+Each simulated request embeds one query and cross-encodes --pairs
+(query, passage) pairs, the way Chatbot.embed_query and cross_encode do.
+For every concurrency level the same workload runs once with direct
+encode/predict calls and once through MicroBatcher for each --max-wait
+setting, reporting requests/s, latency percentiles and mean batch sizes.
+
+Run from src/:  python -m benchmarks.micro_batching --concurrency 1 4 16 --max-wait 1 2 5
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from backend import registry
+from backend.batching import MicroBatcher
+from backend.config import EMBED_MAX_BATCH, FOLLOWUP_QUESTIONS, RERANK_MAX_BATCH, RERANK_TOKEN_WINDOW
+from backend.reranker import truncate_to_window
+from benchmarks.common import emit, percentiles
+from benchmarks.inference_backends import SAMPLE_PASSAGES
+
+
+def make_requests(n, n_pairs):
+    requests = []
+    for i in range(n):
+        query = f"{FOLLOWUP_QUESTIONS[i % len(FOLLOWUP_QUESTIONS)]} #{i}"
+        passages = [SAMPLE_PASSAGES[(i + j) % len(SAMPLE_PASSAGES)] for j in range(n_pairs)]
+        requests.append((query, [(query, truncate_to_window(p, RERANK_TOKEN_WINDOW)) for p in passages]))
+    return requests
+
+
+def run(requests, concurrency, embed_fn, score_fn):
+    latencies = []
+
+    def call(request):
+        query, pairs = request
+        t = time.perf_counter()
+        embed_fn([query])
+        score_fn(pairs)
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(call, requests))
+    wall = time.perf_counter() - start
+    return {
+        "requests_per_s": round(len(requests) / wall, 2),
+        "latency_ms": {k: round(v, 2) for k, v in percentiles(latencies).items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--pairs", type=int, default=15, help="Rerank pairs per request")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--max-wait", type=float, nargs="+", default=[2.0], help="Batcher max wait in ms")
+    parser.add_argument("--embed-max-batch", type=int, default=EMBED_MAX_BATCH)
+    parser.add_argument("--rerank-max-batch", type=int, default=RERANK_MAX_BATCH)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    encoder = registry.get_encoder()
+    cross_encoder = registry.get_cross_encoder()
+    requests = make_requests(args.requests, args.pairs)
+    # Warm up both models so the first measured run does not pay for lazy init
+    run(requests[:4], 1, encoder.encode, cross_encoder.predict)
+
+    rows = []
+    for concurrency in args.concurrency:
+        row = {"concurrency": concurrency, "direct": run(requests, concurrency, encoder.encode, cross_encoder.predict)}
+        for max_wait in args.max_wait:
+            embed = MicroBatcher("embedding", lambda q: encoder.encode(q, batch_size=args.embed_max_batch),
+                                 max_batch=args.embed_max_batch, max_wait_ms=max_wait)
+            rerank = MicroBatcher("cross_encoder", lambda p: cross_encoder.predict(p, batch_size=args.rerank_max_batch),
+                                  max_batch=args.rerank_max_batch, max_wait_ms=max_wait)
+            result = run(requests, concurrency, embed.submit, rerank.submit)
+            result["embedding_batcher"] = embed.stats()
+            result["cross_encoder_batcher"] = rerank.stats()
+            result["speedup"] = round(result["requests_per_s"] / row["direct"]["requests_per_s"], 2)
+            row[f"batched_{max_wait:g}ms"] = result
+        rows.append(row)
+
+    emit({"config": vars(args), "results": rows}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Index shrink and retrieval recall from near-duplicate elimination.
+
+Chunks and splits a set of pages the way ingestion does. Then, for each
+threshold, it passes the sub-chunks through backend.dedup.SignatureIndex
+and compares three BM25 indexes: one over every sub-chunk (no dedup), one
+over the exact-duplicate-free set, and one over the near-duplicate-free
+set. Queries are word windows drawn from random sub-chunks, and recall@k
+is reported two ways:
+
+  * content: a result from the source chunk's duplicate group is in the top k
+  * url: the source page's URL is among the top k results' url / alt_urls
+
+The report also gives the number of distinct duplicate groups in the top k.
+Without --html-dir, generated pages are used: shared boilerplate sections
+with small edits, and some pages mirrored under a second path.
+
+Run from src/:  python -m benchmarks.near_duplicates --html-dir path/to/pages --thresholds 0.7 0.8 0.9
+"""
+import argparse
+import hashlib
+import os
+import random
+import tempfile
+import time
+from backend.bm25 import BM25Index, build_index, tokenize
+from backend.context import split_header
+from backend.data_ingestion import chunk_content, parse_html, split_chunks
+from backend.dedup import SignatureIndex, minhash
+from benchmarks.common import emit
+from benchmarks.html_chunking import load_pages as load_saved_pages
+
+WORDS = ("gitlab handbook remote values iteration results transparency collaboration efficiency diversity "
+         "onboarding security incident review merge request pipeline direction team manager async meeting "
+         "issue epic milestone release deploy runner compliance privacy benefits leave travel expense").split()
+
+
+def generated_pages(n_pages, seed=0):
+    """
+    Pages of unique sections plus boilerplate sections shared across pages
+    with a word or two changed; every tenth page is mirrored at a second URL.
+    """
+
+    rng = random.Random(seed)
+
+    def paragraph(n):
+        return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+    boilerplate = [(f"Shared section {i}", paragraph(120)) for i in range(12)]
+    pages = []
+    for i in range(n_pages):
+        sections = [(f"Topic {i}.{j}", paragraph(rng.randint(60, 200))) for j in range(8)]
+        for title, text in rng.sample(boilerplate, 3):
+            words = text.split()
+            for _ in range(rng.randint(0, 2)):
+                words[rng.randrange(len(words))] = rng.choice(WORDS)
+            sections.insert(rng.randrange(len(sections)), (title, " ".join(words)))
+        body = "".join(f"<h2>{title}</h2><p>{text}</p>" for title, text in sections)
+        html = f"<html><main><p>{paragraph(20)}</p>{body}</main></html>"
+        pages.append((f"https://handbook.gitlab.com/generated/{i}", html))
+        if i % 10 == 0:
+            pages.append((f"https://handbook.gitlab.com/mirror/generated/{i}", html))
+    return pages
+
+
+def sub_chunks(pages):
+    documents, metadatas, ids = [], [], []
+    for url, html in pages:
+        docs, metas, cids = split_chunks(chunk_content(parse_html(html), url), "bench_")
+        documents.extend(docs)
+        metadatas.extend(metas)
+        ids.extend(cids)
+    return documents, metadatas, ids
+
+
+def exact_groups(documents, ids):
+    """
+    chunk ID -> ID of the first chunk with the same body.
+    """
+
+    first = {}
+    groups = {}
+    for doc, cid in zip(documents, ids):
+        digest = hashlib.sha1(split_header(doc)[1].encode("utf-8")).hexdigest()
+        groups[cid] = first.setdefault(digest, cid)
+    return groups
+
+
+def near_groups(documents, metadatas, ids, threshold, path):
+    """
+    Run the signature index over all sub-chunks. Returns (chunk ID ->
+    canonical chunk ID, canonical ID -> alternate URLs, seconds spent in
+    SignatureIndex.filter).
+    """
+
+    index = SignatureIndex(path, threshold)
+    elapsed = 0.0
+    groups = {}
+    for doc, meta, cid in zip(documents, metadatas, ids):
+        signature = minhash(split_header(doc)[1])
+        canonical = index.match(signature) if signature is not None else None
+        start = time.perf_counter()
+        index.filter([doc], [meta], [cid])
+        elapsed += time.perf_counter() - start
+        groups[cid] = canonical or cid
+    alternates = {cid: set(urls) for cid, urls in index.alternates.items()}
+    index.close()
+    return groups, alternates, elapsed
+
+
+def recall(index_path, kept_ids, documents, metadatas, ids, groups, alternates, queries, k):
+    """
+    Content and URL recall@k and mean distinct groups in the top k for a
+    BM25 index over kept_ids.
+    """
+
+    by_id = {cid: (doc, meta) for doc, meta, cid in zip(documents, metadatas, ids)}
+    build_index(kept_ids, [by_id[cid][0] for cid in kept_ids], index_path)
+    bm25 = BM25Index(index_path)
+    content_hits = url_hits = distinct = 0
+    for query, source in queries:
+        top = [cid for cid, _ in bm25.search(query, k)]
+        top_groups = {groups[cid] for cid in top}
+        content_hits += groups[source] in top_groups
+        urls = set()
+        for cid in top:
+            urls.add(by_id[cid][1]["url"])
+            urls |= alternates.get(cid, set())
+        url_hits += by_id[source][1]["url"] in urls
+        distinct += len(top_groups)
+    n = len(queries) or 1
+    return {
+        "content_recall": round(content_hits / n, 4),
+        "url_recall": round(url_hits / n, 4),
+        "distinct_groups_in_top_k": round(distinct / n, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--html-dir", default=None, help="Directory of saved handbook pages (*.html)")
+    parser.add_argument("--pages", type=int, default=200, help="Generated pages when no --html-dir is given")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.7, 0.8, 0.9])
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--query-words", type=int, default=12)
+    parser.add_argument("--k", type=int, default=15)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    pages = load_saved_pages(args.html_dir, 0, 0) if args.html_dir else generated_pages(args.pages)
+    documents, metadatas, ids = sub_chunks(pages)
+    rng = random.Random(1)
+    queries = []
+    for row in rng.sample(range(len(ids)), min(args.queries, len(ids))):
+        words = tokenize(split_header(documents[row])[1])
+        start = rng.randrange(max(1, len(words) - args.query_words))
+        queries.append((" ".join(words[start:start + args.query_words]), ids[row]))
+
+    tmp = tempfile.mkdtemp(prefix="bench_dedup_")
+    report = {"config": vars(args), "pages": len(pages), "sub_chunks": len(ids)}
+    for threshold in args.thresholds:
+        groups, alternates, elapsed = near_groups(documents, metadatas, ids, threshold,
+                                                  os.path.join(tmp, f"dedup_{threshold}.sqlite"))
+        # Ground truth for every index is the grouping at this threshold
+        kept = [cid for cid in ids if groups[cid] == cid]
+        exact = exact_groups(documents, ids)
+        exact_kept = [cid for cid in ids if exact[cid] == cid]
+        report[f"threshold_{threshold}"] = {
+            "kept": len(kept),
+            "shrink_pct": round(100 * (1 - len(kept) / len(ids)), 2) if ids else 0.0,
+            "exact_dedup_kept": len(exact_kept),
+            "signature_ms_per_chunk": round(1000 * elapsed / len(ids), 3) if ids else 0.0,
+            "no_dedup": recall(os.path.join(tmp, f"all_{threshold}"), ids, documents, metadatas, ids,
+                               groups, {}, queries, args.k),
+            "exact_dedup": recall(os.path.join(tmp, f"exact_{threshold}"), exact_kept, documents, metadatas,
+                                  ids, groups, {}, queries, args.k),
+            "near_dedup": recall(os.path.join(tmp, f"near_{threshold}"), kept, documents, metadatas, ids,
+                                 groups, alternates, queries, args.k),
+        }
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
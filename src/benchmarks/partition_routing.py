@@ -0,0 +1,182 @@
+"""
+Latency and recall of source-partitioned retrieval against one collection.
+
+Builds a synthetic two-source corpus: clustered unit embeddings where each
+source has its own topics and --shared-topics topics appear in both. Then
+it reports recall@k against exact search over the whole corpus, plus
+latency, for:
+
+  * baseline: one unfiltered query over the whole collection
+  * partition_<name>: a where-filtered query on one partition only
+  * fan_out: every partition queried in parallel, hits merged by distance
+  * routed_m<margin>: backend.router.PartitionRouter picks one partition
+    when its centroids lead by the margin, else fans out (also reports the
+    share of queries routed and how often the routed partition held the
+    majority of the true top k)
+
+Runs on the memory-mapped VectorIndex, and on an in-memory Chroma
+collection when chromadb is installed.
+
+Run from src/:  python -m benchmarks.partition_routing --docs 20000 --queries 300 --margins 0.02 0.05 0.1
+"""
+import argparse
+import importlib.util
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from backend.router import PARTITION_KEY, PartitionRouter, build_router, partitioned_query
+from backend.vector_index import VectorIndex, build_index
+from benchmarks.common import emit, percentiles
+
+SOURCES = (("handbook_", 0.7), ("direction_", 0.3))
+
+
+def synthetic_corpus(n_docs, dim, topics_per_source, shared_topics, noise, seed=0):
+    """
+    (ids, embeddings, metadatas, topic of each doc, topic centers).
+    """
+
+    rng = np.random.default_rng(seed)
+    n_topics = topics_per_source * len(SOURCES) + shared_topics
+    centers = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    shared = list(range(topics_per_source * len(SOURCES), n_topics))
+    ids, metadatas, topics = [], [], []
+    for i, (name, share) in enumerate(SOURCES):
+        own = list(range(i * topics_per_source, (i + 1) * topics_per_source))
+        for j in range(int(n_docs * share)):
+            topics.append(int(rng.choice(own + shared)))
+            ids.append(f"{name}{j}")
+            metadatas.append({PARTITION_KEY: name, "url": f"https://example.com/{name}{j}"})
+    topics = np.asarray(topics)
+    embeddings = centers[topics] + noise * rng.standard_normal((len(ids), dim)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return ids, embeddings, metadatas, topics, centers
+
+
+def chroma_collection(ids, embeddings, metadatas, batch=5000):
+    import chromadb
+    collection = chromadb.EphemeralClient().create_collection(f"bench_partitions_{int(time.time() * 1000)}")
+    for start in range(0, len(ids), batch):
+        part = slice(start, start + batch)
+        collection.add(ids=ids[part], embeddings=embeddings[part].tolist(), metadatas=metadatas[part],
+                       documents=[f"doc {cid}" for cid in ids[part]])
+    return collection
+
+
+def timed_ms(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def summary(latencies, recalls, **extra):
+    return {
+        "latency_ms": {k: round(v, 3) for k, v in percentiles(latencies).items()},
+        "recall_at_k": round(float(np.mean(recalls)), 4),
+        **extra,
+    }
+
+
+def bench_backend(collection, router, queries, truth, partition_of, k, margins, pool):
+    report = {}
+
+    def unfiltered(query):
+        return collection.query(query_embeddings=[query.tolist()], n_results=k,
+                                include=["documents", "metadatas", "distances"])["ids"][0]
+
+    def filtered(query, partitions):
+        return partitioned_query(collection, [query.tolist()], k, partitions, pool)[0]["ids"][0]
+
+    latencies, recalls = [], []
+    for query, true_ids in zip(queries, truth):
+        ids, ms = timed_ms(unfiltered, query)
+        latencies.append(ms)
+        recalls.append(len(set(ids) & true_ids) / k)
+    report["baseline"] = summary(latencies, recalls)
+
+    for name in router.names:
+        latencies, recalls = [], []
+        for query, true_ids in zip(queries, truth):
+            ids, ms = timed_ms(filtered, query, [name])
+            latencies.append(ms)
+            recalls.append(len(set(ids) & true_ids) / k)
+        report[f"partition_{name}"] = summary(latencies, recalls, rows=router.sizes.get(name))
+
+    latencies, recalls = [], []
+    for query, true_ids in zip(queries, truth):
+        ids, ms = timed_ms(filtered, query, router.names)
+        latencies.append(ms)
+        recalls.append(len(set(ids) & true_ids) / k)
+    report["fan_out"] = summary(latencies, recalls)
+
+    for margin in margins:
+        router.margin = margin
+        latencies, recalls, routed_count, correct = [], [], 0, 0
+        for query, true_ids in zip(queries, truth):
+            start = time.perf_counter()
+            partitions, routed = router.route(query)
+            ids = filtered(query, partitions)
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(len(set(ids) & true_ids) / k)
+            if routed:
+                routed_count += 1
+                owners = [partition_of[cid] for cid in true_ids]
+                correct += owners.count(partitions[0]) * 2 > len(owners)
+        report[f"routed_m{margin}"] = summary(
+            latencies, recalls,
+            routed_pct=round(100 * routed_count / len(queries), 2),
+            routed_to_majority_partition_pct=round(100 * correct / routed_count, 2) if routed_count else None,
+        )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=40, help="Topics per source")
+    parser.add_argument("--shared-topics", type=int, default=8, help="Topics present in both sources")
+    parser.add_argument("--noise", type=float, default=0.08, help="Per-dimension noise around topic centers")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=15)
+    parser.add_argument("--centroids", type=int, default=8, help="Router centroids per partition")
+    parser.add_argument("--margins", type=float, nargs="+", default=[0.02, 0.05, 0.1])
+    parser.add_argument("--workers", type=int, default=4, help="Threads for fanned-out partition queries")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    ids, embeddings, metadatas, topics, centers = synthetic_corpus(
+        args.docs, args.dim, args.topics, args.shared_topics, args.noise)
+    partition_of = {cid: meta[PARTITION_KEY] for cid, meta in zip(ids, metadatas)}
+    rng = np.random.default_rng(1)
+    query_topics = topics[rng.integers(0, len(ids), args.queries)]
+    queries = centers[query_topics] + 1.5 * args.noise * rng.standard_normal((args.queries, args.dim))
+    queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+    truth = [{ids[i] for i in np.argsort(((embeddings - q) ** 2).sum(axis=1))[:args.k]} for q in queries]
+
+    tmp = tempfile.mkdtemp(prefix="bench_partitions_")
+    index_path = os.path.join(tmp, "vectors")
+    build_index(ids, embeddings, [f"doc {cid}" for cid in ids], metadatas, index_path, "int8")
+    backends = {"numpy": VectorIndex(index_path, oversample=4)}
+    if importlib.util.find_spec("chromadb") is not None:
+        backends["chroma"] = chroma_collection(ids, embeddings, metadatas)
+
+    report = {"config": vars(args), "docs": len(ids)}
+    with ThreadPoolExecutor(args.workers) as pool:
+        for name, collection in backends.items():
+            router_path = os.path.join(tmp, f"{name}_partitions.npz")
+            _, build_ms = timed_ms(build_router, collection, router_path, args.centroids)
+            router = PartitionRouter.load(router_path)
+            report[name] = bench_backend(collection, router, queries, truth, partition_of, args.k,
+                                         args.margins, pool)
+            report[name]["router_build_s"] = round(build_ms / 1000, 2)
+    if "chroma" not in backends:
+        report["chroma"] = "not installed"
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Offline end-to-end latency and throughput benchmark for the RAG pipeline.
+
+Builds a synthetic Chroma collection of configurable size, replaces Gemini
+with backend.stub_llm.StubGenaiClient, and measures:
+
+  * per-stage latency (embed_query, retrieve_documents, rerank_documents,
+    generate_llm_response) with p50/p95/p99
+  * end-to-end throughput under N concurrent simulated sessions
+  * ingestion: chunk_content and save_to_chroma over a directory of saved
+    HTML pages (or generated pages when none is given)
+  * peak RSS
+
+The JSON report includes the current git commit so runs can be compared.
+
+Run from src/:  python -m benchmarks.rag_pipeline --docs 5000 --sessions 8 --output bench.json
+"""
+import argparse
+import glob
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import chromadb
+import numpy as np
+from backend import registry
+from backend.bm25 import BM25Index, build_index
+from backend.config import FOLLOWUP_QUESTIONS
+from backend.stub_llm import StubGenaiClient
+from benchmarks.common import current_rss_mb, emit, peak_rss_mb, percentiles
+from benchmarks.inference_backends import SAMPLE_PASSAGES
+
+EMBEDDING_DIM = 768
+SECTION_TITLES = ["Overview", "Values", "Remote work", "Onboarding", "Security program", "Incident management",
+                  "Benefits", "Engineering initiatives", "Performance reviews", "Open source", "Direction"]
+
+
+def synthetic_documents(n, seed=0):
+    """
+    Handbook-like chunk texts and metadata.
+    """
+
+    rng = np.random.default_rng(seed)
+    docs, metas, ids = [], [], []
+    for i in range(n):
+        title = SECTION_TITLES[i % len(SECTION_TITLES)]
+        body = " ".join(rng.choice(SAMPLE_PASSAGES, size=6))
+        docs.append(f"Section title: {title}\n{body}")
+        metas.append({"section_title": title, "url": f"https://handbook.gitlab.com/synthetic/{i // 5}",
+                      "source_prefix": "handbook_"})
+        ids.append(f"handbook_{i}")
+    return docs, metas, ids
+
+
+def build_synthetic_collection(n_docs, real_embeddings, encoder, batch=1000):
+    """
+    Fill an ephemeral collection with n_docs synthetic chunks. Embeddings are
+    random unit vectors unless real_embeddings is set.
+    """
+
+    client = chromadb.EphemeralClient()
+    name = f"bench_{int(time.time() * 1000)}"
+    collection = client.create_collection(name)
+    docs, metas, ids = synthetic_documents(n_docs)
+    rng = np.random.default_rng(1)
+    for start in range(0, n_docs, batch):
+        part = slice(start, start + batch)
+        if real_embeddings:
+            emb = encoder.encode(docs[part], batch_size=64)
+        else:
+            emb = rng.standard_normal((len(docs[part]), EMBEDDING_DIM)).astype(np.float32)
+            emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+        collection.add(ids=ids[part], documents=docs[part], metadatas=metas[part],
+                       embeddings=[e.tolist() for e in emb])
+    return client, collection, docs, ids
+
+
+def query_set(n):
+    """
+    n distinct queries, so memo and answer caches miss.
+    """
+
+    return [f"{FOLLOWUP_QUESTIONS[i % len(FOLLOWUP_QUESTIONS)]} #{i}" for i in range(n)]
+
+
+def run_stages(chatbot, query):
+    """
+    Run the pipeline stage by stage and return per-stage durations in ms.
+    """
+
+    timings = {}
+    t = time.perf_counter()
+    emb = chatbot.embed_query(query)
+    timings["embed_query"] = (time.perf_counter() - t) * 1000
+    t = time.perf_counter()
+    docs, metas = chatbot.retrieve_documents(emb, query_text=query)
+    timings["retrieve_documents"] = (time.perf_counter() - t) * 1000
+    t = time.perf_counter()
+    top_docs = chatbot.rerank_documents(query, docs, metas)
+    timings["rerank_documents"] = (time.perf_counter() - t) * 1000
+    t = time.perf_counter()
+    chatbot.generate_llm_response(query, top_docs)
+    timings["generate_llm_response"] = (time.perf_counter() - t) * 1000
+    timings["total"] = sum(timings.values())
+    return timings
+
+
+def summarize(samples):
+    return {k: round(v, 3) for k, v in percentiles(samples).items()} | {"mean": round(float(np.mean(samples)), 3)}
+
+
+def bench_stages(chatbot, n_queries):
+    per_stage = {}
+    for query in query_set(n_queries):
+        for stage, ms in run_stages(chatbot, query).items():
+            per_stage.setdefault(stage, []).append(ms)
+    return {stage: summarize(samples) for stage, samples in per_stage.items()}
+
+
+def bench_concurrency(chatbot, sessions, n_queries):
+    """
+    Requests per second with `sessions` concurrent callers of generate_response.
+    """
+
+    queries = [f"{q} [c]" for q in query_set(n_queries)]
+    latencies = []
+
+    def call(q):
+        t = time.perf_counter()
+        chatbot.generate_response(q)
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(sessions) as pool:
+        list(pool.map(call, queries))
+    wall = time.perf_counter() - start
+    return {"sessions": sessions, "requests": len(queries), "requests_per_s": round(len(queries) / wall, 3),
+            "latency_ms": summarize(latencies)}
+
+
+def generated_pages(n):
+    pages = []
+    for i in range(n):
+        sections = "".join(
+            f"<h2>{SECTION_TITLES[(i + j) % len(SECTION_TITLES)]}</h2>"
+            f"<p>{SAMPLE_PASSAGES[j % len(SAMPLE_PASSAGES)]}</p>"
+            f"<ul>{''.join(f'<li>{p}</li>' for p in SAMPLE_PASSAGES[:4])}</ul>"
+            for j in range(12)
+        )
+        pages.append((f"https://handbook.gitlab.com/generated/{i}", f"<html><main><p>Intro {i}</p>{sections}</main></html>"))
+    return pages
+
+
+def load_pages(html_dir, n_generated):
+    if not html_dir:
+        return generated_pages(n_generated)
+    pages = []
+    for path in sorted(glob.glob(os.path.join(html_dir, "**", "*.html"), recursive=True)):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            pages.append((f"file://{os.path.abspath(path)}", f.read()))
+    return pages
+
+
+def bench_ingestion(pages):
+    """
+    Time chunk_content per page and save_to_chroma over all resulting chunks.
+    """
+
+    from backend.data_ingestion import chunk_content, parse_html, save_to_chroma
+
+    chunk_ms = []
+    chunks = []
+    for url, html in pages:
+        soup = parse_html(html)
+        t = time.perf_counter()
+        chunks.extend(chunk_content(soup, url))
+        chunk_ms.append((time.perf_counter() - t) * 1000)
+
+    collection = chromadb.EphemeralClient().create_collection(f"bench_ingest_{int(time.time() * 1000)}")
+    t = time.perf_counter()
+    n_docs = save_to_chroma(chunks, collection, 0, id_prefix="bench_")
+    save_s = time.perf_counter() - t
+    return {
+        "pages": len(pages),
+        "chunks": len(chunks),
+        "sub_chunks": n_docs,
+        "chunk_content_ms": summarize(chunk_ms) if chunk_ms else {},
+        "save_to_chroma_s": round(save_s, 3),
+        "save_to_chroma_docs_per_s": round(n_docs / save_s, 2) if save_s else 0.0,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=5000, help="Synthetic collection size")
+    parser.add_argument("--real-embeddings", action="store_true", help="Embed synthetic docs with the encoder")
+    parser.add_argument("--hybrid", action="store_true", help="Build a BM25 index for hybrid retrieval")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Stub LLM latency in seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.4)
+    parser.add_argument("--html-dir", default=None, help="Directory of saved handbook HTML pages")
+    parser.add_argument("--pages", type=int, default=50, help="Generated pages when --html-dir is not given")
+    parser.add_argument("--skip-ingestion", action="store_true")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    rss_start = current_rss_mb()
+    encoder = registry.get_encoder()
+    registry.get_cross_encoder()
+    t = time.perf_counter()
+    client, collection, docs, ids = build_synthetic_collection(args.docs, args.real_embeddings, encoder)
+    build_s = time.perf_counter() - t
+    registry.set_resource("chroma_client", client)
+    registry.set_resource("collection", collection)
+
+    from backend.chatbot import Chatbot
+    chatbot = Chatbot(genai_client=StubGenaiClient(latency=args.llm_latency, jitter=args.llm_jitter, seed=0))
+    chatbot.answer_cache = None
+    chatbot.bm25_index = None
+    # The router's centroids and partitions belong to the real snapshot
+    chatbot.router = None
+    if args.hybrid:
+        index_dir = tempfile.mkdtemp(prefix="bench_bm25_")
+        build_index(ids, docs, index_dir)
+        chatbot.bm25_index = BM25Index(index_dir)
+
+    report = {
+        "commit": git_commit(),
+        "config": vars(args),
+        "collection_build_s": round(build_s, 3),
+        "stages_ms": bench_stages(chatbot, args.queries),
+        "concurrency": bench_concurrency(chatbot, args.sessions, args.queries),
+        "cache_stats": chatbot.cache_stats(),
+    }
+    if not args.skip_ingestion:
+        report["ingestion"] = bench_ingestion(load_pages(args.html_dir, args.pages))
+    report["rss_start_mb"] = round(rss_start, 1)
+    report["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Memory/latency report for the shared Chatbot registry.
+
+Simulates N browser sessions and records RSS and per-session init latency
+in two modes, each in a fresh process:
+
+  * shared: every session gets its chatbot from registry.get_chatbot(),
+    the way app.init_session_state does
+  * per_session: every session builds its own models, Chroma client and
+    collection, the way Chatbot.__init__ did before the registry, and keeps
+    them alive like a Streamlit session does
+
+The first session runs alone and is reported as the cold load; the rest
+then start together from --concurrency threads and are reported in
+completion order, so warm numbers never include waiting on the cold load.
+With the registry RSS should stay flat after the first session, while
+per_session grows by roughly one set of models per session.
+
+Run from src/:  python -m benchmarks.session_scaling --sessions 30 --per-session-sessions 4
+"""
+import argparse
+import multiprocessing
+import threading
+import time
+from benchmarks.common import current_rss_mb, peak_rss_mb, emit
+
+
+def shared_session():
+    from backend import registry
+    return registry.get_chatbot()
+
+
+def per_session():
+    """
+    What one session loaded before the registry (except the Gemini client,
+    which is small and needs an API key).
+    """
+
+    import chromadb
+    from sentence_transformers import CrossEncoder, SentenceTransformer
+    from backend import snapshots
+    from backend.config import COLLECTION_NAME, CROSS_ENCODER_MODEL, EMBEDDING_MODEL
+    client = chromadb.PersistentClient(path=snapshots.active_db_path())
+    return (SentenceTransformer(EMBEDDING_MODEL, device="cpu"), CrossEncoder(CROSS_ENCODER_MODEL, device="cpu"),
+            client, client.get_or_create_collection(COLLECTION_NAME))
+
+
+MODES = {"shared": shared_session, "per_session": per_session}
+
+
+def simulate_sessions(init, n_sessions, concurrency):
+    """
+    Initialize one session alone, then n_sessions - 1 more from concurrency
+    threads. Returns rows in completion order with init latency and RSS
+    after each session.
+    """
+
+    rows = []
+    sessions = []  # Keep every session's objects alive, as Streamlit does
+    rows_lock = threading.Lock()
+    semaphore = threading.Semaphore(concurrency)
+
+    def session(i):
+        with semaphore:
+            start = time.perf_counter()
+            state = init()
+            elapsed = time.perf_counter() - start
+            with rows_lock:
+                sessions.append(state)
+                rows.append({"session": i, "order": len(rows), "cold": i == 0, "init_s": round(elapsed, 4),
+                             "rss_mb": round(current_rss_mb(), 1)})
+
+    session(0)
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(1, n_sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return rows
+
+
+def run_mode(mode, n_sessions, concurrency, conn):
+    """
+    Child process entry point: report one mode over the pipe.
+    """
+
+    baseline_rss = current_rss_mb()
+    rows = simulate_sessions(MODES[mode], n_sessions, concurrency)
+    warm = [r["init_s"] for r in rows if not r["cold"]] or [0.0]
+    conn.send({
+        "sessions": n_sessions,
+        "baseline_rss_mb": round(baseline_rss, 1),
+        "cold_init_s": rows[0]["init_s"],
+        "rss_after_first_session_mb": rows[0]["rss_mb"],
+        "rss_after_last_session_mb": rows[-1]["rss_mb"],
+        "rss_growth_per_warm_session_mb": round((rows[-1]["rss_mb"] - rows[0]["rss_mb"]) / max(1, len(rows) - 1), 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "max_warm_init_s": max(warm),
+        "mean_warm_init_s": round(sum(warm) / len(warm), 6),
+        "per_session": rows,
+    })
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=30)
+    parser.add_argument("--per-session-sessions", type=int, default=4,
+                        help="Sessions in the per_session mode, which loads a full set of models for each")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--output", default=None, help="Optional path for the JSON report")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    report = {}
+    for mode, n_sessions in (("shared", args.sessions), ("per_session", args.per_session_sessions)):
+        parent, child = ctx.Pipe(duplex=False)
+        proc = ctx.Process(target=run_mode, args=(mode, n_sessions, args.concurrency, child))
+        proc.start()
+        child.close()
+        try:
+            report[mode] = parent.recv()
+        except EOFError:
+            proc.join()
+            report[mode] = {"error": f"process exited with {proc.exitcode}"}
+        proc.join()
+        parent.close()
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Discovery coverage and crash recovery of the checkpointed sitemap crawl.
+
+Serves a generated handbook-like site from a local HTTP server: navigation
+pages that only hold links, content pages nested up to --site-depth links
+deep, and a sitemap index (one child gzipped) advertised in robots.txt,
+with a lastmod per page and a share of recently modified pages. It
+compares three crawls:
+
+  * bfs: the link-only BFS of crawl_and_embed, up to --max-depth hops
+  * sitemap: seed_frontier + checkpointed_crawl from backend.data_ingestion
+  * resume: the sitemap crawl killed (checkpoint closed without a flush)
+    after --crash-after pages, then resumed from the checkpoint
+
+For each it reports the fetches, content pages reached, fetches that were
+only navigation, and how many fetches it took to reach every recently
+modified page. For resume, it also reports the pages fetched twice and
+whether the union of visits matches an uninterrupted run. No models or
+collection are loaded.
+
+Run from src/:  python -m benchmarks.sitemap_crawl --sections 8 --site-depth 6 --crash-after 150
+"""
+import argparse
+import gzip
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from backend.data_ingestion import (
+    MAX_DEPTH,
+    checkpointed_crawl,
+    chunk_content,
+    extract_links,
+    is_allowed_url,
+    normalize_url,
+    parse_html,
+    seed_frontier,
+)
+from backend.ingest_state import CrawlCheckpoint
+from benchmarks.common import emit
+
+WORDS = "gitlab handbook remote values iteration results transparency onboarding security review".split()
+
+
+def generated_site(sections, fanout, depth, recent_share, seed=0):
+    """
+    path -> (html, lastmod, is_content) for a site whose content pages are
+    chained below navigation pages down to the given link depth.
+    """
+
+    rng = random.Random(seed)
+    pages = {}
+
+    def content(path, children):
+        text = " ".join(rng.choice(WORDS) for _ in range(60))
+        links = "".join(f'<a href="{child}">{child}</a>' for child in children)
+        return f"<html><main><h2>{path}</h2><p>{text}</p>{links}</main></html>"
+
+    def nav(children):
+        return "<html><nav>" + "".join(f'<a href="{c}">{c}</a>' for c in children) + "</nav></html>"
+
+    def lastmod():
+        days = rng.uniform(0, 7) if rng.random() < recent_share else rng.uniform(30, 1000)
+        return time.time() - days * 86400
+
+    section_paths = [f"/handbook/s{i}/" for i in range(sections)]
+    pages["/handbook/"] = (nav(section_paths), lastmod(), False)
+    for section in section_paths:
+        topics = [f"{section}t{j}/" for j in range(fanout)]
+        pages[section] = (nav(topics), lastmod(), False)
+        for topic in topics:
+            chain = [f"{topic}p{k}/" for k in range(fanout)]
+            pages[topic] = (nav(chain), lastmod(), False)
+            for page in chain:
+                # Each content page links to one deeper page, down to depth
+                path, level = page, 3
+                while level <= depth:
+                    child = f"{path}d/" if level < depth else None
+                    pages[path] = (content(path, [child] if child else []), lastmod(), True)
+                    path, level = child, level + 1
+    return pages
+
+
+def sitemap_files(pages, host):
+    """
+    path -> bytes for robots.txt, a sitemap index and two child sitemaps.
+    """
+
+    def url_entry(path, lastmod):
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(lastmod))
+        return f"<url><loc>{host}{path}</loc><lastmod>{stamp}</lastmod></url>"
+
+    ordered = sorted(pages.items())
+    half = len(ordered) // 2
+    urlset = '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{}</urlset>'
+    first = urlset.format("".join(url_entry(p, lm) for p, (_, lm, _) in ordered[:half]))
+    second = urlset.format("".join(url_entry(p, lm) for p, (_, lm, _) in ordered[half:]))
+    index = ('<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+             f"<sitemap><loc>{host}/sitemap-1.xml</loc></sitemap>"
+             f"<sitemap><loc>{host}/sitemap-2.xml.gz</loc></sitemap></sitemapindex>")
+    return {
+        "/robots.txt": f"User-agent: *\nSitemap: {host}/sitemap.xml\n".encode(),
+        "/sitemap.xml": index.encode(),
+        "/sitemap-1.xml": first.encode(),
+        "/sitemap-2.xml.gz": gzip.compress(second.encode()),
+    }
+
+
+def serve(files, latency=0.0):
+    """
+    Serve files (path -> bytes) on a free local port, with or without a
+    trailing slash as the crawler normalizes it away, answering every
+    request after latency seconds. Returns (server, host).
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            body = files.get(self.path, files.get(self.path + "/"))
+            if body is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def bfs_crawl(start_url, url_filter, session, max_depth):
+    """
+    The page discovery of crawl_and_embed: BFS over links. Yields
+    (url, depth, soup).
+    """
+
+    visited = set()
+    queue = deque([(normalize_url(start_url), 0)])
+    while queue:
+        url, depth = queue.popleft()
+        if url in visited or depth > max_depth or not url_filter(url):
+            continue
+        visited.add(url)
+        try:
+            resp = session.get(url, timeout=10)
+            resp.raise_for_status()
+        except Exception:
+            continue
+        soup = parse_html(resp.text)
+        if depth < max_depth:
+            queue.extend((sub, depth + 1) for sub in extract_links(soup, url, url_filter) if sub not in visited)
+        yield url, depth, soup
+
+
+def summarize(visits, content_urls, recent_urls, elapsed):
+    """
+    visits is the list of (url, has_chunks) in fetch order.
+    """
+
+    fetched = [url for url, _ in visits]
+    reached_recent = [i + 1 for i, url in enumerate(fetched) if url in recent_urls]
+    return {
+        "fetches": len(fetched),
+        "content_pages_reached": len(set(fetched) & content_urls),
+        "content_coverage_pct": round(100 * len(set(fetched) & content_urls) / len(content_urls), 2),
+        "navigation_only_fetches": sum(1 for _, has_chunks in visits if not has_chunks),
+        "fetches_to_reach_all_recent": max(reached_recent) if len(reached_recent) == len(recent_urls) else None,
+        "seconds": round(elapsed, 2),
+    }
+
+
+def run_checkpointed(path, start_url, url_filter, session, max_depth, crash_after=None, flush_every=50):
+    """
+    Sitemap crawl with a checkpoint at path, flushing every flush_every
+    pages. With crash_after, the checkpoint is closed without a flush after
+    that many pages and the crawl is resumed from it.
+    """
+
+    visits = []
+    checkpoint = CrawlCheckpoint(path, "bench_")
+    seed_frontier(checkpoint, start_url, url_filter, session)
+    for url, _, soup in checkpointed_crawl(checkpoint, url_filter, session, max_depth, delay=0):
+        visits.append((url, bool(chunk_content(soup, url))))
+        if crash_after is not None and len(visits) == crash_after:
+            checkpoint.close()
+            checkpoint = CrawlCheckpoint(path, "bench_")
+            assert checkpoint.can_resume()
+            break
+        if checkpoint.unflushed >= flush_every:
+            checkpoint.flush(0)
+    else:
+        checkpoint.finish()
+        checkpoint.close()
+        return visits
+    for url, _, soup in checkpointed_crawl(checkpoint, url_filter, session, max_depth, delay=0):
+        visits.append((url, bool(chunk_content(soup, url))))
+        if checkpoint.unflushed >= flush_every:
+            checkpoint.flush(0)
+    checkpoint.finish()
+    checkpoint.close()
+    return visits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sections", type=int, default=8)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--site-depth", type=int, default=6, help="Link depth of the deepest content pages")
+    parser.add_argument("--max-depth", type=int, default=MAX_DEPTH, help="Link hops followed by the crawls")
+    parser.add_argument("--recent-share", type=float, default=0.1, help="Share of pages modified in the last week")
+    parser.add_argument("--flush-every", type=int, default=50)
+    parser.add_argument("--crash-after", type=int, default=150)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    site = generated_site(args.sections, args.fanout, args.site_depth, args.recent_share)
+    files = {path: html.encode() for path, (html, _, _) in site.items()}
+    server, host = serve(files)
+    files.update(sitemap_files(site, host))
+    start_url = f"{host}/handbook/"
+    url_filter = lambda url: is_allowed_url(url, start_url)
+    content_urls = {normalize_url(host + path) for path, (_, _, is_content) in site.items() if is_content}
+    week_ago = time.time() - 7 * 86400
+    recent_urls = {normalize_url(host + path) for path, (_, lastmod, _) in site.items() if lastmod >= week_ago}
+    session = requests.Session()
+    tmp = tempfile.mkdtemp(prefix="bench_sitemap_")
+    report = {"config": vars(args), "site_pages": len(site), "content_pages": len(content_urls),
+              "recent_pages": len(recent_urls)}
+
+    start = time.perf_counter()
+    visits = [(url, bool(chunk_content(soup, url))) for url, _, soup in bfs_crawl(start_url, url_filter, session,
+                                                                                   args.max_depth)]
+    report["bfs"] = summarize(visits, content_urls, recent_urls, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    full = run_checkpointed(os.path.join(tmp, "full.sqlite"), start_url, url_filter, session, args.max_depth,
+                            flush_every=args.flush_every)
+    report["sitemap"] = summarize(full, content_urls, recent_urls, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    resumed = run_checkpointed(os.path.join(tmp, "resume.sqlite"), start_url, url_filter, session, args.max_depth,
+                               crash_after=args.crash_after, flush_every=args.flush_every)
+    report["resume"] = summarize(resumed, content_urls, recent_urls, time.perf_counter() - start)
+    fetched = [url for url, _ in resumed]
+    report["resume"]["fetched_twice"] = len(fetched) - len(set(fetched))
+    report["resume"]["same_pages_as_uninterrupted"] = set(fetched) == {url for url, _ in full}
+    server.shutdown()
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
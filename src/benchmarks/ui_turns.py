@@ -0,0 +1,174 @@
+"""
+Per-turn cost of the Streamlit chat flow as a conversation grows.
+
+Replays a conversation of --turns questions through a model of app.py's
+script runs, for the previous flow and the background-worker flow:
+
+  * legacy: three full reruns per question, each re-rendering the whole
+    history with the GitLab SVG inlined in every sourced answer, and the
+    last one blocking the script thread until the answer is complete
+  * worker: one full rerun when the question is asked and one when the
+    answer lands, history bounded to UI_HISTORY_TURNS, the logo drawn by a
+    CSS class, and only the pending message re-rendered while polling
+
+For each it reports the markdown bytes sent per turn (first and last turn)
+and the script-thread time blocked on answering. Answers come from
+backend.answer_worker.SessionAnswerWorker over the stub LLM, with --sessions
+conversations running at once on a pool of --workers threads. No models or
+Streamlit are needed.
+
+Run from src/:  python -m benchmarks.ui_turns --turns 40 --sessions 8
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from backend.answer_worker import SessionAnswerWorker
+from backend.config import UI_HISTORY_TURNS, UI_POLL_INTERVAL_S, gitlab_svg
+from backend.stub_llm import StubGenaiClient
+from benchmarks.common import emit, percentiles
+from utils.helpers import format_response, logo_style, trim_history
+
+SOURCES = ["https://handbook.gitlab.com/handbook/values/", "https://handbook.gitlab.com/handbook/communication/"]
+
+
+class StubChatbot:
+    """
+    Chatbot stand-in answering from the stub Gemini client, with the same
+    generate_response(_stream) interface.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def generate_response(self, prompt, context=None):
+        if context is not None:
+            context["chunk_ids"] = ["c0", "c1"]
+        return self.client.models.generate_content(model="stub", contents=prompt).text, SOURCES
+
+    def generate_response_stream(self, prompt, context=None):
+        if context is not None:
+            context["chunk_ids"] = ["c0", "c1"]
+        text = ""
+        for chunk in self.client.models.generate_content_stream(model="stub", contents=prompt):
+            text += chunk.text
+            yield "text", chunk.text
+        yield "done", text, SOURCES
+
+
+def legacy_format_response(response, sources):
+    """
+    app.format_response before the logo moved to a CSS class.
+    """
+
+    links = ", &nbsp;".join(f'<a href="{url}" target="_blank">{i+1}</a>' for i, url in enumerate(sources))
+    return response + f"<br><b>{gitlab_svg()} Sources:&nbsp;</b> {links}"
+
+
+def history_bytes(messages):
+    return sum(len(m["content"].encode("utf-8")) for m in messages)
+
+
+def legacy_conversation(chatbot, turns):
+    """
+    Bytes per turn and blocked seconds per turn for the rerun-driven flow.
+    """
+
+    messages, sent, blocked = [], [], []
+    for turn in range(turns):
+        prompt = f"Question {turn} about GitLab values?"
+        # Run 1 sets the pending question, run 2 adds the user message,
+        # run 3 renders everything again and blocks while streaming
+        messages.append({"role": "user", "content": prompt})
+        total = history_bytes(messages[:-1]) + 2 * history_bytes(messages)
+        start = time.perf_counter()
+        response, sources, streamed = "", [], ""
+        for event in chatbot.generate_response_stream(prompt, context={}):
+            if event[0] == "text":
+                streamed += event[1]
+                total += len(streamed.encode("utf-8"))
+            else:
+                _, response, sources = event
+        blocked.append(time.perf_counter() - start)
+        messages.append({"role": "assistant", "content": legacy_format_response(response, sources)})
+        # The final st.rerun() renders the history once more
+        total += history_bytes(messages)
+        sent.append(total)
+    return sent, blocked, None
+
+
+def worker_conversation(chatbot, turns, pool, poll_interval, history_turns):
+    """
+    Bytes per turn, blocked seconds per turn and answer latencies for the
+    background-worker flow.
+    """
+
+    worker = SessionAnswerWorker(pool, lambda: chatbot, stream=True)
+    messages, sent, blocked, latencies = [], [], [], []
+    style = len(logo_style().encode("utf-8"))
+    for turn in range(turns):
+        prompt = f"Question {turn} about GitLab values?"
+        messages.append({"role": "user", "content": prompt})
+        trim_history(messages, history_turns)
+        start = time.perf_counter()
+        worker.submit(prompt)
+        blocked.append(time.perf_counter() - start)
+        # The rerun triggered by the input renders the history once
+        total = style + history_bytes(messages)
+        while True:
+            time.sleep(poll_interval)
+            job = worker.take()
+            if job is not None:
+                break
+            total += len(worker.job.text.encode("utf-8")) or len("⏳ _Thinking..._")
+        latencies.append(job.elapsed())
+        messages.append({"role": "assistant", "content": format_response(job.response, job.sources)})
+        trim_history(messages, history_turns)
+        # Full rerun once the answer lands
+        total += style + history_bytes(messages)
+        sent.append(total)
+    return sent, blocked, latencies
+
+
+def summarize(results):
+    sent = [s for result in results for s in result[0]]
+    blocked = [b * 1000 for result in results for b in result[1]]
+    first = [result[0][0] for result in results]
+    last = [result[0][-1] for result in results]
+    report = {
+        "bytes_first_turn": round(sum(first) / len(first)),
+        "bytes_last_turn": round(sum(last) / len(last)),
+        "bytes_per_turn": percentiles(sent),
+        "blocked_ms_per_turn": {k: round(v, 3) for k, v in percentiles(blocked).items()},
+    }
+    if results[0][2] is not None:
+        latencies = [l * 1000 for result in results for l in result[2]]
+        report["answer_ms"] = {k: round(v, 1) for k, v in percentiles(latencies).items()}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=8, help="Shared answer pool size (UI_ANSWER_WORKERS)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub time to first token in seconds")
+    parser.add_argument("--poll-interval", type=float, default=UI_POLL_INTERVAL_S)
+    parser.add_argument("--history-turns", type=int, default=UI_HISTORY_TURNS)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    client = StubGenaiClient(latency=args.latency, chunk_interval=0.005, seed=0)
+    chatbot = StubChatbot(client)
+    report = {"config": vars(args)}
+    with ThreadPoolExecutor(args.sessions) as sessions:
+        report["legacy"] = summarize(list(sessions.map(
+            lambda _: legacy_conversation(chatbot, args.turns), range(args.sessions))))
+        with ThreadPoolExecutor(args.workers, thread_name_prefix="ui-answer") as pool:
+            report["worker"] = summarize(list(sessions.map(
+                lambda _: worker_conversation(chatbot, args.turns, pool, args.poll_interval, args.history_turns),
+                range(args.sessions))))
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
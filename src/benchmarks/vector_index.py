@@ -0,0 +1,81 @@
+"""
+Chroma vs. the memory-mapped vector index (int8 and binary).
+
+Builds a synthetic collection (see benchmarks.rag_pipeline), exports it to
+VectorIndex directories and reports per-query latency, recall@k against
+exact float32 search, and index size on disk for each backend.
+
+Run from src/:  python -m benchmarks.vector_index --docs 20000 --queries 200
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+from backend.vector_index import QUANTIZATIONS, VectorIndex, build_from_collection
+from benchmarks.common import current_rss_mb, emit, percentiles
+from benchmarks.rag_pipeline import build_synthetic_collection
+
+
+def dir_size_mb(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(dirpath, name)) for name in filenames)
+    return total / (1024 * 1024)
+
+
+def bench_backend(collection, queries, exact_ids, k):
+    latencies, recalls = [], []
+    for query, truth in zip(queries, exact_ids):
+        t = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k,
+                                  include=["documents", "metadatas", "distances"])
+        latencies.append((time.perf_counter() - t) * 1000)
+        recalls.append(len(set(result["ids"][0]) & truth) / k)
+    return {
+        "latency_ms": {name: round(v, 3) for name, v in percentiles(latencies).items()},
+        "recall_at_k": round(float(np.mean(recalls)), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=15)
+    parser.add_argument("--oversample", type=int, nargs="+", default=[4, 10])
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    _, collection, _, _ = build_synthetic_collection(args.docs, False, None)
+    stored = collection.get(include=["embeddings"], limit=args.docs)
+    ids = stored["ids"]
+    vectors = np.asarray(stored["embeddings"], dtype=np.float32)
+    rng = np.random.default_rng(2)
+    queries = vectors[rng.integers(0, len(vectors), args.queries)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+    exact_ids = [
+        {ids[i] for i in np.argsort(((vectors - q) ** 2).sum(axis=1))[:args.k]}
+        for q in queries
+    ]
+
+    report = {"config": vars(args), "chroma": bench_backend(collection, queries, exact_ids, args.k)}
+    for quantization in QUANTIZATIONS:
+        path = tempfile.mkdtemp(prefix=f"bench_vectors_{quantization}_")
+        build_from_collection(collection, path, quantization)
+        for oversample in args.oversample:
+            index = VectorIndex(path, oversample=oversample)
+            rss_before = current_rss_mb()
+            index.count()
+            result = bench_backend(index, queries, exact_ids, args.k)
+            result["rss_delta_mb"] = round(current_rss_mb() - rss_before, 1)
+            result["disk_mb"] = round(dir_size_mb(path), 1)
+            result["search_disk_mb"] = round(
+                os.path.getsize(os.path.join(path, "codes.npy")) / (1024 * 1024), 1
+            )
+            report[f"{quantization}_x{oversample}"] = result
+    emit(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,8 @@
-import csv
-import os
-import gdown
+import base64
 import re
-import requests
-import streamlit as st
 import string
-import zipfile
-from backend.config import CHROMA_DB_PATH, CHROMA_DB_ZIP_URL, MAX_QUERY_LENGTH
-
-def ensure_chroma_db():
-    db_dir = os.path.abspath(CHROMA_DB_PATH)
-    parent_dir = os.path.dirname(db_dir)
-    zip_path = os.path.join(parent_dir, "chroma_db.zip")
-    if not os.path.exists(db_dir):
-        os.makedirs(parent_dir, exist_ok=True)
-        st.info("ChromaDB not found. Downloading database, please wait...")
-        gdown.download(CHROMA_DB_ZIP_URL, zip_path, quiet=False)
-        with zipfile.ZipFile(zip_path, "r") as zip_ref:
-            zip_ref.extractall(parent_dir)
-        os.remove(zip_path)
-        st.success("ChromaDB downloaded and extracted.")
-
+from functools import lru_cache
+from backend.config import MAX_QUERY_LENGTH, gitlab_svg
 
 def normalize(text):
     """
@@ -32,6 +14,13 @@ def normalize(text):
     text = re.sub(r'\(.*?\)', '', text)
     return text.strip()
 
+def normalize_query(query):
+    """
+    Normalize a query for cache lookups by lowercasing and collapsing whitespace.
+    """
+
+    return " ".join(query.lower().split())
+
 def title_keywords(title):
     """
     Extract keywords from the title.
@@ -53,20 +42,66 @@ def extract_error_type(e):
         return str(e.status_code)
     return ""
 
-def record_feedback(question, answer, feedback):
+def record_feedback(question, answer, feedback, chunk_ids=(), sources=(), session_id=None):
     """
     Record user feedback for a specific question and answer pair.
+    The write happens in the feedback store's background thread.
+    """
+
+    from backend.registry import get_feedback_store
+    get_feedback_store().record(question, answer, feedback, chunk_ids, sources, session_id)
+
+@lru_cache(maxsize=1)
+def logo_style():
+    """
+    <style> block defining the gitlab-logo class, with the GitLab logo as a
+    data URI. Rendered once per page so answers only carry a short <span>.
+    """
+
+    svg = gitlab_svg()
+    if "xmlns=" not in svg:
+        svg = svg.replace("<svg", '<svg xmlns="http://www.w3.org/2000/svg"', 1)
+    encoded = base64.b64encode(svg.encode("utf-8")).decode("ascii")
+    return (
+        "<style>.gitlab-logo{display:inline-block;width:20px;height:20px;margin-right:6px;"
+        f"vertical-align:middle;background:url(data:image/svg+xml;base64,{encoded}) no-repeat center/contain;}}</style>"
+    )
+
+def format_response(response, sources):
+    """
+    Append source links to the response text.
+    """
+
+    if sources:
+        links = ", &nbsp;".join(
+            f'<a href="{url}" target="_blank" style="color:#1a73e8; font-weight:bold; text-decoration:underline;">{i+1}</a>'
+            for i, url in enumerate(sources)
+        )
+        response += f'<br><b><span class="gitlab-logo"></span> Sources:&nbsp;</b> {links}'
+    return response
+
+def trim_history(messages, max_turns):
+    """
+    Drop the oldest messages so at most max_turns questions remain, never
+    separating a question from its answer. Trims the list in place.
     """
 
-    with open("feedback.csv", "a", newline='', encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow([question, answer, feedback])
+    questions = sum(1 for m in messages if m["role"] == "user")
+    cut = 0
+    while questions > max_turns:
+        cut += 1
+        while cut < len(messages) and messages[cut]["role"] != "user":
+            cut += 1
+        questions -= 1
+    del messages[:cut]
+    return messages
 
 def is_valid_query(query):
     """
     Validate the user query.
     """
 
+    import streamlit as st
     if not query or not query.strip():
         st.error("Please enter a question.")
         return False